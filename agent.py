@@ -0,0 +1,1049 @@
+"""Per-session agent state and the ReAct / planning loop.
+
+An :class:`AgentSession` owns everything that used to live in module globals
+of ``main.py``: the chat history (formerly ``GLOBAL_MESSAGES``), the active
+filtered subset (formerly ``CACHE``) and the per-session settings.  The
+dataset, the tool schema and the OpenAI client are shared, read-only process
+resources, so any number of sessions can run concurrently in one process.
+
+:meth:`AgentSession.events` (and its async twin :meth:`AgentSession.aevents`)
+answer a question while yielding :class:`AgentEvent` objects as they happen:
+plan tokens, tool-call start/finish and final-answer tokens.  UIs render these
+incrementally instead of waiting for the whole multi-turn loop.
+
+Every question runs under a :class:`budget.QuestionBudget` built from the
+session settings: it caps the turns, wall-clock time and tokens, answers
+repeated tool calls from their first result and, when a limit is reached,
+makes the model answer from the results gathered so far.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import json
+import queue
+import secrets
+import threading
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import AsyncIterator, Callable, Iterator
+
+import dataset_tools  # noqa: F401  (registers the tools)
+import fast_path
+import llm_cache
+import llm_config
+import planner
+import tool_cache
+import tracing
+import transport
+from budget import REASONS, QuestionBudget
+from history import HistoryManager
+from lazy import lazy, lazy_import
+from sampling import Sampler
+from subset_cache import SubsetCache
+from tool_registry import ToolArgumentError, registry
+from tool_schema import get_tools, get_vocabulary
+
+dl = lazy_import("data_loader")
+
+__all__ = ["SYSTEM_PROMPT", "SessionSettings", "AgentEvent", "AgentSession", "run_sync"]
+
+SYSTEM_PROMPT = """You are a helpful assistant that can answer questions related to the customer support dataset.
+        Each entry in the dataset contains the following fields:
+
+        - instruction: a user request text
+        - category: category of the user request
+        - intent: the intent corresponding to the user instruction
+        - response: an example expected response from the virtual assistant
+
+        INSTRUCTIONS:
+
+        1. Use the available tools to answer user questions.
+        2. Some tools are dependent on other tools. You must use them in the correct order:
+           - select_semantic_category() should be used before count_category()
+           - select_semantic_intent() should be used before count_intent()
+
+        3. IMPORTANT: Always call finish() when you have enough data to answer the question.
+        4. You can make multiple tool calls in one response.
+        5. If you have counted several categories/intents and can determine the biggest one, call finish() immediately.
+        6. If the user’s question is not related to the dataset, respond **exactly** with:
++          "this question is out of scope"
++          (and do not call any tools).
+        7. To rank, compare or break down intents/categories (e.g. find the biggest intent), call aggregate() once
+           instead of counting every label separately.
+        8. Every select_semantic_*() result gets a handle (s1, s2, ...). Pass it as `handle` to work on an earlier
+           selection, and use combine_subsets() instead of selecting again to intersect or unite selections.
+        9. For questions about what customers wrote (words or phrases in the texts), use search_text(); to count
+           or break down the matching rows, select_text() them first.
+        10. When the user describes a request in their own words instead of naming an intent, call
+            find_similar_instructions() and use its likely_intents to choose the intents to select.
+        11. show_examples() returns new rows on every call; request only the columns you need.
+        """
+
+PLANNING_PROMPT = (
+    "First, produce a concise ordered plan of the exact tool calls you will make "
+    "(and their arguments) to satisfy the user's request. Do NOT execute any tool. "
+    "Output the plan in plain text."
+)
+
+STRUCTURED_PLANNING_PROMPT = (
+    "Call submit_plan with every tool call needed to answer the user's request, with its exact "
+    "arguments. List the steps in the order they must run and give each step the ids of the steps "
+    "it needs in depends_on; steps that do not depend on each other run in parallel. Pass '@<id>' "
+    "as a handle argument to use the subset selected by step <id>. If no tool is needed (e.g. the "
+    "question is out of scope), submit an empty list of steps."
+)
+
+BUDGET_PROMPT = (
+    "The {reason} for this question has been reached, so no more tools can be called. Answer now "
+    "from the tool results above, and say what could not be determined."
+)
+
+# Note prefixed to the result of a tool call repeated within a question
+REPEAT_NOTE = "(Repeated call: same arguments on the same data as earlier in this question.) "
+
+REPAIR_PROMPT = (
+    "Some steps of the plan could not run: {problems}. Call submit_plan again with steps that "
+    "replace only the failed and skipped ones. Steps that succeeded keep their results; refer to "
+    "them by id in depends_on or as '@<id>'."
+)
+
+
+@dataclass
+class SessionSettings:
+    """Per-session knobs."""
+
+    model: str = "gpt-4o-mini"
+    # Print the intermediate steps (tool calls, results) to stdout
+    verbose: bool = True
+    # Upper bound on tool calls of one turn running at the same time
+    max_parallel_tools: int = 8
+    # Prompt token budget per request and clipping limit for tool outputs
+    history_budget_tokens: int = 12000
+    max_tool_output_tokens: int = 1500
+    # Send the intent/category vocabulary once in the system prompt instead
+    # of inlining it into several tool definitions on every request
+    compact_schema: bool = False
+    # Answer simple aggregate questions from precomputed counts, without the
+    # LLM loop, when the fast-path router is confident and the session has no
+    # active subset or earlier turns (see fast_path.py)
+    fast_path: bool = True
+    # Memory budget of the session's cached subsets (row arrays / bitmaps)
+    subset_cache_bytes: int = 8 * 1024 * 1024
+    # Seed of the example sampler; ``None`` picks a random one per session
+    # (readable afterwards as ``AgentSession.sampler.seed``)
+    sample_seed: int | None = None
+    # Extra submit_plan calls allowed per question in planning mode to
+    # replace failed steps, before falling back to step-by-step execution
+    plan_repairs: int = 1
+    # Answer repeated calls of read-only tools from the shared tool result
+    # cache (see tool_cache.py)
+    memoize_tools: bool = True
+    # Per-question limits (see budget.py; ``None`` disables one): model turns,
+    # seconds before the final answer and LLM tokens.  When one is reached
+    # the model answers from the results so far, within ``finish_seconds``.
+    max_turns: int | None = 12
+    question_seconds: float | None = 120.0
+    question_tokens: int | None = 100_000
+    finish_seconds: float = 30.0
+    # Consecutive turns made only of repeated tool calls before the answer
+    # is forced
+    max_repeated_turns: int = 2
+    # Raise when the final answer cannot be fetched, instead of answering
+    # with an error message (batch runs record the question as failed)
+    raise_errors: bool = False
+
+
+@dataclass
+class AgentEvent:
+    """Progress of one question, as yielded by :meth:`AgentSession.events`.
+
+    ``kind`` is one of
+
+    ``plan_token``    a piece of the plan (planning mode); ``text`` holds it.
+                      Structured plans arrive as one rendered token per
+                      ``submit_plan`` call.
+    ``tool_start``    a tool call is about to run; ``data`` holds ``name``,
+                      ``arguments`` (the raw JSON string) and ``index``.
+    ``tool_output``   rows a running tool streams out before it returns (e.g.
+                      ``show_examples``); ``data`` adds ``rows`` to the
+                      ``tool_start`` fields.
+    ``tool_end``      the tool call finished; ``text`` holds its result and
+                      ``data`` adds ``seconds`` to the ``tool_start`` fields.
+    ``answer_token``  a piece of the final answer; ``text`` holds it.
+    ``done``          the complete answer, always the last event; ``data``
+                      holds the question's ``budget`` report.
+    """
+
+    kind: str
+    text: str = ""
+    data: dict = field(default_factory=dict)
+
+
+EventCallback = Callable[[AgentEvent], None]
+
+
+def _ignore(event: AgentEvent) -> None:
+    pass
+
+
+# Forwards rows streamed by the tool running in the current context
+_tool_output: contextvars.ContextVar[Callable[[list[dict]], None] | None] = contextvars.ContextVar(
+    "tool_output", default=None
+)
+
+
+def _token_emitter(on_event: EventCallback | None, kind: str) -> Callable[[str], None] | None:
+    if on_event is None:
+        return None
+    return lambda text: on_event(AgentEvent(kind, text))
+
+
+@lazy
+def _background_loop() -> asyncio.AbstractEventLoop:
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="agent-event-loop", daemon=True).start()
+    return loop
+
+
+def run_sync(coro):
+    """Run *coro* on the shared background event loop and wait for the result.
+
+    The synchronous API (``run()``, ``plan()``) goes through one long-lived
+    loop, so the async client's connection pool is reused across calls and
+    questions submitted from several threads overlap on that loop.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop.get()).result()
+
+
+def _is_stateful(tool_name: str) -> bool:
+    registered = registry.get(tool_name)
+    return registered is not None and registered.stateful
+
+
+def _topological(steps: list, graph: dict[str, set[str]]) -> list:
+    """Order *steps* so that every step comes after the steps in its *graph* entry."""
+    placed: set[str] = set()
+    order = []
+    while len(order) < len(steps):
+        for step in steps:
+            if step.id not in placed and graph[step.id] <= placed:
+                placed.add(step.id)
+                order.append(step)
+    return order
+
+
+def _message_dict(message) -> dict:
+    """Convert an SDK assistant message into a plain, re-sendable dict."""
+    result = {"role": "assistant", "content": message.content}
+    if message.tool_calls:
+        result["tool_calls"] = [
+            {
+                "id": call.id,
+                "type": "function",
+                "function": {"name": call.function.name, "arguments": call.function.arguments},
+            }
+            for call in message.tool_calls
+        ]
+    return result
+
+
+class AgentSession:
+    """One conversation with the agent.
+
+    Parameters
+    ----------
+    settings : SessionSettings, optional
+        Model and verbosity settings; defaults are used when omitted.
+    client : optional
+        An OpenAI-compatible *async* client.  Defaults to the shared
+        ``llm_config.get_async_client()`` of the running event loop.
+    cache : llm_cache.CompletionCache, optional
+        Completion cache for every LLM call of the session.  Defaults to the
+        process-wide ``llm_cache.get_completion_cache()``.
+    tracer : tracing.Tracer, optional
+        Receives a span per question, planning step, LLM call and tool call.
+        Defaults to the process-wide ``tracing.get_tracer()``.
+    tool_results : tool_cache.ToolResultCache, optional
+        Memoised results of read-only tools.  Defaults to the process-wide
+        ``tool_cache.get_tool_cache()``.
+    """
+
+    def __init__(self, settings: SessionSettings | None = None, client=None, cache=None, tracer=None,
+                 tool_results=None):
+        self.settings = settings or SessionSettings()
+        self._client = client
+        self.cache: llm_cache.CompletionCache = cache or llm_cache.get_completion_cache()
+        self.tool_results: tool_cache.ToolResultCache = (
+            tool_results if tool_results is not None else tool_cache.get_tool_cache()
+        )
+        self.tracer: tracing.Tracer = tracer or tracing.get_tracer()
+        self.messages: list[dict] = [{"role": "system", "content": SYSTEM_PROMPT}]
+        self.history = HistoryManager(
+            budget_tokens=self.settings.history_budget_tokens,
+            max_tool_output_tokens=self.settings.max_tool_output_tokens,
+            model=self.settings.model,
+        )
+        # Dataset version read by the current question (see refresh_dataset)
+        self._dataset: dl.Dataset | None = None
+        # Guards of the running question and the report of the last one
+        self._budget: QuestionBudget | None = None
+        self.last_budget: dict | None = None
+        self._question_start = 1  # index of the running question's first message
+        # Active filter; ``None`` stands for the full dataset
+        self.subset: dl.Subset | None = None
+        self.active_handle: str | None = None
+        # Every filter result of the session, addressable by handle
+        self.subsets = SubsetCache(self.settings.subset_cache_bytes)
+        seed = self.settings.sample_seed
+        self.sampler = Sampler(secrets.randbits(32) if seed is None else seed)
+        # Created on first use, inside the event loop that runs the session
+        self._question_lock: asyncio.Lock | None = None
+
+    # ------------------------------------------------------------------
+    # Shared resources
+    # ------------------------------------------------------------------
+
+    @property
+    def client(self):
+        return self._client if self._client is not None else llm_config.get_async_client()
+
+    @property
+    def dataset(self) -> dl.Dataset:
+        """The dataset version the session reads; see :meth:`refresh_dataset`."""
+        if self._dataset is None:
+            self._dataset = dl.get_dataset()
+        return self._dataset
+
+    def refresh_dataset(self) -> bool:
+        """Move the session to the latest published dataset version.
+
+        Called before every question, so a question reads one version from
+        start to end even while rows are being ingested.  The cached subsets
+        are rebased and gain the new rows their filters select.  Returns
+        whether the version changed.
+        """
+        latest = dl.get_dataset()
+        if self._dataset is None or self._dataset is latest:
+            self._dataset = latest
+            return False
+        self.subsets.rebase(latest)
+        if self.active_handle is not None and self.active_handle in self.subsets:
+            self.subset = self.subsets.get(self.active_handle)
+        elif self.subset is not None:
+            self.subset = dl.Subset(latest, self.subset.rows)
+        self._dataset = latest
+        return True
+
+    @property
+    def active_subset(self) -> dl.Subset:
+        """The cached subset, defaulting to the full dataset."""
+        return self.subset if self.subset is not None else self.dataset.full
+
+    @property
+    def tools(self) -> list[dict]:
+        """The tool schema sent with every request of this session."""
+        return get_tools(compact=self.settings.compact_schema)
+
+    def keep_subset(self, subset: dl.Subset, description: str, grow=None) -> str:
+        """Cache *subset*, make it the active one and return its handle.
+
+        *grow* (see :meth:`SubsetCache.put`) lets the subset pick up rows
+        ingested later.
+        """
+        handle = self.subsets.put(subset, description, grow)
+        self.subset, self.active_handle = self.subsets.get(handle), handle
+        return handle
+
+    def use_subset(self, handle: str) -> None:
+        """Make the cached subset *handle* the active one."""
+        self.subset, self.active_handle = self.subsets.get(handle), handle
+
+    def subset_for(self, handle: str | None) -> dl.Subset:
+        """Return the cached subset *handle*, or the active subset for ``None``.
+
+        Raises
+        ------
+        KeyError
+            If the handle is unknown or has been evicted.
+        """
+        return self.active_subset if handle is None else self.subsets.get(handle)
+
+    def reset(self) -> None:
+        """Forget the conversation and the cached filters."""
+        del self.messages[1:]
+        self.history.reset()
+        self.subset = None
+        self.active_handle = None
+        self.subsets.clear()
+        self.sampler = Sampler(self.sampler.seed)
+
+    def _log(self, *args, **kwargs) -> None:
+        if self.settings.verbose:
+            print(*args, **kwargs)
+
+    # ------------------------------------------------------------------
+    # Tool execution
+    # ------------------------------------------------------------------
+
+    def emit_rows(self, rows: list[dict]) -> None:
+        """Stream *rows* of the running tool's output as a ``tool_output`` event.
+
+        Called by tools from their worker thread; a no-op when nobody
+        consumes events.
+        """
+        forward = _tool_output.get()
+        if forward is not None:
+            forward(rows)
+
+    def _memo_key(self, tool_name: str, args: dict) -> tuple | None:
+        """Return the tool result cache key of a call, or ``None`` if it must run.
+
+        The ``handle`` argument is replaced by the version of the subset it
+        names, so equal rows under different handles (or sessions) share an
+        entry and a changed active subset gets a new key.
+        """
+        registered = registry.get(tool_name)
+        if registered is None or registered.memoize is None:
+            return None
+        try:
+            kwargs = registered.bind(args, self.dataset)
+            subset_version = None
+            if "handle" in kwargs:
+                handle = kwargs.pop("handle")
+                if handle is not None or registered.memoize == "subset":
+                    subset_version = self.subset_for(handle).version
+            elif registered.memoize == "subset":
+                subset_version = self.active_subset.version
+        except (ToolArgumentError, KeyError):
+            return None  # the call itself reports the problem
+        return tool_cache.ToolResultCache.key(tool_name, kwargs, self.dataset.version, subset_version)
+
+    def execute_tool(self, tool_name: str, args: dict):
+        """Run the tool called *tool_name* with the decoded JSON *args*.
+
+        Results of memoised tools (``memoize=`` in :func:`tool_registry.tool`)
+        come from :attr:`tool_results` when the same call was made before on
+        the same data; they are shared and must not be modified.
+        """
+        key = self._memo_key(tool_name, args) if self.settings.memoize_tools else None
+        if key is None:
+            return registry.call(self, tool_name, args)
+        result = self.tool_results.get(key, None)
+        if result is None:
+            result = registry.call(self, tool_name, args)
+            self.tool_results.put(key, result)
+        return result
+
+    def _repeat_key(self, tool_name: str, args: dict) -> tuple | None:
+        """Key under which a call counts as a repeat within the question, or ``None``.
+
+        Only memoised read-only tools and stateful filters qualify; the key
+        holds the version of the active subset, so a call after a new
+        selection is not a repeat.
+        """
+        registered = registry.get(tool_name)
+        if registered is None or not (registered.memoize or registered.stateful):
+            return None
+        try:
+            kwargs = registered.bind(args, self.dataset)
+        except ToolArgumentError:
+            return None  # the call itself reports the problem
+        return tool_name, json.dumps(kwargs, sort_keys=True, default=str), self.active_subset.version
+
+    def _call_tool(self, index: int, tool_call) -> tuple[str, bool]:
+        """Execute one tool call; return its tool message content and whether it succeeded.
+
+        A repeat of an earlier call of the question (see :mod:`budget`) does
+        not run; it returns the earlier result with :data:`REPEAT_NOTE`.
+        """
+        tool_name = tool_call.function.name
+        self._log(f"  Tool Call #{index + 1}: {tool_name}")
+        with self.tracer.span("tool", tool=tool_name, argument_bytes=len(tool_call.function.arguments)) as span:
+            try:
+                args = json.loads(tool_call.function.arguments)
+                budget = self._budget
+                key = self._repeat_key(tool_name, args) if budget is not None else None
+                earlier = budget.repeat(key) if budget is not None else None
+                if earlier is not None:
+                    span.set(repeated=True)
+                    result, ok = REPEAT_NOTE + earlier, True
+                else:
+                    result, ok = str(self.execute_tool(tool_name, args)), True
+                    if key is not None:
+                        # A filter is repeated once its subset is the active one.
+                        if _is_stateful(tool_name):
+                            key = self._repeat_key(tool_name, args)
+                        budget.record(key, result)
+                self._log(f"    Result: {result}")
+            except Exception as e:
+                result, ok = f"Error executing tool {tool_name}: {str(e)}", False
+                self._log(f"    Error: {result}")
+                span.fail(str(e))
+            span.set(result_bytes=len(result))
+            return result, ok
+
+    async def _run_tool_call(
+        self, index: int, tool_call, semaphore: asyncio.Semaphore, on_event: EventCallback
+    ) -> tuple[str, bool]:
+        """Run :meth:`_call_tool` in a worker thread, emitting its events."""
+        loop = asyncio.get_running_loop()
+        async with semaphore:
+            data = {
+                "name": tool_call.function.name,
+                "arguments": tool_call.function.arguments,
+                "index": index,
+            }
+            on_event(AgentEvent("tool_start", data=data))
+            start = time.perf_counter()
+            token = _tool_output.set(
+                lambda rows, data=data: loop.call_soon_threadsafe(
+                    on_event, AgentEvent("tool_output", data={**data, "rows": rows})
+                )
+            )
+            try:
+                content, ok = await asyncio.to_thread(self._call_tool, index, tool_call)
+            finally:
+                _tool_output.reset(token)
+            data = {**data, "seconds": time.perf_counter() - start}
+            on_event(AgentEvent("tool_end", content, data))
+            return content, ok
+
+    async def _execute_tool_calls(self, tool_calls: list, on_event: EventCallback = _ignore) -> list[dict]:
+        """Run one turn's tool calls and return the tool messages, in order.
+
+        Consecutive read-only calls run concurrently in worker threads (at
+        most ``settings.max_parallel_tools`` at a time).  A call to a tool
+        registered with ``stateful=True`` is a barrier: it starts only after
+        every earlier call has finished, and later calls start only after it,
+        so e.g. the counts that follow a ``select_semantic_intent`` see the new
+        subset.
+        """
+        semaphore = asyncio.Semaphore(self.settings.max_parallel_tools)
+        contents: list[str | None] = [None] * len(tool_calls)
+
+        async def call(index: int, tool_call) -> None:
+            contents[index], _ = await self._run_tool_call(index, tool_call, semaphore, on_event)
+
+        pending = []
+        for index, tool_call in enumerate(tool_calls):
+            if _is_stateful(tool_call.function.name):
+                await asyncio.gather(*pending)
+                pending = []
+                await call(index, tool_call)
+            else:
+                pending.append(call(index, tool_call))
+        await asyncio.gather(*pending)
+
+        return [
+            {"role": "tool", "tool_call_id": tool_call.id, "content": self.history.clip_tool_output(content)}
+            for tool_call, content in zip(tool_calls, contents)
+        ]
+
+    async def _execute_plan(
+        self,
+        steps: list[planner.PlanStep],
+        results: dict[str, planner.StepResult],
+        on_event: EventCallback = _ignore,
+    ) -> list[dict]:
+        """Run the steps of a validated plan as a DAG and record them in *results*.
+
+        Each step starts as soon as the steps it depends on (see
+        :func:`planner.dependencies`) have finished, so independent steps run
+        concurrently, at most ``settings.max_parallel_tools`` at a time.  A
+        step that failed validation, or whose dependency failed or was
+        skipped, does not run.  Returns the assistant message holding the
+        steps as (resolved) tool calls, followed by one tool message per step,
+        as if the model had made the calls itself.
+
+        Raises
+        ------
+        planner.PlanError
+            If the dependencies form a cycle; nothing has run then.
+        """
+        graph = planner.dependencies(steps, _is_stateful)
+        semaphore = asyncio.Semaphore(self.settings.max_parallel_tools)
+        tasks: dict[str, asyncio.Future] = {}
+        calls: dict[str, SimpleNamespace] = {}
+        # Call ids must stay unique across the plan rounds of the history.
+        prefix = f"plan_{len(self.messages)}_"
+
+        async def run(index: int, step: planner.PlanStep) -> None:
+            await asyncio.gather(*(tasks[need] for need in graph[step.id]))
+            failed = sorted(need for need in graph[step.id] | set(step.depends_on)
+                            if need in results and not results[need].ok)
+            arguments = json.dumps(planner.resolve(step.arguments, results), ensure_ascii=False)
+            calls[step.id] = SimpleNamespace(
+                id=prefix + step.id, function=SimpleNamespace(name=step.tool, arguments=arguments)
+            )
+            if step.error is not None:
+                results[step.id] = planner.StepResult("error", f"Invalid plan step: {step.error}")
+            elif failed:
+                results[step.id] = planner.StepResult("skipped", f"Skipped: depends on failed step(s) {failed}")
+            else:
+                content, ok = await self._run_tool_call(index, calls[step.id], semaphore, on_event)
+                results[step.id] = planner.StepResult("ok" if ok else "error", content)
+
+        # A step's dependencies always come first in this order, so their
+        # tasks exist by the time it awaits them.
+        order = _topological(steps, graph)
+        for step in order:
+            tasks[step.id] = asyncio.ensure_future(run(steps.index(step), step))
+        await asyncio.gather(*tasks.values())
+
+        tool_calls = [calls[step.id] for step in steps]
+        return [_message_dict(SimpleNamespace(content=None, tool_calls=tool_calls))] + [
+            {
+                "role": "tool",
+                "tool_call_id": calls[step.id].id,
+                "content": self.history.clip_tool_output(results[step.id].content),
+            }
+            for step in steps
+        ]
+
+    # ------------------------------------------------------------------
+    # LLM calls
+    # ------------------------------------------------------------------
+
+    async def _complete(self, **completion_kwargs):
+        """Create a (non-streamed) completion, going through the cache."""
+        with self.tracer.span("llm", model=completion_kwargs["model"], stream=False) as span:
+            key = self.cache.key(completion_kwargs) if self.cache.enabled else None
+            if key is not None:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    span.set(cached=True)
+                    return cached
+            completion = await self.client.chat.completions.create(**completion_kwargs)
+            if key is not None:
+                self.cache.put(key, completion)
+            usage = getattr(completion, "usage", None)
+            if usage is not None:
+                span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+                span.root.add("tokens", usage.total_tokens)
+                tokens = usage.total_tokens
+            else:  # no usage reported: the local estimate
+                tokens = self.history.counter.count_messages(completion_kwargs["messages"])
+                tokens += self.history.counter.count_text(completion.choices[0].message.content or "")
+            if self._budget is not None:
+                self._budget.charge_tokens(tokens)
+            return completion
+
+    async def _stream_text(self, completion_kwargs: dict, on_token: Callable[[str], None] | None = None) -> str:
+        """Stream a text-only completion, passing each delta to *on_token*."""
+        with self.tracer.span("llm", model=completion_kwargs["model"], stream=True) as span:
+            key = self.cache.key(completion_kwargs) if self.cache.enabled else None
+            if key is not None:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    span.set(cached=True)
+                    text = cached.choices[0].message.content or ""
+                    self._log(text)
+                    if on_token is not None:
+                        on_token(text)
+                    return text
+
+            content_parts: list[str] = []
+            start = time.perf_counter()
+            async for chunk in await self.client.chat.completions.create(**completion_kwargs, stream=True):
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    if not content_parts:
+                        span.set(first_token_seconds=time.perf_counter() - start)
+                    self._log(delta.content, end="", flush=True)
+                    content_parts.append(delta.content)
+                    if on_token is not None:
+                        on_token(delta.content)
+            self._log()  # newline after stream is done
+            text = "".join(content_parts)
+            # Streams carry no usage; the token counts are the local estimate.
+            prompt_tokens = self.history.counter.count_messages(completion_kwargs["messages"])
+            completion_tokens = self.history.counter.count_text(text)
+            span.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, estimated_tokens=True)
+            span.root.add("tokens", prompt_tokens + completion_tokens)
+            if self._budget is not None:
+                self._budget.charge_tokens(prompt_tokens + completion_tokens)
+            if key is not None:
+                self.cache.put(key, self.cache.text_completion(completion_kwargs["model"], text))
+            return text
+
+    async def aplan(
+        self,
+        messages: list[dict] | None = None,
+        stream: bool = False,
+        on_event: EventCallback | None = None,
+    ) -> tuple[dict, str]:
+        """Ask the LLM for an ordered list of tool calls *without* executing any tool.
+
+        The model still receives the complete `tools` schema for reference, but we
+        force `tool_choice='none'` so it cannot emit structured tool calls in the
+        response. This lets the assistant know which tools exist while keeping the
+        planning response purely textual.
+
+        Parameters
+        ----------
+        messages : list[dict], optional
+            The conversation history that should be provided when asking for a
+            plan.  Defaults to this session's history.
+        stream : bool
+            Whether to stream the response token-by-token.
+        on_event : callable, optional
+            Receives the plan as ``plan_token`` :class:`AgentEvent` objects:
+            one per delta when streaming, else a single one.
+        Returns
+        -------
+        tuple[dict, str]
+            (1) The assistant message that can be appended to the history, and
+                (2) the plain-text content of that message for convenience/printing.
+        """
+        if messages is None:
+            messages = self.messages
+
+        planning_messages = self.history.fit(messages) + [{"role": "system", "content": PLANNING_PROMPT}]
+
+        plan_completion_kwargs = {
+            "model": self.settings.model,
+            "messages": planning_messages,
+            "tools": self.tools,    # Expose the schema so the model knows the signatures
+            "tool_choice": "none", # Forbid tool execution during planning
+        }
+
+        emit = _token_emitter(on_event, "plan_token")
+        with self.tracer.span("plan", messages=len(planning_messages)):
+            if stream:
+                full_content = await self._stream_text(plan_completion_kwargs, emit)
+            else:
+                plan_completion = await self._complete(**plan_completion_kwargs)
+                full_content = plan_completion.choices[0].message.content
+                if emit is not None and full_content:
+                    emit(full_content)
+        return {"role": "assistant", "content": full_content}, full_content
+
+    def plan(self, messages: list[dict] | None = None, stream: bool = False) -> tuple[dict, str]:
+        """Blocking wrapper around :meth:`aplan`."""
+        return run_sync(self.aplan(messages, stream=stream))
+
+    # stream -> whether to stream assistant responses that are purely text (planning phase and final answer after finish)
+
+    async def arun(
+        self,
+        user_input: str,
+        mode: str = "react",
+        stream: bool = False,
+        on_event: EventCallback | None = None,
+    ):
+        """Answer *user_input*, calling tools until the model calls ``finish()``.
+
+        *on_event*, if given, receives an :class:`AgentEvent` for every step
+        as it happens; with *stream*, plan and answer text arrive token by
+        token.  See :meth:`aevents` / :meth:`events` for the iterator form.
+        """
+        # Accept both 'reAct' and 'react' (case-insensitive)
+        mode = mode.lower()
+        if mode not in {"react", "planning"}:
+            raise ValueError("mode must be either 'react/reAct' or 'planning'")
+
+        # One question at a time per session; different sessions never block
+        # each other.
+        if self._question_lock is None:
+            self._question_lock = asyncio.Lock()
+        async with self._question_lock:
+            self.refresh_dataset()
+            self._budget = QuestionBudget(
+                max_turns=self.settings.max_turns,
+                seconds=self.settings.question_seconds,
+                tokens=self.settings.question_tokens,
+                finish_seconds=self.settings.finish_seconds,
+                max_repeated_turns=self.settings.max_repeated_turns,
+            )
+            try:
+                with self.tracer.span("question", mode=mode, question_chars=len(user_input)) as span:
+                    # The router answers over the full dataset without context: a
+                    # question asked on a selection or after earlier turns may
+                    # refer to them, so it goes to the agent.
+                    fresh = self.subset is None and len(self.messages) == 1
+                    fast = fast_path.get_router().route(user_input) if self.settings.fast_path and fresh else None
+                    if fast is not None:
+                        span.set(fast_path=fast.kind)
+                        answer = self._answer_fast(user_input, fast, on_event)
+                    else:
+                        start = time.perf_counter()
+                        answer = await self._arun(user_input, mode, stream, on_event)
+                        if self.settings.fast_path:
+                            fast_path.get_router().record_fallback(time.perf_counter() - start)
+                    report = self._budget.report()
+                    span.set(answer_chars=len(answer or ""), turns=report["turns"], tool_calls=report["tool_calls"],
+                             repeated_calls=report["repeated_calls"], budget_stop=report["stop_reason"])
+            finally:
+                self.last_budget, self._budget = self._budget.report(), None
+        if on_event is not None:
+            on_event(AgentEvent("done", answer, {"budget": self.last_budget}))
+        return answer
+
+    def run(self, user_input: str, mode: str = "react", stream: bool = False):
+        """Blocking wrapper around :meth:`arun`."""
+        return run_sync(self.arun(user_input, mode=mode, stream=stream))
+
+    async def aevents(self, user_input: str, mode: str = "react") -> AsyncIterator[AgentEvent]:
+        """Answer *user_input*, yielding :class:`AgentEvent` objects as they occur.
+
+        The last event is ``done``.  Closing the iterator early cancels the
+        question.
+        """
+        events: asyncio.Queue[AgentEvent | None] = asyncio.Queue()
+        task = asyncio.ensure_future(self.arun(user_input, mode, stream=True, on_event=events.put_nowait))
+        task.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            await task  # re-raise a failure of the loop
+        finally:
+            task.cancel()
+
+    def events(self, user_input: str, mode: str = "react") -> Iterator[AgentEvent]:
+        """Blocking generator form of :meth:`aevents`.
+
+        The question runs on the shared background loop while the calling
+        thread (e.g. a Streamlit script) consumes the events.
+        """
+        events: queue.SimpleQueue[AgentEvent | None] = queue.SimpleQueue()
+        future = asyncio.run_coroutine_threadsafe(
+            self.arun(user_input, mode, stream=True, on_event=events.put), _background_loop.get()
+        )
+        future.add_done_callback(lambda _: events.put(None))
+        try:
+            while (event := events.get()) is not None:
+                yield event
+            future.result()
+        finally:
+            future.cancel()
+
+    def _answer_fast(self, user_input: str, fast: fast_path.FastAnswer, on_event: EventCallback | None) -> str:
+        """Record a fast-path answer in the history as if the agent had given it."""
+        self.history.begin_episode(self.messages)
+        self.messages.append({"role": "user", "content": user_input})
+        self.messages.append({"role": "assistant", "content": fast.text})
+        self._log(f"Fast path ({fast.kind}, confidence {fast.confidence}): {fast.text}")
+        if on_event is not None:
+            on_event(AgentEvent("answer_token", fast.text))
+        return fast.text
+
+    async def _arun(self, user_input: str, mode: str, stream: bool, on_event: EventCallback | None = None):
+        messages = self.messages
+        if self.settings.compact_schema:
+            # Stable prefix: the vocabulary only changes when ingested rows
+            # bring new labels.
+            system = f"{SYSTEM_PROMPT}\n{get_vocabulary()}"
+            if messages[0]["content"] != system:
+                messages[0] = {"role": "system", "content": system}
+        self.history.begin_episode(messages)
+        messages.append({"role": "user", "content": user_input})
+        self._question_start = len(messages) - 1
+        budget = self._budget
+
+        # Planning mode: the LLM submits the whole plan, which runs locally;
+        # only the answer (or a repair) needs another round trip.
+        if mode == "planning":
+            answer = await self._arun_plan(stream, on_event)
+            if answer is not None:
+                return answer
+            # The plan could not be repaired: continue step by step.
+            messages.append({"role": "user", "content": "Please execute the remaining steps step-by-step."})
+
+        while True:
+            reason = budget.exhausted()
+            if reason is not None:
+                return await self._forced_answer(reason, stream, on_event)
+            budget.charge_turn()
+            try:
+                completion = await budget.within(self._complete(
+                    model=self.settings.model,
+                    messages=self.history.fit(messages),
+                    tools=self.tools,
+                ))
+            except asyncio.TimeoutError:
+                return await self._forced_answer("time", stream, on_event)
+
+            choice = completion.choices[0]
+            self._log(f"Response Content: {choice.message.content}")
+
+            # Add the assistant's message to the conversation
+            messages.append(_message_dict(choice.message))
+
+            tool_calls = choice.message.tool_calls
+            if not tool_calls:
+                # No tool calls, return the response
+                if on_event is not None and choice.message.content:
+                    on_event(AgentEvent("answer_token", choice.message.content))
+                return choice.message.content
+
+            self._log(f"\nTool Calls ({len(tool_calls)}):")
+            repeated = budget.repeated_calls
+            messages.extend(await self._execute_tool_calls(tool_calls, on_event or _ignore))
+
+            # If finish() was called, get final response
+            if any(call.function.name == "finish" for call in tool_calls):
+                return await self._final_answer(stream, on_event)
+            budget.end_turn(len(tool_calls), budget.repeated_calls - repeated)
+
+    async def asubmit_plan(
+        self,
+        messages: list[dict] | None = None,
+        done: frozenset[str] = frozenset(),
+        problems: str | None = None,
+        on_event: EventCallback | None = None,
+    ) -> list[planner.PlanStep]:
+        """Ask the LLM for a structured plan through a forced ``submit_plan`` call.
+
+        Parameters
+        ----------
+        messages : list[dict], optional
+            Conversation to plan for; defaults to this session's history.
+        done : frozenset[str]
+            Ids of steps that already succeeded, which the plan may build on.
+        problems : str, optional
+            Description of the steps that failed; turns the request into a
+            repair of the previous plan.
+        on_event : callable, optional
+            Receives the rendered plan as one ``plan_token`` event.
+
+        Returns
+        -------
+        list[planner.PlanStep]
+            The validated steps (see :func:`planner.parse_plan`).
+
+        Raises
+        ------
+        planner.PlanError
+            If the model does not submit a usable plan.
+        """
+        if messages is None:
+            messages = self.messages
+        prompt = STRUCTURED_PLANNING_PROMPT if problems is None else REPAIR_PROMPT.format(problems=problems)
+        planning_messages = self.history.fit(messages) + [{"role": "system", "content": prompt}]
+        plan_tool = planner.plan_tool([t.name for t in sorted(registry, key=lambda t: t.name)])
+        with self.tracer.span("plan", messages=len(planning_messages), repair=problems is not None) as span:
+            completion = await self._complete(
+                model=self.settings.model,
+                messages=planning_messages,
+                tools=[*self.tools, plan_tool],
+                tool_choice={"type": "function", "function": {"name": planner.PLAN_TOOL_NAME}},
+            )
+            calls = [
+                call for call in completion.choices[0].message.tool_calls or ()
+                if call.function.name == planner.PLAN_TOOL_NAME
+            ]
+            if not calls:
+                span.fail("no plan submitted")
+                raise planner.PlanError(f"no {planner.PLAN_TOOL_NAME} call in the response")
+            try:
+                steps = planner.parse_plan(calls[0].function.arguments, done)
+                planner.dependencies(steps, _is_stateful)
+            except planner.PlanError as e:
+                span.fail(str(e))
+                raise
+            span.set(steps=len(steps), invalid_steps=sum(s.error is not None for s in steps))
+
+        rendered = planner.render(steps)
+        self._log("Plan:\n" + rendered)
+        if on_event is not None:
+            on_event(AgentEvent("plan_token", rendered))
+        return steps
+
+    async def _arun_plan(self, stream: bool, on_event: EventCallback | None = None) -> str | None:
+        """Answer the current question from a structured plan executed locally.
+
+        Returns ``None`` when the plan still has failed steps after
+        ``settings.plan_repairs`` repair requests, leaving their results in
+        the history for the ReAct loop to continue from.
+        """
+        results: dict[str, planner.StepResult] = {}
+        problems = None
+        budget = self._budget
+        for _ in range(self.settings.plan_repairs + 1):
+            reason = budget.exhausted()
+            if reason is not None:
+                return await self._forced_answer(reason, stream, on_event)
+            budget.charge_turn()
+            done = frozenset(i for i, r in results.items() if r.ok)
+            try:
+                steps = await budget.within(self.asubmit_plan(self.messages, done, problems, on_event))
+            except planner.PlanError as e:
+                problems = f"the plan was rejected ({e})"
+                continue
+            except asyncio.TimeoutError:
+                return await self._forced_answer("time", stream, on_event)
+            if steps:
+                self.messages.extend(await self._execute_plan(steps, results, on_event or _ignore))
+            failed = [s for s in steps if not results[s.id].ok]
+            if not failed:
+                return await self._final_answer(stream, on_event)
+            problems = "; ".join(f"step {s.id!r} ({s.tool}): {results[s.id].content}" for s in failed)
+        return None
+
+    async def _forced_answer(self, reason: str, stream: bool, on_event: EventCallback | None = None) -> str:
+        """Answer from the results gathered so far, without calling more tools."""
+        self._log(f"\nStopping early ({REASONS[reason]} reached): answering from the results so far.")
+        self.messages.append({"role": "user", "content": BUDGET_PROMPT.format(reason=REASONS[reason])})
+        return await self._final_answer(stream, on_event)
+
+    def _gathered_answer(self) -> str:
+        """Answer without the LLM: the tool results of the current question."""
+        calls: dict[str, str] = {}
+        lines = []
+        for message in self.messages[self._question_start:]:
+            for call in message.get("tool_calls") or ():
+                calls[call["id"]] = f"{call['function']['name']}({call['function']['arguments']})"
+            if message["role"] == "tool":
+                content = message["content"]
+                content = content if len(content) <= 300 else content[:300] + "…"
+                lines.append(f"- {calls.get(message['tool_call_id'], 'tool')}: {content}")
+        reason = REASONS[self._budget.stop_reason]
+        if not lines:
+            return f"I could not answer this question within the {reason}, and no data was gathered."
+        return "\n".join([f"I could not finish this question within the {reason}. Results gathered so far:", *lines])
+
+    async def _final_answer(self, stream: bool, on_event: EventCallback | None = None) -> str:
+        """Ask the model for the answer, without tools.
+
+        The call gets the time left of the question's budget, and at least
+        ``settings.finish_seconds``.  If a question stopped by its budget
+        gets no answer either, the tool results gathered so far are returned.
+        Any other failure is answered with an error message, or raised with
+        ``settings.raise_errors``.
+        """
+        emit = _token_emitter(on_event, "answer_token")
+        try:
+            final_completion_kwargs = {
+                "model": self.settings.model,
+                "messages": self.history.fit(self.messages),
+            }
+            # The user waits on this call alone: hedge it when it is slow.
+            with transport.call_options(hedge=True):
+                if stream:
+                    final_response = await self._bounded(self._stream_text(final_completion_kwargs, emit))
+                else:
+                    final_completion = await self._bounded(self._complete(**final_completion_kwargs))
+                    final_response = final_completion.choices[0].message.content
+                    if emit is not None and final_response:
+                        emit(final_response)
+        except Exception as e:
+            if self._budget is None or self._budget.stop_reason is None:
+                if self.settings.raise_errors:
+                    raise
+                error_msg = f"Error getting final response: {str(e)}"
+                self._log(error_msg)
+                return f"I encountered an error while processing your request: {error_msg}"
+            self._log(f"No final response ({type(e).__name__}); returning the results so far.")
+            final_response = self._gathered_answer()
+            if emit is not None:
+                emit(final_response)
+        self._log(f"\nFinal response: {final_response}")
+        self.messages.append({"role": "assistant", "content": final_response})
+        return final_response
+
+    def _bounded(self, awaitable):
+        """*awaitable* limited to the final answer's time (see :meth:`_final_answer`)."""
+        return awaitable if self._budget is None else self._budget.within(awaitable, finishing=True)
@@ -1,18 +1,18 @@
-import os
 import streamlit as st
-from dotenv import load_dotenv
-# Import the pipeline from main.py so we can delegate user queries
-from main import run as process_query
-# openai/OpenAI import no longer needed here since main.py handles any OpenAI calls
-from openai import OpenAI
+# Each browser session gets its own AgentSession (history + filter state).
+# The dataset, tool schema and OpenAI client behind it are built lazily on the
+# first query and then shared by every session served by this process.
+from agent import AgentSession
 
 # Basic Streamlit page configuration
 st.set_page_config(page_title="LLM Chat", page_icon="🧠")
 st.title("🧠 LLM Chat")
 
-# Initialize chat history in the session state
+# Initialize chat history and the agent in the session state
 if "messages" not in st.session_state:
     st.session_state["messages"] = []
+if "agent" not in st.session_state:
+    st.session_state["agent"] = AgentSession()
 
 # Helper function to display chat messages stored in session state
 for msg in st.session_state.messages:
@@ -38,13 +38,37 @@ if prompt:
     # Add user's message to the session history
     st.session_state.messages.append({"role": "user", "content": prompt})
 
-    # Placeholder for the assistant's response
+    # Render the agent's progress as it happens: tool calls (and the plan in
+    # planning mode) in a collapsible status box, the answer token by token.
     with st.chat_message("assistant"):
+        status = st.status("Thinking…", expanded=False)
         response_placeholder = st.empty()
+        plan_placeholder = None
+        plan_text = ""
+        response_text = ""
 
         try:
-            # Delegate the user prompt to main.py's run function
-            response_text = process_query(prompt, mode=mode_choice.lower())
+            # Delegate the user prompt to this browser session's agent
+            for event in st.session_state.agent.events(prompt, mode=mode_choice.lower()):
+                if event.kind == "plan_token":
+                    if plan_placeholder is None:
+                        plan_placeholder = status.empty()
+                    plan_text += event.text
+                    plan_placeholder.markdown(plan_text)
+                elif event.kind == "tool_start":
+                    status.update(label=f"Calling `{event.data['name']}`…")
+                elif event.kind == "tool_output":
+                    status.dataframe(event.data["rows"])
+                elif event.kind == "tool_end":
+                    status.markdown(
+                        f"`{event.data['name']}({event.data['arguments']})` → {event.text[:300]}"
+                    )
+                elif event.kind == "answer_token":
+                    response_text += event.text
+                    response_placeholder.markdown(response_text + "▌")
+                elif event.kind == "done":
+                    response_text = event.text or ""
+            status.update(label="Done", state="complete")
 
             # Render the response in the UI
             response_placeholder.markdown(response_text)
@@ -54,6 +78,7 @@ if prompt:
                 {"role": "assistant", "content": response_text}
             )
         except Exception as e:
+            status.update(label="Failed", state="error")
             error_msg = f"Error fetching response: {e}"
             response_placeholder.markdown(error_msg)
             st.session_state.messages.append(
@@ -0,0 +1,237 @@
+"""Batch runner: answer every question of a JSONL file with isolated sessions.
+
+Each input line is a JSON object holding a question (``question`` field by
+default) and optionally an ``id``; lines without an id are identified by
+their line number.  Questions are read lazily and answered by at most
+``--concurrency`` :class:`agent.AgentSession` objects at a time, one fresh
+session per question.  All LLM requests, retries and hedged duplicates
+included, share token buckets limiting requests (``--rpm``) and tokens
+(``--tpm``) per minute.
+
+One result line is appended to the output file as soon as a question
+finishes (answer, tool trace, timings, budget report, error) and flushed to
+disk.  Re-running
+the same command after a crash skips every id that already has a successful
+result, so a run can be resumed at any point.
+
+Usage::
+
+    $ python batch.py questions.jsonl -o results.jsonl [--concurrency 8]
+          [--rpm 500] [--tpm 200000] [--mode react] [--model gpt-4o-mini]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from dataclasses import replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+import llm_config
+from agent import AgentEvent, AgentSession, SessionSettings
+from rate_limit import RateLimitedClient, TokenBucket
+
+__all__ = ["read_questions", "completed_ids", "run_batch"]
+
+# Tool results are cut to this length in the trace
+_TRACE_RESULT_CHARS = 2000
+
+
+def read_questions(path: Path, question_field: str = "question", id_field: str = "id") -> Iterator[tuple[str, str]]:
+    """Yield ``(id, question)`` for every non-empty line of *path*, lazily."""
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if question_field not in item:
+                raise ValueError(f"{path}:{lineno}: missing field {question_field!r}")
+            yield str(item.get(id_field, lineno)), item[question_field]
+
+
+def completed_ids(path: Path) -> set[str]:
+    """Return the ids that already have a successful result in *path*.
+
+    A truncated last line (left by a crash mid-write) is ignored.
+    """
+    done: set[str] = set()
+    if not path.exists():
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if result.get("error") is None:
+                done.add(result["id"])
+    return done
+
+
+class _ResultWriter:
+    """Appends result lines and makes each one durable before the next."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "a+b")
+        # Start on a fresh line if the previous run died mid-write.
+        if self._file.tell() > 0:
+            self._file.seek(-1, os.SEEK_END)
+            if self._file.read(1) != b"\n":
+                self._file.write(b"\n")
+
+    def write(self, result: dict) -> None:
+        self._file.write(json.dumps(result, ensure_ascii=False).encode() + b"\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+async def _answer(
+    question_id: str,
+    question: str,
+    mode: str,
+    settings: SessionSettings,
+    client: RateLimitedClient,
+) -> dict:
+    session = AgentSession(settings, client=client)
+    trace: list[dict] = []
+    first_event: float | None = None
+    start = time.perf_counter()
+
+    def on_event(event: AgentEvent) -> None:
+        nonlocal first_event
+        if first_event is None:
+            first_event = time.perf_counter() - start
+        if event.kind == "tool_end":
+            trace.append(
+                {
+                    "tool": event.data["name"],
+                    "arguments": event.data["arguments"],
+                    "result": event.text[:_TRACE_RESULT_CHARS],
+                    "seconds": round(event.data["seconds"], 6),
+                }
+            )
+
+    answer, error = None, None
+    try:
+        answer = await session.arun(question, mode, on_event=on_event)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    seconds = time.perf_counter() - start
+    return {
+        "id": question_id,
+        "question": question,
+        "mode": mode,
+        "answer": answer,
+        "error": error,
+        "trace": trace,
+        "timings": {
+            "seconds": round(seconds, 6),
+            "first_event_seconds": round(first_event, 6) if first_event is not None else None,
+            "tool_seconds": round(sum(step["seconds"] for step in trace), 6),
+            "llm_calls": client.calls,
+            "llm_extra_attempts": client.extra_attempts,
+            "rate_limit_wait_seconds": round(client.waited, 6),
+        },
+        "tokens_saved": session.history.stats()["tokens_saved"],
+        "budget": session.last_budget,
+        "finished": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+async def run_batch(
+    input_path: Path,
+    output_path: Path,
+    *,
+    mode: str = "react",
+    concurrency: int = 8,
+    rpm: float | None = None,
+    tpm: float | None = None,
+    settings: SessionSettings | None = None,
+    question_field: str = "question",
+    id_field: str = "id",
+    client=None,
+) -> dict:
+    """Answer the questions of *input_path*, appending results to *output_path*.
+
+    Returns a summary with the number of questions answered, failed and
+    skipped (already done) plus the wall-clock time.
+    """
+    # A failed final answer must be recorded as an error, so that a resumed
+    # run asks the question again.
+    settings = replace(settings or SessionSettings(verbose=False), raise_errors=True)
+    base_client = client if client is not None else llm_config.get_async_client()
+    requests = TokenBucket(rpm) if rpm else None
+    tokens = TokenBucket(tpm) if tpm else None
+
+    done = completed_ids(output_path)
+    writer = _ResultWriter(output_path)
+    questions = read_questions(input_path, question_field, id_field)
+    summary = {"answered": 0, "failed": 0, "skipped": 0}
+    start = time.perf_counter()
+
+    async def worker() -> None:
+        # Workers pull from the shared iterator, so the input is read only as
+        # fast as questions are answered.
+        for question_id, question in questions:
+            if question_id in done:
+                summary["skipped"] += 1
+                continue
+            session_client = RateLimitedClient(base_client, requests, tokens, settings.model)
+            result = await _answer(question_id, question, mode, settings, session_client)
+            writer.write(result)
+            summary["failed" if result["error"] else "answered"] += 1
+            finished = summary["answered"] + summary["failed"]
+            if finished % 50 == 0:
+                print(f"{finished} done ({summary['failed']} failed)", file=sys.stderr)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        writer.close()
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", type=Path, help="JSONL file with one question per line")
+    parser.add_argument("-o", "--output", type=Path, required=True, help="results JSONL (appended to)")
+    parser.add_argument("--mode", choices=("react", "planning"), default="react")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=float, help="maximum requests per minute")
+    parser.add_argument("--tpm", type=float, help="maximum tokens per minute")
+    parser.add_argument("--model", default=SessionSettings.model)
+    parser.add_argument("--question-field", default="question")
+    parser.add_argument("--id-field", default="id")
+    args = parser.parse_args()
+
+    summary = asyncio.run(
+        run_batch(
+            args.input,
+            args.output,
+            mode=args.mode,
+            concurrency=args.concurrency,
+            rpm=args.rpm,
+            tpm=args.tpm,
+            settings=SessionSettings(model=args.model, verbose=False),
+            question_field=args.question_field,
+            id_field=args.id_field,
+        )
+    )
+    print(json.dumps(summary))
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
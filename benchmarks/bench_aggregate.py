@@ -0,0 +1,138 @@
+"""Round trips and wall time: per-label counting vs. the ``aggregate`` tool.
+
+Replays typical ranking questions through real ``AgentSession`` objects with
+two scripted tool-call strategies:
+
+* ``per-label`` – what the model does with the counting tools: list the
+  labels, then one ``count_*`` call per label, then ``finish``;
+* ``aggregate`` – one ``aggregate`` call (after the filter, in the same
+  turn), then ``finish``.
+
+Each LLM call of the scripted client sleeps ``--latency-ms`` to stand in for
+the API.  Reports LLM round trips, tool calls and wall time per question and
+checks that both strategies reach the same answer; exits non-zero otherwise.
+
+Usage::
+
+    $ python benchmarks/bench_aggregate.py [--latency-ms 300] [--repeat 3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data_loader as dl  # noqa: E402
+from agent import AgentSession, SessionSettings  # noqa: E402
+from llm_cache import CompletionCache  # noqa: E402
+
+
+class _ScriptClient:
+    """Returns the scripted tool-call turns in order, then a text answer."""
+
+    def __init__(self, turns, answer, latency: float):
+        self.turns = list(turns)
+        self.answer = answer
+        self.latency = latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, *, messages, tools=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.calls += 1
+        if tools is None or not self.turns:
+            message = SimpleNamespace(role="assistant", content=self.answer(messages), tool_calls=None)
+        else:
+            calls = [
+                SimpleNamespace(id=f"call_{self.calls}_{i}",
+                                function=SimpleNamespace(name=name, arguments=json.dumps(args)))
+                for i, (name, args) in enumerate(self.turns.pop(0))
+            ]
+            message = SimpleNamespace(role="assistant", content=None, tool_calls=calls)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def _tool_results(messages) -> list[str]:
+    return [m["content"] for m in messages if m["role"] == "tool"]
+
+
+def _argmax_of_counts(labels: list[str]):
+    """Answer from per-label count results: the label with the largest count."""
+    def answer(messages):
+        counts = [int(c) for c in _tool_results(messages)[-len(labels) - 1:-1]]
+        return labels[max(range(len(labels)), key=counts.__getitem__)]
+    return answer
+
+
+def _top_group(column: str):
+    """Answer from an ``aggregate`` result: its first group."""
+    def answer(messages):
+        result = next(r for r in _tool_results(messages) if r.startswith("{'rows'"))
+        return ast.literal_eval(result)["groups"][0][column]
+    return answer
+
+
+def _scenarios(dataset):
+    intents, categories = dataset.intent_enum, dataset.category_enum
+    count_intents = [("count_intent", {"intent_name": i}) for i in intents]
+    count_categories = [("count_category", {"category_name": c}) for c in categories]
+    refund = ("select_semantic_category", {"category_names": ["REFUND"]})
+    finish = [("finish", {})]
+    return {
+        "most frequent intent": (
+            ([[("get_all_intents", {})], count_intents, finish], _argmax_of_counts(intents)),
+            ([[("aggregate", {"group_by": ["intent"], "top_k": 1, "order": None})], finish],
+             _top_group("intent")),
+        ),
+        "most frequent category": (
+            ([[("get_all_categories", {})], count_categories, finish], _argmax_of_counts(categories)),
+            ([[("aggregate", {"group_by": ["category"], "top_k": 1, "order": None})], finish],
+             _top_group("category")),
+        ),
+        "biggest intent in REFUND": (
+            ([[refund, ("get_all_intents", {})], count_intents, finish], _argmax_of_counts(intents)),
+            ([[refund, ("aggregate", {"group_by": ["intent"], "top_k": 1, "order": None})], finish],
+             _top_group("intent")),
+        ),
+    }
+
+
+async def _ask(turns, answer, latency: float) -> tuple[str, int, int, float]:
+    client = _ScriptClient(turns, answer, latency)
+    session = AgentSession(SessionSettings(verbose=False, fast_path=False), client, CompletionCache(mode="off"))
+    tool_calls = sum(len(turn) for turn in turns)
+    start = time.perf_counter()
+    result = await session.arun("question")
+    return result, client.calls, tool_calls, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    print(f"{'question':<26}{'strategy':<11}{'LLM calls':>10}{'tool calls':>11}{'seconds':>9}")
+    for question, strategies in _scenarios(dl.get_dataset()).items():
+        answers = set()
+        for label, (turns, answer) in zip(("per-label", "aggregate"), strategies):
+            runs = [asyncio.run(_ask(turns, answer, latency)) for _ in range(args.repeat)]
+            result, llm_calls, tool_calls, _ = runs[0]
+            answers.add(result)
+            best = min(run[3] for run in runs)
+            print(f"{question:<26}{label:<11}{llm_calls:>10}{tool_calls:>11}{best:>9.3f}")
+        if len(answers) != 1:
+            sys.exit(f"strategies disagree on {question!r}: {answers}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Fast-path router: hit rate, correctness and latency saved.
+
+Runs a fixed mix of aggregate and open questions through agent sessions
+backed by the local mock API (``mock_openai_server``), once with the fast
+path and once without.  Checks that every fast-path answer matches the
+dataset counts, that the open questions fall back to the agent and that
+follow-up questions (after an earlier turn or on a selection) never reach
+the router; exits non-zero otherwise.  Reports the router's hit rate, the mean latency of
+fast-path and agent answers, and the wall-clock time saved.
+
+Usage::
+
+    $ python benchmarks/bench_fast_path.py [--latency-ms 20] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data_loader as dl  # noqa: E402
+import llm_config  # noqa: E402
+from agent import AgentSession, SessionSettings  # noqa: E402
+from fast_path import FastPathRouter, get_router  # noqa: E402
+from llm_cache import CompletionCache  # noqa: E402
+from mock_openai_server import MockOpenAIServer  # noqa: E402
+
+
+def _questions(dataset) -> list[tuple[str, str | None]]:
+    """Return ``(question, expected answer substring)``; ``None`` means "must fall back"."""
+    intents = dataset.label_indexes["intent"]
+    top = intents.labels[int(intents.counts.argmax())]
+    refund = dataset.full.count("category", "REFUND")
+    return [
+        ("What is the most frequent intent?", f"'{top}'"),
+        ("Which intent has the most examples?", f"'{top}'"),
+        ("How many rows are there for intent cancel_order?", str(dataset.full.count("intent", "cancel_order"))),
+        ("how many examples in category REFUND", str(refund)),
+        ("List all categories", ", ".join(dataset.category_enum)),
+        ("How many intents are there?", str(len(dataset.intent_enum))),
+        ("How many rows are in the dataset?", str(len(dataset.full))),
+        ("Which intents in the ORDER category are most frequent?", None),
+        ("Show me three examples of customers asking for a refund", None),
+        ("What do angry customers usually say about delivery?", None),
+        ("What is the second most frequent intent?", None),
+        ("Which intent is the 3rd most common?", None),
+        ("What are the top 5 intents?", None),
+        ("Which are the most and least frequent intents?", None),
+        ("What is the most frequent intent among refund requests?", None),
+        ("What is the most frequent intent in it?", None),
+        ("How many of those are there?", None),
+    ]
+
+
+async def _run(questions, fast: bool, repeat: int) -> float:
+    client = llm_config.get_async_client()
+    cache = CompletionCache(mode="off")
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for question, _expected in questions:
+            session = AgentSession(SessionSettings(verbose=False, fast_path=fast), client=client, cache=cache)
+            await session.arun(question)
+    return time.perf_counter() - start
+
+
+async def _follow_ups() -> list[str]:
+    """Questions asked after an earlier turn or on a selection must reach the agent."""
+    client = llm_config.get_async_client()
+    problems = []
+    after_turn = AgentSession(SessionSettings(verbose=False), client=client, cache=CompletionCache(mode="off"))
+    await after_turn.arun("How many intents are there?")
+    on_subset = AgentSession(SessionSettings(verbose=False), client=client, cache=CompletionCache(mode="off"))
+    on_subset.execute_tool("select_semantic_category", {"category_names": ["REFUND"]})
+    for name, session in (("after an earlier turn", after_turn), ("on an active subset", on_subset)):
+        before = get_router().stats()["questions"]
+        await session.arun("What is the most frequent intent?")
+        if get_router().stats()["questions"] != before:
+            problems.append(f"fast path consulted for a question asked {name}")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    dataset = dl.get_dataset()
+    questions = _questions(dataset)
+
+    router = FastPathRouter()
+    for question, expected in questions:
+        answer = router.route(question)
+        if expected is None and answer is not None:
+            sys.exit(f"fast path answered an open question: {question!r} -> {answer.text!r}")
+        if expected is not None and (answer is None or expected not in answer.text):
+            sys.exit(f"fast path missed or got wrong: {question!r} -> {answer and answer.text!r}")
+    print(f"ok: {len(questions)} questions routed correctly")
+
+    server = MockOpenAIServer(dataset.intent_enum, args.latency_ms / 1000).start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+    try:
+        slow = asyncio.run(_run(questions, False, args.repeat))
+        fast = asyncio.run(_run(questions, True, args.repeat))
+        problems = asyncio.run(_follow_ups())
+    finally:
+        server.stop()
+
+    stats = get_router().stats()
+    hits = stats["hits"]
+    print(f"hit rate {stats['hit_rate']:.0%} ({hits}/{stats['questions']})")
+    print(f"mean latency: fast path {stats['fast_seconds'] / max(hits, 1) * 1e3:.3f} ms, "
+          f"agent {stats['mean_fallback_seconds'] * 1e3:.1f} ms")
+    print(f"total: without fast path {slow:.2f}s, with {fast:.2f}s "
+          f"(router estimate: {stats['estimated_seconds_saved']:.2f}s saved)")
+    if problems:
+        sys.exit("\n".join(problems))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Per-question guards against models that never finish.
+
+Runs ``--sessions`` concurrent ``AgentSession`` objects per scenario against a
+scripted client whose calls sleep ``--latency-ms``:
+
+* ``finishes``   selects, counts and calls ``finish`` (no guard applies);
+* ``wanders``    counts another intent every turn and never finishes
+  (stopped by ``max_turns``);
+* ``repeats``    makes the same select and count calls every turn (repeats
+  answered from the first result, stopped after ``max_repeated_turns``);
+* ``verbose``    reports 4000 tokens per call (stopped by the token budget);
+* ``slow``       takes ten times as long per call (stopped by the time limit);
+* ``hangs``      wanders, and never returns the final answer (answered
+  locally from the tool results once the time left runs out).
+
+Reports, per scenario, the stop reasons and p50/p99 of turns, tokens and
+seconds per question from the budget reports, and checks that every question
+ended with an answer, for the expected reason, within
+``question_seconds + finish_seconds``; exits non-zero otherwise.
+
+Usage::
+
+    $ python benchmarks/bench_guards.py [--sessions 16] [--latency-ms 20] [--question-seconds 1]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data_loader as dl  # noqa: E402
+from agent import AgentSession, SessionSettings  # noqa: E402
+from llm_cache import CompletionCache  # noqa: E402
+
+# scenario -> expected stop reason
+SCENARIOS = {
+    "finishes": None,
+    "wanders": "turns",
+    "repeats": "repeats",
+    "verbose": "tokens",
+    "slow": "time",
+    "hangs": "turns",
+}
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _ScriptClient:
+    """Plays one misbehaving model (see the module docstring)."""
+
+    def __init__(self, scenario: str, latency: float, intents: list[str]):
+        self.scenario = scenario
+        self.latency = latency * (10 if scenario == "slow" else 1)
+        self.intents = intents
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=self)
+
+    def _turn(self) -> list[tuple[str, dict]]:
+        n = self.calls
+        if self.scenario == "finishes":
+            return [("select_semantic_intent", {"intent_names": self.intents[:2]}),
+                    ("count_intent", {"intent_name": self.intents[0]}), ("finish", {})]
+        if self.scenario == "repeats":
+            return [("select_semantic_intent", {"intent_names": self.intents[:2]}),
+                    ("count_intent", {"intent_name": self.intents[0]})]
+        return [("count_intent", {"intent_name": self.intents[n % len(self.intents)]})]
+
+    async def create(self, *, messages, tools=None, **kwargs):
+        self.calls += 1
+        if tools is None and self.scenario == "hangs":
+            await asyncio.Event().wait()
+        await asyncio.sleep(self.latency)
+        content, calls = None, None
+        if tools is None:
+            content = "answer: " + ",".join(m["content"] for m in messages if m["role"] == "tool")[:200]
+        else:
+            calls = [
+                SimpleNamespace(id=f"call_{self.calls}_{i}",
+                                function=SimpleNamespace(name=name, arguments=json.dumps(args)))
+                for i, (name, args) in enumerate(self._turn())
+            ]
+        tokens = 4000 if self.scenario == "verbose" else 400
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=content, tool_calls=calls))],
+            usage=SimpleNamespace(prompt_tokens=tokens - 50, completion_tokens=50, total_tokens=tokens),
+        )
+
+
+async def _question(scenario: str, settings: SessionSettings, latency: float, intents: list[str]):
+    client = _ScriptClient(scenario, latency, intents)
+    session = AgentSession(settings, client, CompletionCache(mode="off"))
+    answer = await session.arun("which intents are the biggest?")
+    tool_messages = [m["content"] for m in session.messages if m["role"] == "tool"]
+    return answer, session.last_budget, tool_messages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=16, help="concurrent questions per scenario")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--max-turns", type=int, default=8)
+    parser.add_argument("--question-seconds", type=float, default=1.0)
+    parser.add_argument("--question-tokens", type=int, default=10000)
+    parser.add_argument("--finish-seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    settings = SessionSettings(
+        verbose=False, fast_path=False, max_turns=args.max_turns, question_seconds=args.question_seconds,
+        question_tokens=args.question_tokens, finish_seconds=args.finish_seconds,
+    )
+    intents = dl.get_dataset().intent_enum
+    limit = args.question_seconds + args.finish_seconds + 0.25  # slack for scheduling
+    problems = []
+    print(f"{'scenario':<10}{'stops':<14}{'turns p50/p99':>15}{'tokens p50/p99':>17}{'seconds p50/p99':>18}"
+          f"{'repeats':>9}")
+    for scenario, expected in SCENARIOS.items():
+        async def run_all():
+            return await asyncio.gather(*(_question(scenario, settings, args.latency_ms / 1000, intents)
+                                          for _ in range(args.sessions)))
+
+        results = asyncio.run(run_all())
+        reports = [report for _, report, _ in results]
+        stops = Counter(report["stop_reason"] or "-" for report in reports)
+        cells = [
+            f"{_percentile(values, 0.5):{spec}}/{_percentile(values, 0.99):{spec}}"
+            for key, spec in (("turns", "d"), ("tokens", "d"), ("seconds", ".3f"))
+            for values in [[report[key] for report in reports]]
+        ]
+        print(f"{scenario:<10}{', '.join(f'{r} {n}' for r, n in stops.items()):<14}{cells[0]:>15}{cells[1]:>17}"
+              f"{cells[2]:>18}{sum(report['repeated_calls'] for report in reports):>9}")
+        for answer, report, tool_messages in results:
+            if not answer:
+                problems.append(f"{scenario}: no answer")
+            if report["stop_reason"] != expected:
+                problems.append(f"{scenario}: stopped by {report['stop_reason']}, expected {expected}")
+            if report["seconds"] > limit:
+                problems.append(f"{scenario}: took {report['seconds']:.2f} s, limit {limit:.2f} s")
+            if scenario == "repeats" and any(m.split(") ", 1)[-1] != tool_messages[i % 2]
+                                             for i, m in enumerate(tool_messages)):
+                problems.append("repeats: a repeated call returned another result than the first call")
+            if scenario == "hangs" and "Results gathered so far" not in answer:
+                problems.append("hangs: the answer was not built from the gathered results")
+    if problems:
+        sys.exit("\n".join(sorted(set(problems))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Import-time benchmark built on ``python -X importtime``.
+
+For each module, a fresh interpreter imports it with ``-X importtime`` and the
+cumulative time reported for that module is collected.  With ``--budget-ms``
+the script exits non-zero when any module exceeds the budget, so it can be
+used to catch startup regressions.
+
+Usage::
+
+    $ python benchmarks/bench_import.py [--repeat 5] [--budget-ms 50] [--top 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Modules whose import must stay cheap, plus data_loader for reference.
+MODULES = ["main", "tool_schema", "llm_config", "lazy", "data_loader"]
+
+
+def _importtime(module: str) -> list[tuple[str, int, int]]:
+    """Return ``(name, self_us, cumulative_us)`` rows for importing *module*."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument("--top", type=int, default=5, help="slowest dependencies to list")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    args = parser.parse_args()
+
+    over_budget = []
+    for module in args.modules:
+        samples = []
+        rows: list[tuple[str, int, int]] = []
+        for _ in range(args.repeat):
+            rows = _importtime(module)
+            samples.append(next(cum for name, _, cum in rows if name == module) / 1e3)
+        median = statistics.median(samples)
+        print(f"{module:<12} median={median:8.2f} ms  min={min(samples):8.2f} ms")
+        for name, self_us, _ in sorted(rows, key=lambda r: r[1], reverse=True)[: args.top]:
+            print(f"    {name:<40} self={self_us / 1e3:7.2f} ms")
+        if args.budget_ms is not None and median > args.budget_ms and module != "data_loader":
+            over_budget.append(module)
+
+    if over_budget:
+        print(f"over budget ({args.budget_ms} ms): {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Ingest throughput and query latency while new rows are being ingested.
+
+Writes ``--batches`` JSONL files of ``--batch-rows`` tickets each (rows of the
+dataset with shuffled texts, a share of them with intents and categories the
+dataset does not have yet) and ingests them one after the other with
+:func:`ingest.ingest`.  Meanwhile ``--readers`` threads ask questions through
+their own ``AgentSession`` (refreshing the dataset version before each one,
+as ``arun`` does) and time the tool calls.  Reports
+
+* seconds and rows per second per batch, next to a full reload (building a
+  ``Dataset`` and both indexes from the whole table) for comparison; batches
+  that merged index segments are marked (their cost is amortised over the
+  batches merged);
+* p50/p99 latency of every tool with and without a concurrent ingest.
+
+Then checks that the last version answers like one built from scratch
+(label counts, enums, text matches and BM25 ranking) and that a session
+that pinned the first version still reads it unchanged; exits non-zero
+otherwise.
+
+Usage::
+
+    $ python benchmarks/bench_ingest.py [--batches 10] [--batch-rows 1000] [--readers 4] [--new-labels 0.1]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data_loader as dl  # noqa: E402
+import ingest  # noqa: E402
+import semantic_index  # noqa: E402
+import text_index  # noqa: E402
+from agent import AgentSession, SessionSettings  # noqa: E402
+
+QUERIES = ["refund", "cancel order", '"credit card"', "invoice AND NOT refund"]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float("nan")
+
+
+def _write_batches(dataset: dl.Dataset, args, directory: Path) -> list[Path]:
+    rng = np.random.default_rng(0)
+    records = dataset.records(np.arange(len(dataset.full)), ["instruction", "response", "intent", "category"])
+    paths = []
+    for b in range(args.batches):
+        picked = rng.choice(len(records), args.batch_rows, replace=False)
+        texts = rng.choice(len(records), args.batch_rows, replace=False)
+        lines = []
+        for i, (row, text) in enumerate(zip(picked, texts)):
+            record = {**records[row], "instruction": records[text]["instruction"]}
+            if rng.random() < args.new_labels:
+                record["intent"] = f"new_intent_{b}_{i % 3}"
+                record["category"] = f"NEW_CATEGORY_{b}"
+            lines.append(json.dumps(record))
+        path = directory / f"batch-{b}.jsonl"
+        path.write_text("\n".join(lines) + "\n")
+        paths.append(path)
+    return paths
+
+
+class _Reader(threading.Thread):
+    """Asks questions in a loop and records the latency of every tool call."""
+
+    def __init__(self, seed: int, stop: threading.Event):
+        super().__init__(daemon=True)
+        self.session = AgentSession(SessionSettings(verbose=False, memoize_tools=False), client=object())
+        self.rng = np.random.default_rng(seed)
+        self.stop = stop
+        self.latencies: list[tuple[float, str, float]] = []  # (end time, tool, seconds)
+        self.errors: list[str] = []
+
+    def _call(self, name: str, args: dict) -> None:
+        start = time.perf_counter()
+        try:
+            self.session.execute_tool(name, args)
+        except Exception as e:  # noqa: BLE001
+            self.errors.append(f"{name}: {e!r}")
+        end = time.perf_counter()
+        self.latencies.append((end, name, end - start))
+
+    def run(self) -> None:
+        while not self.stop.is_set():
+            self.session.refresh_dataset()
+            dataset = self.session.dataset
+            intent = dataset.intent_enum[int(self.rng.integers(len(dataset.intent_enum)))]
+            category = dataset.category_enum[int(self.rng.integers(len(dataset.category_enum)))]
+            self._call("select_semantic_category", {"category_names": [category]})
+            self._call("count_intent", {"intent_name": intent})
+            self._call("aggregate", {"group_by": ["intent"], "top_k": 5})
+            self._call("search_text", {"query": QUERIES[int(self.rng.integers(len(QUERIES)))], "handle": None})
+            self._call("find_similar_instructions", {"text": "my order never arrived", "top_k": 5})
+            self.session.reset()
+
+
+def _check(final: dl.Dataset, pinned: AgentSession, pinned_counts, first: dl.Dataset) -> list[str]:
+    problems = []
+    rebuilt = dl.Dataset(final.table.combine_chunks())
+    for column in dl.LABEL_COLUMNS:
+        if getattr(final, f"{column}_enum") != getattr(rebuilt, f"{column}_enum"):
+            problems.append(f"{column} enum differs from a full rebuild")
+        for label in getattr(rebuilt, f"{column}_enum"):
+            if final.full.count(column, label) != rebuilt.full.count(column, label):
+                problems.append(f"count of {column}={label} differs from a full rebuild")
+                break
+            rows = final.label_indexes[column].rows_for([label])
+            if not np.array_equal(rows, rebuilt.label_indexes[column].rows_for([label])):
+                problems.append(f"rows of {column}={label} differ from a full rebuild")
+                break
+    incremental, scratch = text_index.get_index(final), text_index.TextIndex.build(final.table)
+    for query in QUERIES:
+        a, b = incremental.search(query, top_k=10), scratch.search(query, top_k=10)
+        if not (np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1]) and np.allclose(a[2], b[2])):
+            problems.append(f"text search {query!r} differs from a full rebuild")
+    if pinned.dataset is not first or [pinned.execute_tool("count_category", {"category_name": c})
+                                       for c in first.category_enum] != pinned_counts:
+        problems.append("the pinned session does not read its original version")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--batch-rows", type=int, default=1000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--new-labels", type=float, default=0.1, help="share of rows with new labels")
+    parser.add_argument("--idle-seconds", type=float, default=2.0, help="latency baseline without ingest")
+    args = parser.parse_args()
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+
+    first = dl.get_dataset()
+    text_index.get_index(first), semantic_index.get_index(first)
+    start = time.perf_counter()
+    dl.Dataset(first.table)
+    text_index.TextIndex.build(first.table)
+    semantic_index.SemanticIndex.build(first.table.column("instruction"))
+    reload = time.perf_counter() - start
+
+    pinned = AgentSession(SessionSettings(verbose=False, memoize_tools=False), client=object())
+    pinned_counts = [pinned.execute_tool("count_category", {"category_name": c}) for c in first.category_enum]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = _write_batches(first, args, Path(tmp))
+        stop = threading.Event()
+        readers = [_Reader(seed, stop) for seed in range(args.readers)]
+        for reader in readers:
+            reader.start()
+        time.sleep(args.idle_seconds)
+        ingest_start = time.perf_counter()
+        timings = []
+        for path in paths:
+            t = time.perf_counter()
+            version = ingest.ingest(path)
+            segments = len(text_index.get_index(version).segments)
+            timings.append((time.perf_counter() - t, len(version.full), segments))
+        ingest_end = time.perf_counter()
+        time.sleep(0.2)
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+    print(f"full reload of {len(first.full)} rows (dataset + text + similarity index): {reload:.3f} s\n")
+    print(f"{'batch':>5}{'rows':>8}{'total rows':>12}{'seconds':>9}{'rows/s':>10}{'segments':>10}")
+    previous = 1
+    for i, (seconds, total, segments) in enumerate(timings):
+        merged = "  merged" if segments <= previous else ""
+        print(f"{i:>5}{args.batch_rows:>8}{total:>12}{seconds:>9.3f}{args.batch_rows / seconds:>10.0f}"
+              f"{segments:>10}{merged}")
+        previous = segments
+    total_seconds = sum(s for s, _, _ in timings)
+    print(f"{'all':>5}{args.batch_rows * len(timings):>8}{'':>12}{total_seconds:>9.3f}"
+          f"{args.batch_rows * len(timings) / total_seconds:>10.0f}")
+
+    calls = [c for reader in readers for c in reader.latencies]
+    print(f"\n{'':<28}{'idle':>25}{'during ingest':>25}")
+    print(f"{'tool latency':<28}" + f"{'calls':>7}{'p50 ms':>9}{'p99 ms':>9}" * 2)
+    for name in [None, *sorted({name for _, name, _ in calls})]:
+        row = f"{name or 'all tools':<28}"
+        for during in (False, True):
+            values = [1000 * s for end, n, s in calls
+                      if name in (None, n) and (ingest_start <= end <= ingest_end) == during and end <= ingest_end]
+            row += f"{len(values):>7}{_percentile(values, 0.5):>9.2f}{_percentile(values, 0.99):>9.2f}"
+        print(row)
+
+    problems = [f"reader error: {e}" for reader in readers for e in reader.errors[:3]]
+    problems += _check(dl.get_dataset(), pinned, pinned_counts, first)
+    if problems:
+        sys.exit("\n".join(problems))
+
+
+if __name__ == "__main__":
+    main()
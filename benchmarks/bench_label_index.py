@@ -0,0 +1,82 @@
+"""Micro-benchmark: string-comparison counting vs. the precomputed label index.
+
+Runs both paths on the full Bitext dataset.  The "scan" path reproduces the
+previous implementation of ``count_intent`` / ``count_category`` /
+``select_semantic_*`` (an object-string comparison over every row); the
+"indexed" path uses ``data_loader.label_indexes`` and ``Subset``.
+
+Usage::
+
+    $ python benchmarks/bench_label_index.py [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data_loader as dl  # noqa: E402
+
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # The previous representation: plain Python-object label columns.
+    legacy = dl.df.astype({"intent": object, "category": object})
+    intents, categories = dl.intent_enum, dl.category_enum
+    some_intents = intents[: max(1, len(intents) // 3)]
+
+    def scan_count_all() -> None:
+        for name in intents:
+            int((legacy["intent"] == name).sum())
+        for name in categories:
+            int((legacy["category"] == name).sum())
+
+    def indexed_count_all() -> None:
+        for name in intents:
+            dl.FULL_SUBSET.count("intent", name)
+        for name in categories:
+            dl.FULL_SUBSET.count("category", name)
+
+    def scan_filter_then_count() -> None:
+        subset = legacy[legacy["intent"].isin(some_intents)]
+        for name in some_intents:
+            int((subset["intent"] == name).sum())
+
+    def indexed_filter_then_count() -> None:
+        subset = dl.select_rows("intent", some_intents)
+        for name in some_intents:
+            subset.count("intent", name)
+
+    cases = [
+        ("count every label (full dataset)", scan_count_all, indexed_count_all),
+        ("filter + count (subset)", scan_filter_then_count, indexed_filter_then_count),
+    ]
+
+    print(f"rows={len(dl.df)} intents={len(intents)} categories={len(categories)}")
+    for label, scan, indexed in cases:
+        t_scan = _best_of(args.repeat, scan)
+        t_idx = _best_of(args.repeat, indexed)
+        print(
+            f"{label:<36} scan={t_scan * 1e3:8.3f} ms  "
+            f"indexed={t_idx * 1e3:8.3f} ms  speed-up={t_scan / t_idx:7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
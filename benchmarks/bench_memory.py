@@ -0,0 +1,173 @@
+"""Resident memory of the dataset representation.
+
+Each scenario runs in a fresh interpreter and reports its resident set
+(``VmRSS``) after importing the agent modules ("before") and after loading
+and using the data ("after"):
+
+* ``legacy``  – the old ``data_loader.df``: every column, the texts
+                included, as a frame of Python string objects;
+* ``compact`` – ``get_dataset()``: label columns as integer codes, texts left
+                in the memory-mapped snapshot; then the counting tools and
+                ``show_examples``;
+* ``search``  – ``compact`` plus a full-text and a similarity query, which
+                map the on-disk indexes.
+
+The growth is split into anonymous memory (``+anon``: Python objects and
+Arrow/NumPy buffers allocated by the process, private to it) and mapped file
+pages (``+file``: the snapshot and index pages touched, counted in RSS but
+clean, shared with every process mapping the same files and reclaimable by
+the kernel).  The compact container saves anonymous memory; its RSS grows
+about as much as the legacy frame's (or a little more) because the label columns, flags and
+sampled texts are read from the mapped snapshot.  ``legacy`` drops its Arrow
+table once the frame is built, as ``pd.DataFrame(load_dataset(...))`` did,
+so its growth is anonymous only.
+
+Finally ``--workers`` forked processes run the ``search`` scenario at the
+same time; their proportional set sizes (``Pss``, Linux only) show how much of
+the mapped data they share.
+
+Usage::
+
+    $ python benchmarks/bench_memory.py [--workers 4]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+_SCENARIO = """
+import json, sys
+sys.path.insert(0, {root!r})
+sys.path.insert(0, {bench!r})
+from bench_memory import _imports, _memory, _run
+_imports()
+before = _memory()
+_run({scenario!r})
+print(json.dumps({{"before": before, "after": _memory()}}))
+"""
+
+
+def _memory() -> dict[str, int]:
+    """``VmRSS`` and, where available, ``Pss``/``Anonymous``/``Private_*`` in KiB."""
+    values = {}
+    for path, keys in (("/proc/self/status", ("VmRSS",)),
+                       ("/proc/self/smaps_rollup", ("Pss", "Anonymous", "Private_Clean", "Private_Dirty"))):
+        try:
+            lines = Path(path).read_text().splitlines()
+        except OSError:
+            continue
+        for line in lines:
+            key, _, rest = line.partition(":")
+            if key in keys:
+                values[key] = int(rest.split()[0])
+    if "VmRSS" not in values:  # not Linux: peak RSS is the best available
+        import resource
+        values["VmRSS"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return values
+
+
+def _imports() -> None:
+    """Load the code the scenarios use, so "before" covers code, not data.
+
+    Besides importing the modules, both representations are built once for
+    a 100-row slice: pandas and Arrow load much of their code lazily.
+    """
+    import agent  # noqa: F401
+    import data_loader as dl
+    import dataset_tools  # noqa: F401
+    import semantic_index  # noqa: F401
+    import snapshot
+    import text_index  # noqa: F401
+    import tool_registry  # noqa: F401
+
+    sample = snapshot.open_snapshot(dl.SNAPSHOT_NAME, verify=False).slice(0, 100).combine_chunks()
+    sample.to_pandas().astype(object)
+    dl.Dataset(sample).records([0, 1])
+
+
+def _run(scenario: str):
+    import data_loader as dl
+
+    if scenario == "legacy":
+        import snapshot
+        table = snapshot.open_snapshot(dl.SNAPSHOT_NAME)
+        frame = table.to_pandas().astype(object)  # what ``datasets`` + ``pd.DataFrame`` gave
+        return frame
+
+    from agent import AgentSession, SessionSettings
+    from tool_registry import registry
+
+    session = AgentSession(SessionSettings(verbose=False))
+    call = lambda name, **args: registry.call(session, name, args)  # noqa: E731
+    dataset = dl.get_dataset()
+    call("aggregate", group_by=["intent", "category"], top_k=None, order=None, handle=None)
+    call("select_semantic_category", category_names=dataset.category_enum[:2])
+    call("count_intent", intent_name=dataset.intent_enum[0], handle=None)
+    call("show_examples", n=5, handle=None)
+    if scenario == "search":
+        call("search_text", query="refund OR invoice", field=None, top_k=5, handle=None)
+        call("find_similar_instructions", text="I want my money back", top_k=5, handle=None)
+    return session
+
+
+def _worker(barrier) -> dict[str, int]:
+    keep = _run("search")  # noqa: F841 - keep the data alive until measured
+    barrier.wait()  # every worker has its data loaded
+    memory = _memory()
+    barrier.wait()  # nobody exits before all have measured
+    return memory
+
+
+def _fresh(scenario: str) -> dict:
+    code = _SCENARIO.format(root=str(ROOT), bench=str(ROOT / "benchmarks"), scenario=scenario)
+    out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True,
+                         env={**os.environ, "AGENT_TRACING": "off"})
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    os.environ.setdefault("OPENAI_API_KEY", "memory-benchmark")
+
+    # Build the snapshot and the on-disk indexes outside the measurements.
+    _fresh("search")
+
+    # "+anon" is the growth of anonymous (private) memory; the rest of
+    # "+RSS" is mapped file pages (snapshot, indexes), which processes share.
+    print(f"{'scenario':<10}{'RSS before':>12}{'RSS after':>11}{'+RSS':>8}{'+anon':>8}{'+file':>8}   (MiB)")
+    for scenario in ("legacy", "compact", "search"):
+        result = _fresh(scenario)
+        before, after = result["before"], result["after"]
+        rss = (after["VmRSS"] - before["VmRSS"]) / 1024
+        anon = (after.get("Anonymous", 0) - before.get("Anonymous", 0)) / 1024
+        file = f"{rss - anon:>8.1f}" if "Anonymous" in after else f"{'n/a':>8}"
+        print(f"{scenario:<10}{before['VmRSS'] / 1024:>12.1f}{after['VmRSS'] / 1024:>11.1f}{rss:>8.1f}"
+              f"{anon:>8.1f}{file}")
+    print("+anon is private to the process; +file is mapped snapshot/index pages, shared and reclaimable")
+
+    if args.workers and Path("/proc/self/smaps_rollup").exists():
+        _imports()  # shared by the forked workers
+        context = multiprocessing.get_context("fork")
+        barrier = context.Manager().Barrier(args.workers)
+        with context.Pool(args.workers) as pool:
+            results = pool.map(_worker, [barrier] * args.workers)
+        rss = sum(r["VmRSS"] for r in results) / 1024
+        pss = sum(r["Pss"] for r in results) / 1024
+        private = sum(r["Private_Clean"] + r["Private_Dirty"] for r in results) / 1024
+        print(f"{args.workers} forked workers (search): RSS {rss:.1f} MiB summed, "
+              f"PSS {pss:.1f} MiB, private {private:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Offline end-to-end benchmark of the agent against a local mock API.
+
+Starts :class:`mock_openai_server.MockOpenAIServer` on a free port and points
+the real ``AsyncOpenAI`` client at it through ``OPENAI_BASE_URL``, so the
+numbers contain the agent's own overhead plus a fixed, known server latency
+instead of network noise.  For the react and planning modes, at each
+concurrency level it reports:
+
+* per-turn latency — each LLM call as seen by the client, up to the last
+  chunk for streamed calls (p50/p95);
+* tool execution time — per tool call, from the ``tool_end`` events;
+* serialization time — JSON-encoding each request body (the same work the
+  SDK does before sending it), measured separately per call;
+* agent overhead — question wall time minus LLM and tool time;
+* throughput — questions per second.
+
+A final pass per mode runs under ``tracemalloc`` to report peak Python
+memory (kept separate so tracing does not distort the latencies).  The
+completion cache is disabled.  Results are written as JSON for comparison
+between commits.
+
+Usage::
+
+    $ python benchmarks/bench_offline.py [--questions 64] [--concurrency 1 8 32]
+          [--latency-ms 20] [--stream] [--output results.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data_loader as dl  # noqa: E402
+import llm_config  # noqa: E402
+from agent import AgentEvent, AgentSession, SessionSettings  # noqa: E402
+from llm_cache import CompletionCache  # noqa: E402
+from mock_openai_server import MockOpenAIServer  # noqa: E402
+
+MODES = ("react", "planning")
+
+
+class _TimedClient:
+    """Async client wrapper recording latency and body-encoding time per call."""
+
+    def __init__(self, client):
+        self._client = client
+        self.latencies: list[float] = []
+        self.serialization: list[float] = []
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        start = time.perf_counter()
+        json.dumps(kwargs, separators=(",", ":"))
+        self.serialization.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        response = await self._client.chat.completions.create(**kwargs)
+        if kwargs.get("stream"):
+            return self._timed_stream(response, start)
+        self.latencies.append(time.perf_counter() - start)
+        return response
+
+    async def _timed_stream(self, stream, start: float):
+        # A streamed turn lasts until its last chunk has arrived.
+        async for chunk in stream:
+            yield chunk
+        self.latencies.append(time.perf_counter() - start)
+
+
+def _percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"n": 0}
+    values = sorted(values)
+    return {
+        "n": len(values),
+        "mean_ms": round(statistics.fmean(values) * 1000, 3),
+        "p50_ms": round(values[len(values) // 2] * 1000, 3),
+        "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 3),
+        "total_s": round(sum(values), 6),
+    }
+
+
+async def _run(mode: str, questions: int, concurrency: int, stream: bool) -> dict:
+    client = _TimedClient(llm_config.get_async_client())
+    cache = CompletionCache(mode="off")
+    settings = SessionSettings(verbose=False)
+    tool_times: list[float] = []
+    question_times: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    def on_event(event: AgentEvent) -> None:
+        if event.kind == "tool_end":
+            tool_times.append(event.data["seconds"])
+
+    async def ask(i: int) -> None:
+        async with semaphore:
+            session = AgentSession(settings, client=client, cache=cache)
+            start = time.perf_counter()
+            answer = await session.arun(f"How many examples for question {i}?", mode, stream, on_event)
+            question_times.append(time.perf_counter() - start)
+            if not answer or not answer.startswith("Here are the counts"):
+                raise RuntimeError(f"unexpected answer {answer!r}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(ask(i) for i in range(questions)))
+    elapsed = time.perf_counter() - start
+
+    overhead = sum(question_times) - sum(client.latencies) - sum(tool_times)
+    return {
+        "questions": questions,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 6),
+        "questions_per_s": round(questions / elapsed, 3),
+        "question": _percentiles(question_times),
+        "llm_turn": _percentiles(client.latencies),
+        "tool": _percentiles(tool_times),
+        "serialization": _percentiles(client.serialization),
+        "agent_overhead_ms_per_question": round(overhead / questions * 1000, 3),
+    }
+
+
+def _peak_memory(mode: str, questions: int, concurrency: int, stream: bool) -> int:
+    tracemalloc.start()
+    try:
+        asyncio.run(_run(mode, questions, concurrency, stream))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--fanout", type=int, default=2, help="intents counted per question")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--stream", action="store_true", help="stream plans and answers over SSE")
+    parser.add_argument("--output", type=Path, help="write the JSON report here")
+    args = parser.parse_args()
+
+    dataset = dl.get_dataset()
+    server = MockOpenAIServer(dataset.intent_enum, args.latency_ms / 1000, args.fanout).start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "params": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        "modes": {},
+    }
+    try:
+        for mode in args.modes:
+            asyncio.run(_run(mode, min(4, args.questions), 1, args.stream))  # warm-up
+            runs = [asyncio.run(_run(mode, args.questions, c, args.stream)) for c in args.concurrency]
+            peak = _peak_memory(mode, args.questions, max(args.concurrency), args.stream)
+            report["modes"][mode] = {"runs": runs, "peak_traced_bytes": peak}
+            for run in runs:
+                print(f"{mode:<9} c={run['concurrency']:<3} {run['questions_per_s']:>8.1f} q/s  "
+                      f"turn p50 {run['llm_turn']['p50_ms']:.1f}ms  "
+                      f"tool p50 {run['tool']['p50_ms']:.2f}ms  "
+                      f"ser p50 {run['serialization']['p50_ms']:.3f}ms  "
+                      f"overhead {run['agent_overhead_ms_per_question']:.1f}ms/q")
+            print(f"{mode:<9} peak traced memory {peak / 2**20:.1f} MiB")
+    finally:
+        server.stop()
+    report["max_rss_kib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    report["mock_requests"] = server.requests
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"wrote {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""LLM round trips: step-by-step plan execution vs. the locally executed plan DAG.
+
+Replays multi-step questions (filter some intents, then count each) through
+real ``AgentSession`` objects with a scripted client:
+
+* ``step-by-step`` – what planning mode used to do: a text plan
+  (:meth:`AgentSession.aplan`), then one ReAct turn per step (the last one
+  also calling ``finish``), then the final answer: ``N + 2`` LLM calls for
+  ``N`` steps;
+* ``dag`` – planning mode now: one ``submit_plan`` call whose steps run
+  locally as a DAG (the counts in parallel), then the final answer;
+* ``dag+repair`` – the same plan with an invalid intent in the filter step:
+  the filter fails, its dependants are skipped, one repair ``submit_plan``
+  call replaces them and the answer follows.
+
+Each LLM call sleeps ``--latency-ms``.  Reports LLM calls, tool calls and
+wall time per question, and checks every strategy answers with the counts
+computed directly from the dataset; exits non-zero otherwise.
+
+Usage::
+
+    $ python benchmarks/bench_plan_dag.py [--latency-ms 300] [--steps 2 4 8] [--repeat 3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data_loader as dl  # noqa: E402
+from agent import AgentSession, SessionSettings  # noqa: E402
+from llm_cache import CompletionCache  # noqa: E402
+
+
+def _call(n: int, i: int, name: str, args: dict) -> SimpleNamespace:
+    return SimpleNamespace(id=f"call_{n}_{i}", function=SimpleNamespace(name=name, arguments=json.dumps(args)))
+
+
+def _answer(messages) -> str:
+    """Answer with the count results of the question, in order."""
+    return ",".join(m["content"] for m in messages if m["role"] == "tool" and m["content"].isdigit())
+
+
+class _ScriptClient:
+    """Answers plan requests with *plans*, tool turns with *turns*, the rest with :func:`_answer`."""
+
+    def __init__(self, latency: float, turns=(), plans=()):
+        self.latency = latency
+        self.turns = list(turns)
+        self.plans = list(plans)
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, *, messages, tools=None, tool_choice=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.calls += 1
+        content, calls = None, None
+        if tool_choice == "none":
+            content = "1. select_semantic_intent  2. count_intent for each intent  3. finish"
+        elif isinstance(tool_choice, dict):
+            calls = [_call(self.calls, 0, "submit_plan", {"steps": self.plans.pop(0)})]
+        elif tools is None or not self.turns:
+            content = _answer(messages)
+        else:
+            calls = [_call(self.calls, i, name, args) for i, (name, args) in enumerate(self.turns.pop(0))]
+        message = SimpleNamespace(role="assistant", content=content, tool_calls=calls)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def _plan(intents: list[str], select: list[str]) -> list[dict]:
+    steps = [{"id": "select", "tool": "select_semantic_intent",
+              "arguments": json.dumps({"intent_names": select}), "depends_on": []}]
+    steps += [{"id": f"count{i}", "tool": "count_intent",
+               "arguments": json.dumps({"intent_name": intent, "handle": "@select"}), "depends_on": ["select"]}
+              for i, intent in enumerate(intents)]
+    return steps
+
+
+def _session(client) -> AgentSession:
+    return AgentSession(SessionSettings(verbose=False, fast_path=False), client, CompletionCache(mode="off"))
+
+
+async def _step_by_step(intents: list[str], latency: float):
+    turns = [[("select_semantic_intent", {"intent_names": intents})]]
+    turns += [[("count_intent", {"intent_name": i})] for i in intents]
+    turns[-1].append(("finish", {}))
+    client = _ScriptClient(latency, turns=turns)
+    session = _session(client)
+    start = time.perf_counter()
+    await session.aplan(session.messages + [{"role": "user", "content": "question"}])
+    answer = await session.arun("question")
+    return answer, client.calls, len(intents) + 1, time.perf_counter() - start
+
+
+async def _dag(intents: list[str], latency: float, repair: bool):
+    plans = [_plan(intents, intents)]
+    if repair:
+        plans.insert(0, _plan(intents, intents + ["not_an_intent"]))
+    client = _ScriptClient(latency, plans=plans)
+    session = _session(client)
+    start = time.perf_counter()
+    answer = await session.arun("question", mode="planning")
+    return answer, client.calls, len(intents) + 1, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--steps", type=int, nargs="+", default=[2, 4, 8],
+                        help="intents counted per question (plan steps = intents + 1)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    dataset = dl.get_dataset()
+    latency = args.latency_ms / 1000
+    strategies = {
+        "step-by-step": _step_by_step,
+        "dag": lambda intents, latency: _dag(intents, latency, repair=False),
+        "dag+repair": lambda intents, latency: _dag(intents, latency, repair=True),
+    }
+    failures = []
+    print(f"{'steps':>5}  {'strategy':<14}{'LLM calls':>10}{'tool calls':>11}{'seconds':>9}")
+    for n in args.steps:
+        intents = dataset.intent_enum[:n]
+        expected = ",".join(str(dataset.full.count("intent", i)) for i in intents)
+        for label, run in strategies.items():
+            runs = [asyncio.run(run(intents, latency)) for _ in range(args.repeat)]
+            answer, llm_calls, steps, _ = runs[0]
+            best = min(r[3] for r in runs)
+            print(f"{steps:>5}  {label:<14}{llm_calls:>10}{steps:>11}{best:>9.3f}")
+            if answer != expected:
+                failures.append(f"{label} with {steps} steps answered {answer!r}, expected {expected!r}")
+    if failures:
+        sys.exit("\n".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Example sampler: reproducibility, paging and prompt size.
+
+1. Checks that two sessions with the same seed draw the same rows, that
+   paging through a subset returns every row exactly once before starting
+   over, and that stratified draws cover every label of the subset.  Exits
+   non-zero otherwise.
+2. Compares the size of the ``show_examples`` tool message (as it enters
+   the conversation) for the old unprojected, untruncated sample with the
+   default truncation and with a projection, and times one draw.
+
+Usage::
+
+    $ python benchmarks/bench_sampler.py [--n 10] [--repeat 200]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data_loader as dl  # noqa: E402
+from agent import AgentSession, SessionSettings  # noqa: E402
+from tool_registry import registry  # noqa: E402
+
+
+def _check(condition: bool, message: str) -> None:
+    if not condition:
+        sys.exit(f"FAILED: {message}")
+
+
+def _session(seed: int) -> AgentSession:
+    return AgentSession(SessionSettings(verbose=False, sample_seed=seed))
+
+
+def _show(session: AgentSession, **args) -> dict:
+    defaults = {"n": 5, "handle": None, "columns": None, "max_chars": None, "stratify_by": None}
+    return registry.call(session, "show_examples", {**defaults, **args})
+
+
+def _checks(dataset) -> None:
+    first, second = _session(42), _session(42)
+    _check(_show(first, n=10) == _show(second, n=10), "same seed, different rows")
+
+    label = dataset.intent_enum[0]
+    registry.call(first, "select_semantic_intent", {"intent_names": [label]})
+    pages, rows = 0, dataset.full.count("intent", label)
+    while True:
+        page = _show(first, n=50, columns=["intent"])
+        _check(all(e["intent"] == label for e in page["examples"]), "row outside the subset")
+        pages += 1
+        if page["unseen_rows"] == 0:
+            break
+    _check(pages == -(-rows // 50), f"{pages} pages of 50 for {rows} rows")
+    drawn = []
+    while not drawn or unseen:
+        positions, unseen = first.sampler.draw(first.active_subset, 50, "check")
+        drawn.extend(positions.tolist())
+    _check(sorted(drawn) == first.active_subset.positions().tolist(), "rows repeated or skipped")
+
+    categories = dataset.category_enum[:3]
+    registry.call(first, "select_semantic_category", {"category_names": categories})
+    page = _show(first, n=9, columns=["category"], stratify_by="category")
+    counts = {c: sum(e["category"] == c for e in page["examples"]) for c in categories}
+    _check(set(counts.values()) == {3}, f"stratified draw is unbalanced: {counts}")
+    print(f"ok: reproducible, {rows} rows paged without repeats, stratified {counts}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    dataset = dl.get_dataset()
+    _checks(dataset)
+
+    session = _session(0)
+    old = str(dataset.full.sample(args.n))  # the previous show_examples result
+    variants = {
+        "old: all columns, full text": old,
+        "default (300 chars per field)": str(_show(session, n=args.n)),
+        "instruction + intent": str(_show(session, n=args.n, columns=["instruction", "intent"])),
+    }
+    for label, text in variants.items():
+        print(f"{label:<32}{len(text.encode()):>8} bytes")
+
+    times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        _show(session, n=args.n, columns=["instruction", "intent"])
+        times.append(time.perf_counter() - start)
+    print(f"show_examples(n={args.n}) median {np.median(times) * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
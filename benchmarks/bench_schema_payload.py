@@ -0,0 +1,78 @@
+"""Request payload size with the full vs. the compact tool schema.
+
+Builds the body of a first-turn ReAct request (system prompt, one user
+question, tools) in both schema modes and reports its size in bytes and
+tokens, once and summed over ``--turns`` requests of one question, plus the
+tool definitions and the vocabulary on their own.  With this dataset's 27
+intents and 11 categories the saving is about 3% per request: the enums
+appear in only a few parameters, and most of what leaves the tools comes
+back as the vocabulary in the system prompt.  Also
+checks that the compact mode still rejects names outside the vocabulary;
+exits non-zero if it does not.
+
+Usage::
+
+    $ python benchmarks/bench_schema_payload.py [--turns 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agent import SYSTEM_PROMPT, SessionSettings  # noqa: E402
+from history import TokenCounter  # noqa: E402
+from tool_registry import ToolArgumentError, registry  # noqa: E402
+from tool_schema import get_tools, get_vocabulary  # noqa: E402
+
+QUESTION = "How many examples of the intent 'cancel_order' are there?"
+
+
+def _request(compact: bool) -> dict:
+    system = f"{SYSTEM_PROMPT}\n{get_vocabulary()}" if compact else SYSTEM_PROMPT
+    return {
+        "model": SessionSettings().model,
+        "messages": [{"role": "system", "content": system}, {"role": "user", "content": QUESTION}],
+        "tools": get_tools(compact=compact),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=5)
+    args = parser.parse_args()
+
+    counter = TokenCounter(SessionSettings().model)
+    sizes = {}
+    for compact in (False, True):
+        body = json.dumps(_request(compact), separators=(",", ":"), ensure_ascii=False)
+        sizes[compact] = (len(body.encode()), counter.count_text(body))
+
+    print(f"{'mode':<10}{'bytes':>10}{'tokens':>10}{f'x{args.turns} tokens':>14}")
+    for compact, (size, tokens) in sizes.items():
+        print(f"{'compact' if compact else 'full':<10}{size:>10}{tokens:>10}{tokens * args.turns:>14}")
+    (full_bytes, full_tokens), (compact_bytes, compact_tokens) = sizes[False], sizes[True]
+    print(f"saved: {1 - compact_bytes / full_bytes:.0%} of bytes, "
+          f"{1 - compact_tokens / full_tokens:.0%} of tokens per request")
+    tools = {compact: counter.count_text(json.dumps(get_tools(compact=compact), separators=(",", ":")))
+             for compact in (False, True)}
+    print(f"tool definitions: {tools[False]} -> {tools[True]} tokens; "
+          f"vocabulary in the system prompt: +{counter.count_text(get_vocabulary())} tokens")
+
+    names = [spec["function"]["name"] for spec in get_tools(compact=True)]
+    if names != sorted(names):
+        sys.exit("tools are not ordered by name")
+    try:
+        registry.call(None, "count_intent", {"intent_name": "no_such_intent"})
+    except ToolArgumentError:
+        pass
+    else:
+        sys.exit("an unknown intent name was accepted")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Similarity index: build time, query throughput and retrieval sanity.
+
+1. Builds the hashed n-gram TF-IDF index of the instructions from scratch
+   (into a temporary directory) and opens the saved copy memory-mapped.
+2. Checks that a sample of instructions finds itself (or an identical
+   text) first; exits non-zero otherwise.  Reports how often the intent
+   vote of the nearest *other* instructions names the right intent.
+3. Reports query throughput for several batch sizes: every batch is scored
+   with one matrix product.
+
+Usage::
+
+    $ python benchmarks/bench_semantic_index.py [--sample 500] [--top-k 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data_loader as dl  # noqa: E402
+from semantic_index import SemanticIndex  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sample", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    dataset = dl.get_dataset()
+    texts = dataset.text_column("instruction")
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        built = SemanticIndex.build(texts)
+        build = time.perf_counter() - start
+        directory = Path(tmp) / "index"
+        built.save(directory, "bench")
+        start = time.perf_counter()
+        index = SemanticIndex.load(directory, "bench")
+        opened = time.perf_counter() - start
+        print(f"{len(texts)} rows x {index.dimensions} dims: build {build:.2f}s, "
+              f"open (mmap) {opened * 1e3:.1f} ms, {index.matrix.nbytes / 1024 ** 2:.1f} MiB float32")
+
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(len(texts), size=min(args.sample, len(texts)), replace=False))
+        queries = texts.iloc[sample].tolist()
+        rows, similarities = index.search(queries, 26)
+        found = (rows[:, 0] == sample) | (texts.to_numpy()[rows[:, 0]] == np.array(queries, dtype=object))
+        if not found.all() or (similarities[:, 0] < 0.999).any():
+            sys.exit(f"FAILED: {int((~found).sum())} of {len(sample)} instructions did not find themselves first")
+        print(f"ok: {len(sample)} instructions retrieve themselves first")
+
+        codes = dataset.label_indexes["intent"].codes
+        hits = 0
+        for query_row, neighbours, weights in zip(sample, rows, similarities):
+            keep = neighbours != query_row
+            votes = np.bincount(codes[neighbours[keep][:25]], weights=weights[keep][:25], minlength=codes.max() + 1)
+            hits += int(votes.argmax() == codes[query_row])
+        print(f"nearest-neighbour intent vote: {hits / len(sample):.1%} correct "
+              f"(majority class {np.bincount(codes).max() / len(codes):.1%})")
+
+        print(f"{'batch':>6}{'ms/batch':>10}{'queries/s':>11}")
+        for batch in (1, 32, 256, 1024):
+            queries = texts.iloc[rng.choice(len(texts), size=batch)].tolist()
+            index.search(queries, args.top_k)  # warm the page cache
+            start = time.perf_counter()
+            repeats = max(1, 2048 // batch)
+            for _ in range(repeats):
+                index.search(queries, args.top_k)
+            elapsed = (time.perf_counter() - start) / repeats
+            print(f"{batch:>6}{elapsed * 1e3:>10.2f}{batch / elapsed:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Startup-time benchmark for dataset loading.
+
+Each scenario runs in a fresh interpreter so that import caches do not leak
+between measurements:
+
+* ``legacy``   – the previous path: ``load_dataset(...)`` + ``pd.DataFrame``.
+* ``build``    – ``import data_loader`` with an empty snapshot directory, i.e.
+                 the first start that downloads and writes the snapshot.
+* ``snapshot`` – ``import data_loader`` with an existing snapshot (memory-mapped,
+                 fully offline).
+
+Usage::
+
+    $ python benchmarks/bench_startup.py [--repeat 5] [--skip legacy,build]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+_LEGACY = """
+import time
+start = time.perf_counter()
+import pandas as pd
+from datasets import load_dataset
+df = pd.DataFrame(load_dataset(
+    "bitext/Bitext-customer-support-llm-chatbot-training-dataset", split="train"
+))
+print(time.perf_counter() - start)
+"""
+
+_IMPORT = """
+import time
+start = time.perf_counter()
+import data_loader
+print(time.perf_counter() - start)
+"""
+
+
+def _time_once(code: str, env: dict[str, str]) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _report(label: str, samples: list[float]) -> None:
+    print(
+        f"{label:<9} median={statistics.median(samples) * 1e3:8.1f} ms  "
+        f"min={min(samples) * 1e3:8.1f} ms  max={max(samples) * 1e3:8.1f} ms  n={len(samples)}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip", default="", help="comma-separated scenarios to skip")
+    args = parser.parse_args()
+    skip = set(filter(None, args.skip.split(",")))
+
+    env = dict(os.environ)
+
+    if "legacy" not in skip:
+        _report("legacy", [_time_once(_LEGACY, env) for _ in range(args.repeat)])
+
+    if "build" not in skip:
+        samples = []
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory() as tmp:
+                samples.append(_time_once(_IMPORT, {**env, "DATASET_SNAPSHOT_DIR": tmp}))
+        _report("build", samples)
+
+    # Make sure the snapshot exists before timing warm starts.
+    _time_once(_IMPORT, env)
+    _report("snapshot", [_time_once(_IMPORT, env) for _ in range(args.repeat)])
+
+
+if __name__ == "__main__":
+    main()
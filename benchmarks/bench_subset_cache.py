@@ -0,0 +1,112 @@
+"""Subset cache: storage size, eviction and handle algebra.
+
+1. Stores every intent and category filter of the dataset in a
+   :class:`subset_cache.SubsetCache` and reports the bytes kept per subset
+   (row array or bitmap) against copying the selected rows of the table.
+2. Checks that intersections and unions of handles match filtering the
+   dataset directly, that ``count_intent`` with a handle agrees with the
+   dataset counts and that a handle counts its rows once over all lookups.
+3. Fills a budget of ``--keep`` subsets and checks that the least recently used subsets
+   are evicted first, and that looking a subset up does not grow the cache.
+
+Exits non-zero if a check fails.
+
+Usage::
+
+    $ python benchmarks/bench_subset_cache.py [--keep 8]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data_loader as dl  # noqa: E402
+from agent import AgentSession, SessionSettings  # noqa: E402
+from subset_cache import SubsetCache  # noqa: E402
+from tool_registry import registry  # noqa: E402
+
+
+def _check(condition: bool, message: str) -> None:
+    if not condition:
+        sys.exit(f"FAILED: {message}")
+
+
+def _storage(dataset) -> None:
+    subsets = [(dataset.select_rows(column, [label]), f"{column} = {label}")
+               for column in dl.LABEL_COLUMNS for label in dataset.label_indexes[column].labels]
+    cache = SubsetCache(max_bytes=1 << 30)
+    start = time.perf_counter()
+    for subset, description in subsets:
+        cache.put(subset, description)
+    elapsed = time.perf_counter() - start
+    copied = sum(dataset.table.take(subset.positions()).nbytes for subset, _ in subsets)
+    print(f"{len(cache)} subsets: {cache.nbytes / 1024:.1f} KiB cached vs {copied / 1024 ** 2:.1f} MiB "
+          f"as copied rows ({elapsed / len(cache) * 1e3:.3f} ms per put)")
+
+
+def _algebra(dataset) -> None:
+    session = AgentSession(SessionSettings(verbose=False))
+    call = lambda name, **args: registry.call(session, name, args)  # noqa: E731
+    call("select_semantic_category", category_names=["REFUND", "ORDER"])
+    call("select_semantic_intent", intent_names=["get_refund", "cancel_order", "track_refund", "place_order"])
+    call("select_semantic_intent", intent_names=["get_refund", "check_invoice"])
+
+    full = dataset.df
+    in_categories = full["category"].isin(["REFUND", "ORDER"])
+    first = full["intent"].isin(["get_refund", "cancel_order", "track_refund", "place_order"])
+    second = full["intent"].isin(["get_refund", "check_invoice"])
+
+    call("combine_subsets", handles=["s1", "s3"], operation="intersect")
+    _check(session.active_handle == "s4", "combined subset is not the active one")
+    _check(len(session.active_subset) == int((in_categories & second).sum()), "intersect of two handles")
+    call("combine_subsets", handles=["s2", "s3"], operation="union")
+    _check(len(session.active_subset) == int((first | second).sum()), "union of two handles")
+    expected = int((full["intent"] == "get_refund").sum())
+    _check(call("count_intent", intent_name="get_refund", handle="s4") == expected, "count with a handle")
+    _check(call("count_intent", intent_name="cancel_order", handle="s3") == 0, "count outside the subset")
+    counts = session.subsets.get("s3").counts("intent")
+    _check(session.subsets.get("s3").counts("intent") is counts, "a handle recounted its rows on another lookup")
+    rows = np.sort(session.subsets.get("s5").positions())
+    _check(np.array_equal(rows, np.flatnonzero((first | second).to_numpy())), "union row positions")
+    print(f"ok: handle algebra over {len(session.subsets)} cached subsets")
+
+
+def _eviction(dataset, keep: int) -> None:
+    labels = dataset.label_indexes["intent"].labels
+    subsets = [dataset.select_rows("intent", [label]) for label in labels[:keep + 1]]
+    budget = SubsetCache(max_bytes=1 << 30)
+    for subset in subsets[:keep]:
+        budget.put(subset, "")
+    cache = SubsetCache(max_bytes=budget.nbytes)  # room for exactly *keep* of them
+    handles = [cache.put(subset, label) for subset, label in zip(subsets[:keep], labels)]
+    _check(cache.evictions == 0, "evicted within the budget")
+    nbytes = cache.nbytes
+    cache.get(handles[0])  # used again: must survive the next put
+    _check(cache.nbytes == nbytes, "a lookup grew the cache")
+    cache.put(subsets[keep], labels[keep])
+    _check(cache.nbytes <= cache.max_bytes, "budget exceeded")
+    _check(handles[0] in cache, "recently used subset was evicted")
+    _check(handles[1] not in cache, "least recently used subset was kept")
+    print(f"ok: {cache.evictions} eviction(s), {len(cache)} subsets in {cache.nbytes} of {cache.max_bytes} bytes")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keep", type=int, default=8, help="subsets that fit the eviction budget")
+    args = parser.parse_args()
+
+    dataset = dl.get_dataset()
+    _storage(dataset)
+    _algebra(dataset)
+    _eviction(dataset, args.keep)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Text index: build/open time, query latency and correctness.
+
+1. Builds the inverted index of the text columns from scratch (into a
+   temporary directory), then opens the persisted copy the way later
+   processes do (memory-mapped).
+2. Checks boolean and phrase queries against a brute-force regex scan of
+   the texts; exits non-zero on any difference.
+3. Reports the median and p95 latency of ranked ``search`` per query.
+
+Usage::
+
+    $ python benchmarks/bench_text_search.py [--repeat 50] [--top-k 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data_loader as dl  # noqa: E402
+from text_index import TextIndex  # noqa: E402
+
+# (query, predicate over the lower-cased instruction/response texts)
+_QUERIES = [
+    ("refund", lambda has: has(r"refund")),
+    ("refund invoice", lambda has: has(r"refund") & has(r"invoice")),
+    ("refund OR invoice", lambda has: has(r"refund") | has(r"invoice")),
+    ("refund AND NOT invoice", lambda has: has(r"refund") & ~has(r"invoice")),
+    ("(cancel OR track) human", lambda has: (has(r"cancel") | has(r"track")) & has(r"human")),
+    ('"cancel order"', lambda has: has(r"cancel order")),
+    ('"i want to cancel"', lambda has: has(r"i want to cancel")),
+    ('"human agent" NOT password', lambda has: has(r"human agent") & ~has(r"password")),
+]
+
+
+def _scanner(dataset):
+    texts = [dataset.text_column(c).str.lower() for c in dl.TEXT_COLUMNS]
+
+    def has(phrase: str) -> np.ndarray:
+        words = r"[^\w]+".join(phrase.split())
+        pattern = re.compile(rf"(?<![^\W_]){words}(?![^\W_])")
+        return np.logical_or.reduce([t.str.contains(pattern).to_numpy() for t in texts])
+
+    return has
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    dataset = dl.get_dataset()
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        built = TextIndex.build(dataset.table)
+        build = time.perf_counter() - start
+        directory = Path(tmp) / "index"
+        built.save(directory, "bench")
+        size = sum(f.stat().st_size for f in directory.iterdir())
+        start = time.perf_counter()
+        index = TextIndex.load(directory, "bench")
+        opened = time.perf_counter() - start
+        print(f"{len(dataset.table)} rows: build {build:.2f}s, open (mmap) {opened * 1e3:.1f} ms, "
+              f"{size / 1024 ** 2:.1f} MiB on disk")
+
+        has = _scanner(dataset)
+        for query, predicate in _QUERIES:
+            expected = np.flatnonzero(predicate(has))
+            if not np.array_equal(index.match(query), expected):
+                sys.exit(f"FAILED: {query!r} matches {len(index.match(query))} rows, scan finds {len(expected)}")
+        print(f"ok: {len(_QUERIES)} queries agree with a regex scan")
+
+        print(f"{'query':<30}{'matches':>9}{'p50 ms':>9}{'p95 ms':>9}")
+        for query, _ in _QUERIES:
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                matches, _, _ = index.search(query, top_k=args.top_k)
+                times.append(time.perf_counter() - start)
+            p50, p95 = np.percentile(times, [50, 95]) * 1e3
+            print(f"{query:<30}{len(matches):>9}{p50:>9.2f}{p95:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
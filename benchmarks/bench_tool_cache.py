@@ -0,0 +1,107 @@
+"""Tool execution with and without the memoised tool results.
+
+Replays the tool calls the model repeats most through real ``AgentSession``
+objects: every session lists the intents and categories, selects categories
+(the same ones in many sessions), counts intents and categories on the
+active subset and by handle, aggregates, searches the texts and then counts
+again after switching the active subset.  The same script runs once with
+``memoize_tools=False`` and once with a fresh :class:`tool_cache.ToolResultCache`.
+
+Reports the wall time of both runs and the per-tool hit rates, and checks
+that every memoised result equals the result computed directly, so a changed
+subset never reads a stale entry; exits non-zero otherwise.
+
+Usage::
+
+    $ python benchmarks/bench_tool_cache.py [--sessions 50] [--repeat 3] [--max-entries 4096]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data_loader as dl  # noqa: E402
+from agent import AgentSession, SessionSettings  # noqa: E402
+from llm_cache import CompletionCache  # noqa: E402
+from tool_cache import ToolResultCache  # noqa: E402
+
+QUERIES = ["refund", "cancel order", "password", "delivery address"]
+
+
+def _script(dataset: dl.Dataset, seed: int, repeat: int) -> list[tuple[str, dict]]:
+    """Tool calls of one session; popular categories and intents come up often."""
+    rng = random.Random(seed)
+    categories = dataset.category_enum[:4]
+    calls: list[tuple[str, dict]] = [("get_all_intents", {}), ("get_all_categories", {})]
+    for _ in range(repeat):
+        picked = rng.sample(categories, 2)
+        calls.append(("select_semantic_category", {"category_names": picked}))
+        intents = rng.sample(dataset.intent_enum[:12], 4)
+        calls += [("count_intent", {"intent_name": i}) for i in intents]
+        calls += [("count_category", {"category_name": c, "handle": None}) for c in picked]
+        calls.append(("aggregate", {"group_by": ["intent"], "top_k": 5}))
+        calls.append(("search_text", {"query": rng.choice(QUERIES), "handle": None}))
+        calls.append(("get_all_intents", {}))
+        # Switch the active subset: the same counts must now differ.
+        calls.append(("select_semantic_category", {"category_names": [rng.choice(categories)]}))
+        calls += [("count_intent", {"intent_name": i}) for i in intents]
+        calls.append(("count_intent", {"intent_name": intents[0], "handle": "s1"}))
+        calls.append(("aggregate", {"group_by": ["category", "intent"]}))
+    return calls
+
+
+def _run(scripts, memoize: bool, cache: ToolResultCache) -> tuple[list, float]:
+    results = []
+    start = time.perf_counter()
+    for script in scripts:
+        session = AgentSession(SessionSettings(verbose=False, memoize_tools=memoize),
+                               client=object(), cache=CompletionCache(mode="off"), tool_results=cache)
+        results.append([session.execute_tool(name, args) for name, args in script])
+    return results, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3, help="select/count rounds per session")
+    parser.add_argument("--max-entries", type=int, default=4096)
+    args = parser.parse_args()
+
+    dataset = dl.get_dataset()
+    scripts = [_script(dataset, seed, args.repeat) for seed in range(args.sessions)]
+    cache = ToolResultCache(args.max_entries)
+    # Build the lazy indexes (text index, label indexes) outside the timings.
+    _run(scripts[:1], memoize=False, cache=cache)
+
+    expected, plain = _run(scripts, memoize=False, cache=cache)
+    cache.clear()
+    actual, memoized = _run(scripts, memoize=True, cache=cache)
+
+    calls = sum(len(s) for s in scripts)
+    print(f"{args.sessions} sessions, {calls} tool calls")
+    print(f"{'memoize off':<14}{plain:>9.3f} s")
+    print(f"{'memoize on':<14}{memoized:>9.3f} s   speed-up x{plain / memoized:.2f}")
+    stats = cache.stats()
+    print(f"\nentries {stats['entries']}, evictions {stats['evictions']}, hit rate {stats['hit_rate']:.1%}")
+    print(f"{'tool':<28}{'hits':>7}{'misses':>8}{'hit rate':>10}")
+    for name, counters in sorted(stats["tools"].items()):
+        print(f"{name:<28}{counters['hits']:>7}{counters['misses']:>8}{counters['hit_rate']:>10.1%}")
+
+    mismatches = [
+        f"session {s} call {i} {scripts[s][i][0]}({scripts[s][i][1]}): {a!r} != {e!r}"
+        for s, (got, want) in enumerate(zip(actual, expected))
+        for i, (a, e) in enumerate(zip(got, want))
+        if str(a) != str(e)
+    ]
+    if mismatches:
+        sys.exit("memoised results differ:\n" + "\n".join(mismatches[:10]))
+
+
+if __name__ == "__main__":
+    main()
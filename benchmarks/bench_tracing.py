@@ -0,0 +1,123 @@
+"""Tracing check and overhead benchmark.
+
+1. Runs scripted questions (the ``ScriptedClient`` of ``stress_sessions``, no
+   network) with an in-memory exporter and checks the span tree: one
+   ``question`` root per question with ``llm`` and ``tool`` children that
+   carry their attributes.  Then streams the final answers and checks that
+   their estimated tokens reach the question's ``tokens`` total (the
+   tokens-per-question histogram).  Exits non-zero if it is wrong.
+2. Times ``span()`` enter/exit with the tracer disabled and enabled (with
+   the Prometheus histograms), and end-to-end questions per second for both.
+
+Usage::
+
+    $ python benchmarks/bench_tracing.py [--questions 200] [--spans 200000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data_loader as dl  # noqa: E402
+from agent import AgentSession, SessionSettings  # noqa: E402
+from llm_cache import CompletionCache  # noqa: E402
+from stress_sessions import ScriptedClient  # noqa: E402
+from tracing import InMemoryExporter, PrometheusExporter, Tracer  # noqa: E402
+
+
+class _StreamingClient(ScriptedClient):
+    """The scripted conversation, with the final answer streamed in two deltas."""
+
+    async def create(self, *, messages, tools=None, stream=False, **kwargs):
+        completion = await super().create(messages=messages, tools=tools, **kwargs)
+        if not stream:
+            return completion
+        text = completion.choices[0].message.content
+
+        async def chunks():
+            for part in (text[:3], text[3:]):
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part))])
+
+        return chunks()
+
+
+async def _ask(tracer: Tracer, intents: list[str], questions: int, stream: bool = False) -> float:
+    cache = CompletionCache(mode="off")
+    start = time.perf_counter()
+    for i in range(questions):
+        intent = intents[i % len(intents)]
+        client = _StreamingClient(intent) if stream else ScriptedClient(intent)
+        session = AgentSession(SessionSettings(verbose=False), client, cache, tracer)
+        await session.arun(f"[{intent}] question {i}", stream=stream)
+    return time.perf_counter() - start
+
+
+def _check_tree(exporter: InMemoryExporter, questions: int) -> None:
+    roots = exporter.named("question")
+    if len(roots) != questions or any(r.parent is not None for r in roots):
+        raise AssertionError(f"expected {questions} root question spans, got {len(roots)}")
+    root_ids = {r.span_id for r in roots}
+    for name in ("llm", "tool"):
+        spans = exporter.named(name)
+        if not spans or any(s.root.span_id not in root_ids for s in spans):
+            raise AssertionError(f"{name} spans missing or detached from their question")
+    tools = {s.attributes["tool"] for s in exporter.named("tool")}
+    if tools != {"select_semantic_intent", "count_intent", "finish"}:
+        raise AssertionError(f"unexpected tool spans {tools}")
+    if any("result_bytes" not in s.attributes for s in exporter.named("tool")):
+        raise AssertionError("tool span without result size")
+
+
+def _check_streamed_tokens(exporter: InMemoryExporter, questions: int) -> None:
+    streamed = [s for s in exporter.named("llm") if s.attributes.get("stream")]
+    if len(streamed) != questions:
+        raise AssertionError(f"expected {questions} streamed llm spans, got {len(streamed)}")
+    for span in streamed:
+        tokens = span.attributes.get("prompt_tokens", 0) + span.attributes.get("completion_tokens", 0)
+        if not tokens or span.root.attributes.get("tokens", 0) < tokens:
+            raise AssertionError("streamed completion tokens missing from the question's total")
+
+
+def _span_cost(tracer: Tracer, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        with tracer.span("bench", key=1) as span:
+            span.set(value=2)
+    return (time.perf_counter() - start) / n
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--spans", type=int, default=200_000)
+    args = parser.parse_args()
+
+    intents = dl.get_dataset().intent_enum
+
+    memory = InMemoryExporter()
+    asyncio.run(_ask(Tracer([memory]), intents, 10))
+    _check_tree(memory, 10)
+    print(f"ok: span tree of 10 questions ({len(memory.spans)} spans)")
+    memory.clear()
+    asyncio.run(_ask(Tracer([memory]), intents, 10, stream=True))
+    _check_streamed_tokens(memory, 10)
+    print("ok: streamed answers count towards the question's tokens")
+
+    off, on = Tracer(enabled=False), Tracer([PrometheusExporter()])
+    print(f"span cost: off {_span_cost(off, args.spans) * 1e9:.0f} ns, "
+          f"on {_span_cost(on, args.spans) * 1e9:.0f} ns")
+    for label, tracer in (("off", off), ("on", on)):
+        asyncio.run(_ask(tracer, intents, 10))  # warm-up
+        elapsed = asyncio.run(_ask(tracer, intents, args.questions))
+        print(f"tracing {label:<3}: {args.questions / elapsed:.0f} questions/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Success rate and tail latency of the LLM transport under injected faults.
+
+Starts :class:`mock_openai_server.MockOpenAIServer` with a share of failed
+(429/500/503) and slow responses and sends the same batch of final-answer
+completions through four clients:
+
+* ``bare``            – ``AsyncOpenAI`` without retries;
+* ``sdk-retries``     – ``AsyncOpenAI`` with the SDK's default two retries;
+* ``resilient``       – :class:`transport.ResilientClient` (deadline, retries
+  with jittered backoff, circuit breaker), hedging off;
+* ``resilient+hedge`` – the same with hedged requests, as the agent's final
+  answer uses them.
+
+The resilient clients are wrapped in a :class:`rate_limit.RateLimitedClient`
+(as ``batch.py`` does), which must charge its requests bucket for every
+request the server receives, retries and hedged duplicates included.
+
+Each client first sends ``--warmup`` unmeasured requests, as a long-lived
+client would have.  Reports successes, p50/p95/p99/max latency and the
+requests the server received (and the requests the rate limiter charged).  Then it checks the circuit breaker: with every request failing,
+the breaker must open after ``breaker_threshold`` failures and fail the
+remaining calls without reaching the server, and a probe must close it once
+the server recovers.  Exits non-zero if the resilient client loses requests,
+hedging does not cut p99, or the breaker misbehaves.
+
+Usage::
+
+    $ python benchmarks/bench_transport.py [--requests 400] [--concurrency 16] [--warmup 100]
+          [--error-rate 0.05] [--slow-rate 0.03] [--slow-latency-ms 1000] [--stream]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import transport  # noqa: E402
+from mock_openai_server import MockOpenAIServer  # noqa: E402
+from rate_limit import RateLimitedClient, TokenBucket  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "Summarise the counts."}]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float("nan")
+
+
+def _client(kind: str, base_url: str, settings: transport.TransportSettings):
+    from openai import AsyncOpenAI
+
+    if kind == "bare":
+        return AsyncOpenAI(base_url=base_url, api_key="test", max_retries=0)
+    if kind == "sdk-retries":
+        return AsyncOpenAI(base_url=base_url, api_key="test")
+    sdk = AsyncOpenAI(base_url=base_url, api_key="test", max_retries=0,
+                      http_client=transport.async_http_client(settings))
+    return transport.ResilientClient(sdk, settings, seed=0)
+
+
+async def _one(client, stream: bool) -> None:
+    response = await client.chat.completions.create(model="mock", messages=MESSAGES, stream=stream)
+    if stream:
+        async for _ in response:
+            pass
+
+
+async def _batch(kind: str, server: MockOpenAIServer, settings, args):
+    client = _client(kind, server.base_url, settings)
+    # Never waits; only counts the requests charged
+    limited = RateLimitedClient(client, TokenBucket(1e9)) if isinstance(client, transport.ResilientClient) else client
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    failures = 0
+
+    async def call(record: bool) -> None:
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                with transport.call_options(hedge=kind.endswith("hedge")):
+                    await _one(limited, args.stream)
+            except Exception:
+                failures += record
+            else:
+                if record:
+                    latencies.append(time.perf_counter() - start)
+
+    # A long-lived client has seen enough calls to know its p95 latency.
+    await asyncio.gather(*(call(False) for _ in range(args.warmup)))
+    before = server.requests
+    charged = getattr(limited, "calls", 0) + getattr(limited, "extra_attempts", 0)
+    await asyncio.gather(*(call(True) for _ in range(args.requests)))
+    sent = server.requests - before
+    charged = getattr(limited, "calls", 0) + getattr(limited, "extra_attempts", 0) - charged
+    await client.close()
+    return latencies, failures, sent, charged, client
+
+
+async def _breaker(server: MockOpenAIServer, settings) -> list[str]:
+    problems = []
+    client = _client("resilient", server.base_url, settings)
+    server.error_rate, server.error_statuses = 1.0, (503,)
+    before = server.requests
+    fast_failures = 0
+    for _ in range(20):
+        try:
+            await _one(client, False)
+        except transport.CircuitOpenError:
+            fast_failures += 1
+        except Exception:
+            pass
+    reached = server.requests - before
+    print(f"\noutage: 20 calls, {reached} reached the server, {fast_failures} failed fast, "
+          f"breaker {client.breaker.state}")
+    if client.breaker.state != "open" or reached > settings.breaker_threshold + 1 or fast_failures < 15:
+        problems.append("the breaker did not open and shed load during the outage")
+
+    server.error_rate = 0.0
+    await asyncio.sleep(settings.breaker_reset + 0.05)
+    try:
+        await _one(client, False)
+    except Exception as e:
+        problems.append(f"probe after recovery failed: {e!r}")
+    print(f"recovery: probe call -> breaker {client.breaker.state}")
+    await client.close()
+    if client.breaker.state != "closed":
+        problems.append("the breaker did not close after a successful probe")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=100, help="unmeasured requests sent first")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--slow-latency-ms", type=float, default=1000)
+    parser.add_argument("--backoff-ms", type=float, default=50, help="backoff base of the resilient client")
+    parser.add_argument("--stream", action="store_true")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    settings = transport.TransportSettings(backoff_base=args.backoff_ms / 1000, breaker_reset=0.5,
+                                           breaker_threshold=5, deadline=30)
+    server = MockOpenAIServer(["intent"], args.latency_ms / 1000, error_rate=args.error_rate,
+                              slow_rate=args.slow_rate, slow_latency=args.slow_latency_ms / 1000, seed=1)
+    problems = []
+    p99 = {}
+    with server:
+        print(f"{'client':<17}{'ok':>6}{'failed':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+              f"{'max ms':>9}{'sent':>7}  notes")
+        for kind in ("bare", "sdk-retries", "resilient", "resilient+hedge"):
+            latencies, failures, sent, charged, client = asyncio.run(_batch(kind, server, settings, args))
+            ms = [1000 * x for x in latencies]
+            p99[kind] = _percentile(ms, 0.99)
+            notes = ""
+            if isinstance(client, transport.ResilientClient):
+                stats = client.stats()
+                notes = (f"retries={stats['retries']} hedges={stats['hedges']} hedge_wins={stats['hedge_wins']} "
+                         f"rate-limited={charged}")
+                if failures:
+                    problems.append(f"{kind} lost {failures} of {args.requests} requests")
+                if charged < sent:
+                    problems.append(f"{kind}: the rate limiter charged {charged} requests, the server got {sent}")
+            print(f"{kind:<17}{len(ms):>6}{failures:>8}{_percentile(ms, 0.5):>9.1f}{_percentile(ms, 0.95):>9.1f}"
+                  f"{p99[kind]:>9.1f}{max(ms, default=float('nan')):>9.1f}{sent:>7}  {notes}")
+        if args.slow_rate > 0 and not p99["resilient+hedge"] < p99["resilient"]:
+            problems.append("hedging did not reduce p99 latency")
+        problems += asyncio.run(_breaker(server, settings))
+    if problems:
+        sys.exit("\n".join(problems))
+
+
+if __name__ == "__main__":
+    main()
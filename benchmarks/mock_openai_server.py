@@ -0,0 +1,291 @@
+"""Local OpenAI-compatible stand-in for offline benchmarks.
+
+Serves ``POST /v1/chat/completions`` with scripted responses that drive the
+agent through a realistic ReAct episode, without any network access:
+
+* text planning requests (``tool_choice="none"``) get a short text plan;
+* structured planning requests (``tool_choice`` forcing ``submit_plan``) get
+  the whole episode as one plan: the intent filter, then one count per intent
+  depending on it;
+* a new user question gets ``select_semantic_intent`` over ``fanout`` intents;
+* the filter result gets one ``count_intent`` call per intent (parallel calls);
+* the counts get ``finish``; requests without tools get the final answer.
+
+Intents are picked from ``intents`` by a hash of the question, so a run is
+reproducible.  Every response waits ``latency`` seconds first; ``stream=true``
+requests are answered as server-sent events, one chunk per word.  Usage is
+reported as characters/4 estimates.
+
+Faults can be injected to exercise the client's retry policy: a share
+``error_rate`` of the requests fails with one of ``error_statuses`` (429s
+carry a ``retry-after-ms`` header), and a share ``slow_rate`` waits
+``slow_latency`` seconds instead of ``latency`` (tail latency).  Faults are
+drawn from a seeded generator; both rates can be changed while the server runs.
+
+Usage::
+
+    $ python benchmarks/mock_openai_server.py [--port 8000] [--latency-ms 50]
+          [--error-rate 0.1] [--slow-rate 0.05] [--slow-latency-ms 1000]
+    $ OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=test python main.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+__all__ = ["MockOpenAIServer"]
+
+_ids = itertools.count()
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen backlog (5) drops connections under bursts, and the
+    # client's SYN retry then adds a full second of latency.
+    request_queue_size = 128
+
+
+def _usage(messages: list[dict], text: str) -> dict:
+    prompt = sum(len(str(m.get("content") or "")) for m in messages) // 4
+    completion = len(text) // 4
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+class MockOpenAIServer:
+    """Threaded HTTP server answering chat completions from a fixed script.
+
+    Parameters
+    ----------
+    intents : list[str]
+        Intent names the scripted tool calls choose from.
+    latency : float
+        Seconds every response is delayed by.
+    fanout : int
+        Intents filtered (and counted in parallel) per question.
+    host, port : str, int
+        Bind address; port 0 picks a free port.
+    error_rate, error_statuses : float, tuple[int, ...]
+        Share of requests answered with an error status, and the statuses.
+    slow_rate, slow_latency : float, float
+        Share of requests delayed by *slow_latency* seconds instead.
+    seed : int
+        Seed of the fault draws.
+    """
+
+    def __init__(self, intents: list[str], latency: float = 0.05, fanout: int = 2,
+                 host: str = "127.0.0.1", port: int = 0, error_rate: float = 0.0,
+                 error_statuses: tuple[int, ...] = (429, 500, 503), slow_rate: float = 0.0,
+                 slow_latency: float = 1.0, seed: int = 0):
+        self.intents = list(intents)
+        self.latency = latency
+        self.fanout = fanout
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self._random = random.Random(seed)
+        self.requests = 0
+        self.faults: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._httpd = _HTTPServer((host, port), self._handler())
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockOpenAIServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "MockOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # ------------------------------------------------------------------
+    # Script
+    # ------------------------------------------------------------------
+
+    def _question_intents(self, messages: list[dict]) -> list[str]:
+        question = next(m["content"] for m in reversed(messages) if m["role"] == "user")
+        seed = int.from_bytes(hashlib.sha256(question.encode()).digest()[:4], "big")
+        return [self.intents[(seed + i) % len(self.intents)] for i in range(self.fanout)]
+
+    def _fault(self) -> tuple[int | None, float]:
+        """Draw this request's error status (``None`` for success) and delay."""
+        with self._lock:
+            status = None
+            if self._random.random() < self.error_rate:
+                status = self._random.choice(self.error_statuses)
+                self.faults[str(status)] = self.faults.get(str(status), 0) + 1
+            delay = self.latency
+            if self._random.random() < self.slow_rate:
+                delay = self.slow_latency
+                self.faults["slow"] = self.faults.get("slow", 0) + 1
+            return status, delay
+
+    def respond(self, request: dict) -> tuple[str | None, list[tuple[str, dict]]]:
+        """Return ``(content, tool_calls)`` for a chat completion *request*."""
+        messages = request["messages"]
+        tool_choice = request.get("tool_choice")
+        if tool_choice == "none":
+            return "1. select_semantic_intent  2. count_intent for each intent  3. finish", []
+        if isinstance(tool_choice, dict) and tool_choice["function"]["name"] == "submit_plan":
+            intents = self._question_intents(messages)
+            steps = [{"id": "select", "tool": "select_semantic_intent",
+                      "arguments": json.dumps({"intent_names": intents}), "depends_on": []}]
+            steps += [{"id": f"count{i}", "tool": "count_intent", "arguments": json.dumps({"intent_name": intent}),
+                       "depends_on": ["select"]} for i, intent in enumerate(intents)]
+            return None, [("submit_plan", {"steps": steps})]
+        if not request.get("tools"):
+            counts = [m["content"] for m in messages if m["role"] == "tool" and m["content"].isdigit()]
+            return f"Here are the counts you asked for: {', '.join(counts[-self.fanout:])}.", []
+
+        last = messages[-1]
+        if last["role"] == "user":
+            return None, [("select_semantic_intent", {"intent_names": self._question_intents(messages)})]
+        if last["role"] == "tool" and last["content"].startswith("Cached intents"):
+            return None, [("count_intent", {"intent_name": i}) for i in self._question_intents(messages)]
+        return None, [("finish", {})]
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    def _completion(self, request: dict, content, tool_calls) -> dict:
+        message: dict = {"role": "assistant", "content": content}
+        if tool_calls:
+            message["tool_calls"] = [
+                {"id": f"call_{next(_ids)}", "type": "function",
+                 "function": {"name": name, "arguments": json.dumps(args)}}
+                for name, args in tool_calls
+            ]
+        return {
+            "id": f"chatcmpl-{next(_ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{"index": 0, "message": message,
+                         "finish_reason": "tool_calls" if tool_calls else "stop"}],
+            "usage": _usage(request["messages"], json.dumps(message)),
+        }
+
+    def _chunks(self, request: dict, content: str):
+        base = {"id": f"chatcmpl-{next(_ids)}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": request.get("model", "mock")}
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            piece = word if i == len(words) - 1 else word + " "
+            yield {**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+        yield {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+            disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, body: dict, headers: dict | None = None) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    request = json.loads(self.rfile.read(length))
+                except ValueError:
+                    return  # the client closed the connection mid-request
+                if not self.path.endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+                    return
+                with server._lock:
+                    server.requests += 1
+                status, delay = server._fault()
+                time.sleep(delay)
+                try:
+                    self._answer(request, status)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up (timeout or hedged duplicate)
+
+            def _answer(self, request: dict, status: int | None) -> None:
+                if status is not None:
+                    headers = {"retry-after-ms": "20"} if status == 429 else {}
+                    self._send_json(status, {"error": {"message": f"injected fault {status}",
+                                                       "type": "server_error", "code": None}}, headers)
+                    return
+                content, tool_calls = server.respond(request)
+
+                if not request.get("stream"):
+                    self._send_json(200, server._completion(request, content, tool_calls))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for chunk in server._chunks(request, content or ""):
+                    self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                self._write_chunk(b"data: [DONE]\n\n")
+                self._write_chunk(b"")
+
+            def _write_chunk(self, data: bytes) -> None:
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--fanout", type=int, default=2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency-ms", type=float, default=1000)
+    args = parser.parse_args()
+
+    import data_loader as dl
+
+    server = MockOpenAIServer(dl.get_dataset().intent_enum, args.latency_ms / 1000, args.fanout,
+                              args.host, args.port, error_rate=args.error_rate,
+                              slow_rate=args.slow_rate, slow_latency=args.slow_latency_ms / 1000)
+    print(f"serving on {server.base_url}", file=sys.stderr)
+    server.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
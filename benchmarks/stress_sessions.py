@@ -0,0 +1,138 @@
+"""Concurrency stress check for ``AgentSession``.
+
+Many sessions run questions concurrently from a thread pool (through the
+blocking ``run()`` wrapper) and from one event loop (through ``arun()``)
+against a scripted in-process stand-in for the async OpenAI client (no
+network).  Each session filters to its own intent, counts it and finishes;
+the script then verifies that no session observed another session's filter
+or history.
+Exits non-zero on the first isolation failure.
+
+Usage::
+
+    $ python benchmarks/stress_sessions.py [--sessions 64] [--threads 16] [--questions 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data_loader as dl  # noqa: E402
+from agent import AgentSession, SessionSettings  # noqa: E402
+
+_call_ids = itertools.count()
+
+
+def _completion(content=None, tool_calls=()):
+    calls = [
+        SimpleNamespace(
+            id=f"call_{next(_call_ids)}",
+            function=SimpleNamespace(name=name, arguments=json.dumps(args)),
+        )
+        for name, args in tool_calls
+    ]
+    message = SimpleNamespace(role="assistant", content=content, tool_calls=calls or None)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class ScriptedClient:
+    """Filter -> count -> finish -> answer, driven by the session history."""
+
+    def __init__(self, intent: str):
+        self.intent = intent
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, *, messages, tools=None, **kwargs):
+        await asyncio.sleep(0.001)  # yield to other sessions mid-conversation
+        last = messages[-1]
+        if tools is None:
+            counted = [m["content"] for m in messages if m["role"] == "tool"][-2]
+            return _completion(f"{self.intent}={counted}")
+        if last["role"] == "user":
+            return _completion(tool_calls=[("select_semantic_intent", {"intent_names": [self.intent]})])
+        if last["content"].startswith("Cached intents"):
+            return _completion(tool_calls=[("count_intent", {"intent_name": self.intent})])
+        return _completion(tool_calls=[("finish", {})])
+
+
+def _check_answer(session: AgentSession, intent: str, expected: int, answer: str) -> None:
+    if answer != f"{intent}={expected}":
+        raise AssertionError(f"session for {intent!r} answered {answer!r}")
+    if session.active_subset.count("intent", intent) != len(session.active_subset):
+        raise AssertionError(f"session for {intent!r} sees a foreign filter")
+
+
+def _check_history(session: AgentSession, intent: str, questions: int) -> None:
+    users = [m["content"] for m in session.messages if m["role"] == "user"]
+    if any(not u.startswith(f"[{intent}]") for u in users) or len(users) != questions:
+        raise AssertionError(f"session for {intent!r} sees foreign history")
+
+
+def _drive(session: AgentSession, intent: str, expected: int, questions: int) -> None:
+    for q in range(questions):
+        _check_answer(session, intent, expected, session.run(f"[{intent}] question {q}"))
+    _check_history(session, intent, questions)
+
+
+async def _adrive(session: AgentSession, intent: str, expected: int, questions: int) -> None:
+    for q in range(questions):
+        _check_answer(session, intent, expected, await session.arun(f"[{intent}] question {q}"))
+    _check_history(session, intent, questions)
+
+
+def _make_sessions(dataset, count: int) -> list[tuple[AgentSession, str, int]]:
+    intents = [dataset.intent_enum[i % len(dataset.intent_enum)] for i in range(count)]
+    return [
+        (
+            AgentSession(SessionSettings(verbose=False), client=ScriptedClient(intent)),
+            intent,
+            dataset.full.count("intent", intent),
+        )
+        for intent in intents
+    ]
+
+
+def _report(label: str, sessions: int, questions: int, elapsed: float) -> None:
+    total = sessions * questions
+    print(f"ok [{label}]: {sessions} sessions x {questions} questions in {elapsed:.2f}s "
+          f"({total / elapsed:.0f} questions/s)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--questions", type=int, default=5)
+    args = parser.parse_args()
+
+    dataset = dl.get_dataset()
+
+    sessions = _make_sessions(dataset, args.sessions)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        futures = [pool.submit(_drive, *item, args.questions) for item in sessions]
+        for future in futures:
+            future.result()
+    _report(f"{args.threads} threads", args.sessions, args.questions, time.perf_counter() - start)
+
+    async def drive_all() -> None:
+        await asyncio.gather(*(_adrive(*item, args.questions) for item in sessions))
+
+    sessions = _make_sessions(dataset, args.sessions)
+    start = time.perf_counter()
+    asyncio.run(drive_all())
+    _report("asyncio", args.sessions, args.questions, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Per-question guards on the agent loop: turns, wall-clock time, tokens, repeats.
+
+Every question an :class:`agent.AgentSession` answers gets a
+:class:`QuestionBudget`.  The loop charges each model round that may call
+tools (a *turn*) and every LLM token, bounds its LLM calls by the time left
+(:meth:`QuestionBudget.within`) and asks :meth:`QuestionBudget.exhausted`
+before each new turn.  Once a limit is reached, the session stops calling
+tools and asks the model for the answer from the results gathered so far;
+when even that fails, the answer is built locally from those results.
+
+A tool call repeated with the same arguments on the same active subset
+within a question is answered from the first result
+(:meth:`QuestionBudget.repeat`) instead of running again.  Only tools whose
+result depends on nothing but their arguments and the data are considered:
+read-only tools registered with ``memoize=`` and the ``stateful`` filters,
+which are repeats when the active subset is already the one they produced.
+Consecutive turns made only of repeats mean the model is going round in
+circles and end the question like an exhausted budget.
+
+:meth:`QuestionBudget.report` describes what a question consumed; the
+session keeps it as ``last_budget``, sends it with the ``done`` event and
+sets it on the question's trace span.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Awaitable, TypeVar
+
+__all__ = ["QuestionBudget", "REASONS"]
+
+T = TypeVar("T")
+
+# Why a question was stopped early, as shown to the model and the user
+REASONS = {
+    "turns": "maximum number of turns",
+    "time": "time limit",
+    "tokens": "token budget",
+    "repeats": "repeated tool calls",
+}
+
+
+class QuestionBudget:
+    """Limits and consumption of one question.
+
+    Parameters
+    ----------
+    max_turns : int, optional
+        Model rounds that may call tools (ReAct turns and plan rounds).
+    seconds : float, optional
+        Wall-clock time for everything before the final answer.
+    tokens : int, optional
+        LLM tokens (prompt and completion) over all calls of the question.
+    finish_seconds : float
+        Time the final answer always gets, even after ``seconds`` ran out;
+        a question thus takes at most ``seconds + finish_seconds``.
+    max_repeated_turns : int
+        Consecutive turns made only of repeated tool calls before the
+        question is stopped.
+
+    ``None`` disables a limit.
+    """
+
+    def __init__(
+        self,
+        max_turns: int | None = None,
+        seconds: float | None = None,
+        tokens: int | None = None,
+        finish_seconds: float = 30.0,
+        max_repeated_turns: int = 2,
+    ):
+        self.max_turns = max_turns
+        self.seconds = seconds
+        self.max_tokens = tokens
+        self.finish_seconds = finish_seconds
+        self.max_repeated_turns = max_repeated_turns
+        self.started = time.monotonic()
+        self.turns = 0
+        self.tokens = 0
+        self.tool_calls = 0
+        self.repeated_calls = 0
+        self.repeated_turns = 0  # consecutive, reset by a turn with a new call
+        # Why the question was stopped early (see REASONS), or ``None``
+        self.stop_reason: str | None = None
+        # Results of this question's calls by (tool, arguments, subset version)
+        self._results: dict[tuple, str] = {}
+        self._lock = threading.Lock()  # tools run in worker threads
+
+    # -- consumption ----------------------------------------------------
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self) -> float | None:
+        """Seconds left before the time limit (negative once past), or ``None``."""
+        return None if self.seconds is None else self.seconds - self.elapsed()
+
+    def charge_turn(self) -> None:
+        self.turns += 1
+
+    def charge_tokens(self, tokens: int) -> None:
+        with self._lock:
+            self.tokens += tokens
+
+    def end_turn(self, calls: int, repeated: int) -> None:
+        """Record a turn of *calls* tool calls of which *repeated* were repeats."""
+        self.repeated_turns = self.repeated_turns + 1 if calls and repeated == calls else 0
+
+    def stop(self, reason: str) -> None:
+        """Stop the question for *reason* (the first reason is kept)."""
+        if self.stop_reason is None:
+            self.stop_reason = reason
+
+    def exhausted(self) -> str | None:
+        """Return why no further turn may start, or ``None`` if one may."""
+        if self.stop_reason is None:
+            if self.max_turns is not None and self.turns >= self.max_turns:
+                self.stop("turns")
+            elif self.max_tokens is not None and self.tokens >= self.max_tokens:
+                self.stop("tokens")
+            elif self.seconds is not None and self.elapsed() >= self.seconds:
+                self.stop("time")
+            elif self.repeated_turns >= self.max_repeated_turns:
+                self.stop("repeats")
+        return self.stop_reason
+
+    async def within(self, awaitable: Awaitable[T], finishing: bool = False) -> T:
+        """Await *awaitable* for at most the time left.
+
+        With *finishing* (the final answer), at least ``finish_seconds``.
+
+        Raises
+        ------
+        asyncio.TimeoutError
+            When the time ran out; the budget is then stopped for ``"time"``.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return await awaitable
+        if finishing:
+            remaining = max(remaining, self.finish_seconds)
+        try:
+            return await asyncio.wait_for(awaitable, max(remaining, 0))
+        except asyncio.TimeoutError:
+            self.stop("time")
+            raise
+
+    # -- repeated tool calls --------------------------------------------
+
+    def repeat(self, key: tuple | None) -> str | None:
+        """Count a tool call; return the result of the earlier call *key*, if any.
+
+        A *key* of ``None`` stands for a call that is never a repeat.
+        """
+        with self._lock:
+            self.tool_calls += 1
+            result = self._results.get(key) if key is not None else None
+            if result is not None:
+                self.repeated_calls += 1
+            return result
+
+    def record(self, key: tuple, result: str) -> None:
+        """Remember *result* for later repeats of the call *key*."""
+        with self._lock:
+            self._results[key] = result
+
+    # -- reporting --------------------------------------------------------
+
+    def report(self) -> dict:
+        """What the question consumed, next to its limits."""
+        return {
+            "turns": self.turns,
+            "max_turns": self.max_turns,
+            "tokens": self.tokens,
+            "max_tokens": self.max_tokens,
+            "seconds": round(self.elapsed(), 6),
+            "max_seconds": self.seconds,
+            "tool_calls": self.tool_calls,
+            "repeated_calls": self.repeated_calls,
+            "stop_reason": self.stop_reason,
+        }
@@ -1,27 +1,502 @@
+"""Dataset access for the agent.
+
+Nothing is loaded at import time: the first call to :func:`get_dataset` (or
+the first access to one of the legacy module attributes such as ``df`` or
+``intent_enum``) opens the local snapshot and builds the label indexes.  The
+result is kept for the rest of the process.
+
+The dataset grows by appending batches of rows (:meth:`Dataset.append` and
+:func:`publish`; :mod:`ingest` reads them from JSONL/Parquet files).  Every
+:class:`Dataset` is an immutable version: appending builds a new one that
+shares the old version's buffers and extends its label indexes by the batch
+only, and :func:`get_dataset` returns the latest published version.  Code
+that holds on to an older version keeps reading it unchanged.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
-from datasets import load_dataset
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import snapshot
+from lazy import lazy
 
 __all__ = [
     "df",
+    "table",
     "category_enum",
     "intent_enum",
     "CACHE",
+    "TEXT_COLUMNS",
+    "Dataset",
+    "get_dataset",
+    "text_column",
+    "records",
+    "LabelIndex",
+    "Subset",
+    "label_indexes",
+    "FULL_SUBSET",
+    "select_rows",
+    "publish",
 ]
 
+DATASET_NAME = "bitext/Bitext-customer-support-llm-chatbot-training-dataset"
+DATASET_SPLIT = "train"
+SNAPSHOT_NAME = "bitext-train"
+
+LABEL_COLUMNS = ("category", "intent")
+# Wide free-text columns; kept in the memory-mapped Arrow table and only
+# converted to Python objects for the rows that are actually requested.
+TEXT_COLUMNS = ("instruction", "response")
+# Filters remembered by Dataset.select_rows
+SELECTION_CACHE_SIZE = 256
+
+
 # ---------------------------------------------------------------------------
-# Dataset loading (executed once at import time)
+# Snapshot building
 # ---------------------------------------------------------------------------
 
-dataset = load_dataset(
-    "bitext/Bitext-customer-support-llm-chatbot-training-dataset", split="train"
-)
+def _encode_labels(raw: pa.Table) -> pa.Table:
+    """Dictionary-encode the label columns with a *sorted* dictionary.
+
+    Sorting makes code ``i`` correspond to ``<column>_enum[i]`` (until
+    :meth:`Dataset.append` adds labels) and keeps the codes stable between
+    snapshot rebuilds.
+    """
+    for name in LABEL_COLUMNS:
+        column = raw.column(name).combine_chunks()
+        if pa.types.is_dictionary(column.type):
+            column = column.dictionary_decode()
+        labels = pa.array(sorted(pc.unique(column).to_pylist()), type=pa.string())
+        codes = pc.index_in(column, value_set=labels).cast(pa.int16())
+        encoded = pa.DictionaryArray.from_arrays(codes, labels)
+        raw = raw.set_column(raw.schema.get_field_index(name), name, encoded)
+    return raw
+
+
+def _download_table() -> pa.Table:
+    """Fetch the split from the HuggingFace Hub (only used to build the snapshot)."""
+    # Imported lazily: ``datasets`` is slow to import and not needed once the
+    # local snapshot exists.
+    from datasets import load_dataset
+
+    dataset = load_dataset(DATASET_NAME, split=DATASET_SPLIT)
+    return _encode_labels(dataset.data.table.combine_chunks())
+
+
+def _is_string(type_: pa.DataType) -> bool:
+    if pa.types.is_dictionary(type_):
+        type_ = type_.value_type
+    return pa.types.is_string(type_) or pa.types.is_large_string(type_)
+
+
+def _plain(column: pa.ChunkedArray) -> pa.Array:
+    """Return *column* as one array, dictionary-decoded."""
+    chunk = column.combine_chunks()
+    return chunk.dictionary_decode() if pa.types.is_dictionary(chunk.type) else chunk
+
+
+def _extend_categorical(series: pd.Series, values: pa.Array) -> pd.Series:
+    """Append *values* to the categorical *series*.
+
+    Labels not seen before get the next free codes (in sorted order among
+    themselves), so the codes of the existing rows stay valid.
+    """
+    labels = series.cat.categories.tolist()
+    known = set(labels)
+    categories = labels + sorted(v for v in pc.unique(values).to_pylist() if v is not None and v not in known)
+    codes = pc.fill_null(pc.index_in(values, value_set=pa.array(categories, type=pa.string())), -1)
+    codes = np.concatenate([series.cat.codes.to_numpy(), codes.to_numpy(zero_copy_only=False)])
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories, validate=False), name=series.name)
+
+
+def _label_series(column: pa.ChunkedArray) -> pd.Categorical:
+    chunk = column.combine_chunks()
+    if not pa.types.is_dictionary(chunk.type):
+        chunk = pc.dictionary_encode(chunk)
+    # Nulls (columns an appended batch did not have) become code -1.
+    return pd.Categorical.from_codes(
+        pc.fill_null(chunk.indices, -1).to_numpy(zero_copy_only=False),
+        categories=chunk.dictionary.to_pylist(),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Precomputed label indexes
+# ---------------------------------------------------------------------------
+
+class LabelIndex:
+    """Integer codes, per-code counts and row positions for one label column.
+
+    Everything is computed once from the categorical codes so that counting a
+    label is a dictionary + array lookup and filtering by a set of labels is
+    a concatenation of precomputed position arrays.
+    """
+
+    def __init__(self, column: pd.Series):
+        self.labels: list[str] = column.cat.categories.tolist()
+        self.codes: np.ndarray = column.cat.codes.to_numpy()
+        self.counts: np.ndarray = np.bincount(self.codes, minlength=len(self.labels))
+        self._code_of = {label: code for code, label in enumerate(self.labels)}
+
+        # A stable argsort groups row positions by code while keeping each
+        # group in ascending row order.
+        order = np.argsort(self.codes, kind="stable")
+        self.positions: list[np.ndarray] = np.split(order, np.cumsum(self.counts)[:-1])
+
+    def code(self, label: str) -> int | None:
+        """Return the integer code of *label* or ``None`` if it is unknown."""
+        return self._code_of.get(label)
+
+    def rows_for(self, labels: list[str], start: int = 0) -> np.ndarray:
+        """Return the sorted row positions from *start* on whose label is in *labels*."""
+        codes = sorted({c for c in map(self.code, labels) if c is not None})
+        if not codes:
+            return np.empty(0, dtype=np.int64)
+        parts = [self.positions[c] for c in codes]
+        if start:
+            parts = [p[np.searchsorted(p, start):] for p in parts]
+        return np.sort(np.concatenate(parts))
+
+    def extend(self, column: pd.Series) -> LabelIndex:
+        """Return the index of *column*: this index's column with rows appended.
+
+        The categories of *column* must start with :attr:`labels`.  Only the
+        appended rows are counted and grouped; the position arrays of labels
+        that do not occur in them are shared with this index.
+        """
+        start = len(self.codes)
+        extended = object.__new__(LabelIndex)
+        extended.labels = column.cat.categories.tolist()
+        extended.codes = column.cat.codes.to_numpy()
+        extended._code_of = {label: code for code, label in enumerate(extended.labels)}
+
+        batch = extended.codes[start:]
+        counts = np.bincount(batch, minlength=len(extended.labels))
+        order = np.argsort(batch, kind="stable") + start
+        groups = np.split(order, np.cumsum(counts)[:-1])
+        extended.positions = [
+            groups[code] if code >= len(self.positions)
+            else np.concatenate([self.positions[code], groups[code]]) if counts[code]
+            else self.positions[code]
+            for code in range(len(extended.labels))
+        ]
+        counts[: len(self.counts)] += self.counts
+        extended.counts = counts
+        return extended
+
+
+class Subset:
+    """A filtered view of a :class:`Dataset` stored as row positions.
+
+    Per-code counts are computed lazily, once per column, so repeated calls
+    to :meth:`count` are constant time.  ``rows=None`` denotes the full
+    dataset and reuses the counts precomputed in the label indexes.  A
+    *counts* dict passed in is filled in place, so subsets rebuilt for the
+    same rows (e.g. from a ``SubsetCache`` entry) share what was computed.
+    """
+
+    def __init__(self, dataset: "Dataset", rows: np.ndarray | None = None, version: str | None = None,
+                 counts: dict[str, np.ndarray] | None = None):
+        self.dataset = dataset
+        self.rows = rows
+        self._counts: dict[str, np.ndarray] = counts if counts is not None else {}
+        # Known digest of *rows*, e.g. when restored from a SubsetCache entry
+        self._version = version
+
+    def __len__(self) -> int:
+        return len(self.dataset.df) if self.rows is None else len(self.rows)
+
+    @property
+    def version(self) -> str:
+        """Digest of the row positions; equal for subsets with the same rows.
+
+        Tool results that depend on a subset are memoised under it (see
+        :mod:`tool_cache`), so a replaced subset never serves stale results.
+        """
+        if self._version is None:
+            if self.rows is None:
+                self._version = "all"
+            else:
+                rows = np.ascontiguousarray(self.rows, dtype=np.int64)
+                self._version = hashlib.blake2b(rows.tobytes(), digest_size=12).hexdigest()
+        return self._version
+
+    def counts(self, column: str) -> np.ndarray:
+        """Return the per-code counts of *column* inside this subset."""
+        counts = self._counts.get(column)
+        if counts is None:
+            index = self.dataset.label_indexes[column]
+            if self.rows is None:
+                counts = index.counts
+            else:
+                counts = np.bincount(index.codes[self.rows], minlength=len(index.labels))
+            self._counts[column] = counts
+        return counts
+
+    def group_counts(self, columns: list[str]) -> tuple[list[np.ndarray], np.ndarray]:
+        """Count the rows of this subset per combination of *columns*' labels.
+
+        Returns the label codes of every non-empty group (one array per
+        column) and the group sizes, in code order.  One ``bincount`` over
+        the combined integer codes does all the work.
+        """
+        indexes = [self.dataset.label_indexes[c] for c in columns]
+        if len(indexes) == 1:
+            counts = self.counts(columns[0])
+            codes = np.flatnonzero(counts)
+            return [codes], counts[codes]
+        sizes = [len(index.labels) for index in indexes]
+        combined = np.zeros(len(self), dtype=np.int64)
+        for index, size in zip(indexes, sizes):
+            codes = index.codes if self.rows is None else index.codes[self.rows]
+            combined = combined * size + codes
+        counts = np.bincount(combined, minlength=int(np.prod(sizes)))
+        groups = np.flatnonzero(counts)
+        return list(np.unravel_index(groups, sizes)), counts[groups]
+
+    def count(self, column: str, label: str) -> int:
+        """Return how many rows of this subset have ``column == label``."""
+        code = self.dataset.label_indexes[column].code(label)
+        if code is None:
+            return 0
+        return int(self.counts(column)[code])
+
+    def positions(self) -> np.ndarray:
+        """Return the row positions of this subset."""
+        return np.arange(len(self.dataset.df)) if self.rows is None else self.rows
+
+    def sample(self, n: int) -> list[dict]:
+        """Return *n* random rows of this subset as records."""
+        picked = np.random.default_rng().choice(self.positions(), size=n, replace=False)
+        return self.dataset.records(np.sort(picked))
+
+
+# ---------------------------------------------------------------------------
+# Dataset container
+# ---------------------------------------------------------------------------
+
+class Dataset:
+    """One version of the split: the Arrow table plus the derived indexes.
+
+    A version never changes; :meth:`append` returns the next one.
+    """
+
+    def __init__(self, table: pa.Table, fingerprint: str | None = None):
+        # Memory-mapped Arrow table with every column of the split.
+        self.table = table
+        # Checksum of the snapshot the table was mapped from (``None`` for
+        # tables built in memory); derived on-disk indexes are keyed by it.
+        self.fingerprint = fingerprint
+        # Identifies this version of the data in memoised tool results.
+        self.version: str = fingerprint or uuid.uuid4().hex
+        # The version this one was appended to (weakly referenced, so old
+        # versions are freed once nobody reads them) and its row count; the
+        # text and similarity indexes extend the parent's by the new rows.
+        self.parent: weakref.ref | None = None
+        self.parent_rows = 0
+
+        # ``df`` holds the compact columns only: every string column other
+        # than the texts becomes an integer-coded categorical (the label
+        # columns with sorted categories), so no Python strings are kept.
+        df = pd.DataFrame(
+            {
+                name: _label_series(table.column(name)) if _is_string(table.column(name).type)
+                else table.column(name).to_pandas()
+                for name in table.column_names
+                if name not in TEXT_COLUMNS
+            }
+        )
+        self._derive(df, {name: LabelIndex(df[name]) for name in LABEL_COLUMNS})
+
+    def _derive(self, df: pd.DataFrame, label_indexes: dict[str, LabelIndex]) -> None:
+        self.df = df
+        # Enumerations used elsewhere, kept sorted for deterministic ordering
+        # (labels added by append() have codes after the original ones)
+        self.category_enum: list[str] = sorted(df["category"].cat.categories)
+        self.intent_enum: list[str] = sorted(df["intent"].cat.categories)
+        self.label_indexes = label_indexes
+        self.full = Subset(self)
+        # select_rows results by (column, label codes), least recently used
+        # first; repeated filters share one Subset and its cached counts.
+        self._selections: OrderedDict[tuple, Subset] = OrderedDict()
+        self._selections_lock = threading.Lock()
+
+    def _conform(self, batch: pa.Table) -> dict[str, pa.Array]:
+        """Return the columns of *batch* in this dataset's schema order."""
+        missing = [name for name in (*LABEL_COLUMNS, *TEXT_COLUMNS) if name not in batch.column_names]
+        if missing:
+            raise ValueError(f"batch lacks the column(s) {missing}")
+        columns = {}
+        for field in self.table.schema:
+            if field.name not in batch.column_names:
+                columns[field.name] = pa.nulls(batch.num_rows, pa.string())
+                continue
+            column = _plain(batch.column(field.name))
+            if field.name in LABEL_COLUMNS and column.null_count:
+                raise ValueError(f"batch has {column.null_count} row(s) without a {field.name}")
+            columns[field.name] = column
+        return columns
+
+    def append(self, batch: pa.Table) -> Dataset:
+        """Return a new version with the rows of *batch* appended.
+
+        *batch* needs the label and text columns; other columns of this
+        dataset are null where it lacks them, and extra columns are dropped.
+        The new version shares this one's Arrow buffers and position arrays:
+        the categorical codes are copied, everything else (label lookup,
+        counts, grouping by label) only touches the batch.  Labels seen for
+        the first time get new codes and appear in the enums.
+
+        Raises
+        ------
+        ValueError
+            If *batch* lacks a label or text column or has rows without labels.
+        """
+        columns = self._conform(batch)
+        start = len(self.df)
+        frame, chunks = {}, []
+        for field in self.table.schema:
+            values = columns[field.name]
+            if field.name in TEXT_COLUMNS:
+                chunks.append(values.cast(field.type))
+                continue
+            old = self.df[field.name]
+            if isinstance(old.dtype, pd.CategoricalDtype):
+                values = values.cast(pa.string())
+                series = _extend_categorical(old, values)
+                if pa.types.is_dictionary(field.type):
+                    codes = series.cat.codes.to_numpy()[start:]
+                    values = pa.DictionaryArray.from_arrays(
+                        pa.array(codes, type=field.type.index_type, mask=codes < 0),
+                        pa.array(series.cat.categories.tolist(), type=field.type.value_type),
+                    )
+            else:
+                series = pd.concat([old, values.to_pandas()], ignore_index=True).rename(old.name)
+            frame[field.name] = series
+            chunks.append(values.cast(field.type))
+
+        appended = pa.Table.from_arrays(chunks, schema=self.table.schema)
+        version = object.__new__(Dataset)
+        version.table = pa.concat_tables([self.table, appended])
+        version.fingerprint = None
+        version.version = uuid.uuid4().hex
+        version.parent = weakref.ref(self)
+        version.parent_rows = start
+        df = pd.DataFrame(frame)
+        version._derive(df, {name: index.extend(df[name]) for name, index in self.label_indexes.items()})
+        return version
+
+    def text_column(self, name: str) -> pd.Series:
+        """Return the full text column *name* as a new Series.
+
+        The result is not kept: the texts stay in the mapped Arrow buffers,
+        and callers that only need some rows should use :meth:`records`.
+        """
+        return self.table.column(name).to_pandas()
+
+    def records(self, rows: np.ndarray, columns: list[str] | None = None) -> list[dict]:
+        """Return the rows at positions *rows* as a list of dicts.
+
+        Only the requested rows are decoded from the Arrow buffers, so this is
+        cheap even though the text columns are never loaded in full.
+        """
+        selected = self.table if columns is None else self.table.select(columns)
+        return selected.take(pa.array(rows, type=pa.int64())).to_pylist()
+
+    def select_rows(self, column: str, labels: list[str]) -> Subset:
+        """Return the subset of rows whose *column* value is one of *labels*.
+
+        The last :data:`SELECTION_CACHE_SIZE` selections are kept, so the
+        same filter returns the same (read-only) :class:`Subset`.
+        """
+        index = self.label_indexes[column]
+        key = (column, tuple(sorted({c for c in map(index.code, labels) if c is not None})))
+        with self._selections_lock:
+            subset = self._selections.get(key)
+            if subset is not None:
+                self._selections.move_to_end(key)
+                return subset
+        subset = Subset(self, index.rows_for(labels))
+        with self._selections_lock:
+            self._selections[key] = subset
+            if len(self._selections) > SELECTION_CACHE_SIZE:
+                self._selections.popitem(last=False)
+        return subset
+
+
+@lazy
+def _snapshot() -> Dataset:
+    table = snapshot.load_or_build(
+        SNAPSHOT_NAME, _download_table, dataset=DATASET_NAME, split=DATASET_SPLIT
+    )
+    manifest = snapshot.read_manifest(SNAPSHOT_NAME)
+    mapped = manifest is not None and manifest.get("num_rows") == table.num_rows
+    return Dataset(table, manifest["sha256"] if mapped else None)
+
+
+_published: Dataset | None = None
+_publish_lock = threading.Lock()
+
+
+def get_dataset() -> Dataset:
+    """Return the latest published dataset version, loading the snapshot on first use."""
+    return _published or _snapshot.get()
+
+
+def publish(dataset: Dataset, expected: Dataset | None = None) -> None:
+    """Make *dataset* the version returned by :func:`get_dataset`.
+
+    With *expected*, publish only if that is still the current version, so
+    that two writers appending to the same version cannot lose a batch.
+
+    Raises
+    ------
+    RuntimeError
+        If another version was published since *expected*.
+    """
+    global _published
+    with _publish_lock:
+        if expected is not None and get_dataset() is not expected:
+            raise RuntimeError("a newer dataset version was published concurrently")
+        _published = dataset
+
+
+def text_column(name: str) -> pd.Series:
+    return get_dataset().text_column(name)
+
+
+def records(rows: np.ndarray, columns: list[str] | None = None) -> list[dict]:
+    return get_dataset().records(rows, columns)
+
+
+def select_rows(column: str, labels: list[str]) -> Subset:
+    return get_dataset().select_rows(column, labels)
+
 
-df = pd.DataFrame(dataset)
+# Legacy module attributes, resolved against the lazily loaded dataset.
+# ``CACHE`` historically pointed at the full dataframe.
+_DATASET_ATTRIBUTES = {
+    "table": "table",
+    "df": "df",
+    "CACHE": "df",
+    "category_enum": "category_enum",
+    "intent_enum": "intent_enum",
+    "label_indexes": "label_indexes",
+    "FULL_SUBSET": "full",
+}
 
-# Enumerations used elsewhere, kept sorted for deterministic ordering
-category_enum = sorted(df["category"].unique())
-intent_enum = sorted(df["intent"].unique())
 
-# The initial cache contains the full dataframe.  Other modules can mutate
-# this reference to share state.
-CACHE = df 
\ No newline at end of file
+def __getattr__(name: str):
+    attribute = _DATASET_ATTRIBUTES.get(name)
+    if attribute is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(get_dataset(), attribute)
@@ -0,0 +1,395 @@
+"""Python implementations of the function tools exposed to the LLM.
+
+Every tool receives the calling :class:`agent.AgentSession` as its first
+argument.  The filter tools store their result in the session's subset
+cache, make it the active subset and return its handle; the counting,
+sampling and aggregation tools read the active subset or the subset of an
+explicit handle.  Concurrent sessions never see each other's filters.  The
+dataset itself is shared and read-only; each session reads the version it
+pinned for the current question (:meth:`agent.AgentSession.refresh_dataset`),
+and the filters say how to extend their subsets to rows ingested later.
+
+Read-only tools are registered with ``memoize=...`` so that repeated calls
+on the same data are answered from :mod:`tool_cache`; tools that change the
+session's state (the filters) or return new rows on every call
+(``show_examples``) are not.
+
+Tools are registered with :func:`tool_registry.tool`; their JSON schema is
+generated from the signatures below, so adding a tool only means writing a
+decorated function here.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Literal
+
+import numpy as np
+
+from lazy import lazy_import
+from tool_registry import ToolArgumentError, tool
+
+dl = lazy_import("data_loader")
+sampling = lazy_import("sampling")
+semantic_index = lazy_import("semantic_index")
+text_index = lazy_import("text_index")
+
+if TYPE_CHECKING:
+    from agent import AgentSession
+
+__all__ = [
+    "select_semantic_intent",
+    "select_semantic_category",
+    "combine_subsets",
+    "list_subsets",
+    "search_text",
+    "select_text",
+    "find_similar_instructions",
+    "get_all_intents",
+    "get_all_categories",
+    "sum",
+    "count_intent",
+    "count_category",
+    "aggregate",
+    "show_examples",
+    "summarize",
+    "finish",
+]
+
+
+# ---------------------------------------------------------------------------
+# Filtering
+# ---------------------------------------------------------------------------
+
+def _label_grow(column: str, labels: list[str]):
+    """Select the rows of *labels* among rows ingested later (see SubsetCache.rebase)."""
+    return lambda dataset, start: dataset.label_indexes[column].rows_for(labels, start)
+
+
+@tool(
+    "Filter the dataset by a list of intent names, cache the result, "
+    "and return the cache key (a subset handle).",
+    params={"intent_names": "List of intent names to filter by"},
+    enums={"intent_names": "intent"},
+    stateful=True,
+)
+def select_semantic_intent(session: AgentSession, intent_names: list[str]) -> str:
+    """
+    Filter the dataset by a list of intent names and cache the resulting
+    subset on the session, so that subsequent calls (e.g. ``count_intent`` /
+    ``count_category`` or ``show_examples``) operate on it.
+
+    Args:
+        session (AgentSession): The session whose filter state is updated.
+        intent_names (list[str]): One or more intent names to filter by.
+
+    Returns:
+        str: A short description of the cached subset.
+    """
+    if isinstance(intent_names, str):  # allow accidental single-string usage
+        intent_names = [intent_names]
+
+    subset = session.dataset.select_rows("intent", intent_names)
+    handle = session.keep_subset(subset, f"intent in {intent_names}", _label_grow("intent", intent_names))
+    return f"Cached intents {intent_names} with {len(subset)} rows as handle {handle}"
+
+
+@tool(
+    "Filter the dataset by a list of category names, cache the result, "
+    "and return the cache key (a subset handle).",
+    params={"category_names": "List of category names to filter by"},
+    enums={"category_names": "category"},
+    stateful=True,
+)
+def select_semantic_category(session: AgentSession, category_names: list[str]) -> str:
+    """Same as ``select_semantic_intent`` but for categories."""
+    if isinstance(category_names, str):
+        category_names = [category_names]
+
+    subset = session.dataset.select_rows("category", category_names)
+    handle = session.keep_subset(subset, f"category in {category_names}", _label_grow("category", category_names))
+    return f"Cached categories {category_names} with {len(subset)} rows as handle {handle}"
+
+
+@tool(
+    "Intersect or unite cached subsets, cache the result as the active subset "
+    "and return its handle.",
+    params={
+        "handles": "Handles of the cached subsets to combine (at least two).",
+        "operation": "'intersect' keeps rows in every subset, 'union' rows in any of them.",
+    },
+    stateful=True,
+)
+def combine_subsets(
+    session: AgentSession, handles: list[str], operation: Literal["intersect", "union"]
+) -> str:
+    if len(handles) < 2:
+        raise ToolArgumentError("combine_subsets needs at least two handles")
+    try:
+        combined = getattr(session.subsets, operation)(handles)
+    except KeyError as e:
+        raise ToolArgumentError(e.args[0]) from None
+    session.use_subset(combined)
+    return f"Cached {operation} of {handles} with {len(session.active_subset)} rows as handle {combined}"
+
+
+@tool("List the cached subsets with their handles, filters and row counts.")
+def list_subsets(session: AgentSession) -> list[dict]:
+    return session.subsets.listing()
+
+
+# ---------------------------------------------------------------------------
+# Text search
+# ---------------------------------------------------------------------------
+
+_QUERY = (
+    "Words to search for. Words are ANDed; use OR, NOT, parentheses and "
+    '"double-quoted phrases", e.g. refund AND NOT "credit card".'
+)
+_FIELD = "Text column to search; null searches both instruction and response."
+_SNIPPET_CHARS = 200
+
+
+def _text_query(call, *args, **kwargs):
+    try:
+        return call(*args, **kwargs)
+    except text_index.QueryError as e:
+        raise ToolArgumentError(str(e)) from None
+
+
+@tool(
+    "Full-text search over what customers wrote (instruction) and the answers "
+    "(response). Returns the number of matching rows and the best matches (BM25).",
+    params={
+        "query": _QUERY,
+        "field": _FIELD,
+        "top_k": "How many of the best matches to return; null for 5 (at most 50).",
+        "handle": "Handle of a cached subset to search in; null searches the whole dataset.",
+    },
+    memoize="dataset",
+)
+def search_text(
+    session: AgentSession,
+    query: str,
+    field: Literal["instruction", "response"] | None = None,
+    top_k: int | None = None,
+    handle: str | None = None,
+) -> dict:
+    within = None if handle is None else _subset(session, handle).positions()
+    index = text_index.get_index(session.dataset)
+    top_k = min(max(top_k or 5, 1), 50)
+    matches, rows, scores = _text_query(index.search, query, field, top_k, within)
+    columns = ["instruction", "intent", "category"] + (["response"] if field == "response" else [])
+    results = []
+    for row, score, record in zip(rows, scores, session.dataset.records(rows, columns)):
+        if "response" in record and len(record["response"]) > _SNIPPET_CHARS:
+            record["response"] = record["response"][:_SNIPPET_CHARS] + "…"
+        results.append({"row": int(row), "score": round(float(score), 3), **record})
+    return {"query": query, "matches": len(matches), "results": results}
+
+
+@tool(
+    "Select the rows matching a full-text query, cache them as the active "
+    "subset and return its handle (for the counting and aggregation tools).",
+    params={"query": _QUERY, "field": _FIELD},
+    stateful=True,
+)
+def select_text(
+    session: AgentSession, query: str, field: Literal["instruction", "response"] | None = None
+) -> str:
+    rows = _text_query(text_index.get_index(session.dataset).match, query, field)
+    subset = dl.Subset(session.dataset, rows)
+    where = f" in {field}" if field else ""
+    handle = session.keep_subset(
+        subset,
+        f"text{where} matches {query!r}",
+        lambda dataset, start: text_index.get_index(dataset).match(query, field, start),
+    )
+    return f"Cached text matches for {query!r}{where} with {len(subset)} rows as handle {handle}"
+
+
+@tool(
+    "Find the instructions most similar in wording to a free-text description "
+    "(hashed n-gram TF-IDF, cosine similarity), and the intents they suggest.",
+    params={
+        "text": "Free-text description of what the customer says or wants.",
+        "top_k": "How many similar instructions to return; null for 5 (at most 50).",
+        "handle": "Handle of a cached subset to search in; null searches the whole dataset.",
+    },
+    memoize="dataset",
+)
+def find_similar_instructions(
+    session: AgentSession, text: str, top_k: int | None = None, handle: str | None = None
+) -> dict:
+    dataset = session.dataset
+    within = None if handle is None else _subset(session, handle).positions()
+    rows, similarities = semantic_index.get_index(dataset).search([text], min(max(top_k or 5, 1), 50), within)
+    records = dataset.records(rows[0], ["instruction", "intent", "category"])
+    return {
+        "results": [
+            {"row": int(row), "similarity": round(float(sim), 3), **record}
+            for row, sim, record in zip(rows[0], similarities[0], records)
+        ],
+        "likely_intents": [
+            {"intent": intent, "share": share}
+            for intent, share in semantic_index.likely_intents(text, dataset=dataset)
+        ],
+    }
+
+
+@tool("Return a list of all available intent names.", memoize="dataset")
+def get_all_intents(session: AgentSession) -> list[str]:
+    return session.dataset.df["intent"].unique().tolist()
+
+
+@tool("Return a list of all available category names.", memoize="dataset")
+def get_all_categories(session: AgentSession) -> list[str]:
+    return session.dataset.df["category"].unique().tolist()
+
+
+def _subset(session: AgentSession, handle: str | None):
+    try:
+        return session.subset_for(handle)
+    except KeyError as e:
+        raise ToolArgumentError(e.args[0]) from None
+
+
+_HANDLE = "Handle of a cached subset; null for the most recently selected one."
+
+
+# ---------------------------------------------------------------------------
+# Counting helpers
+# ---------------------------------------------------------------------------
+
+@tool(
+    "Count how many rows have the given intent name and return that number.",
+    params={"intent_name": "The intent name whose frequency you want to count.", "handle": _HANDLE},
+    enums={"intent_name": "intent"},
+    memoize="subset",
+)
+def count_intent(session: AgentSession, intent_name: str, handle: str | None = None) -> int:
+    """Return the number of cached rows whose intent equals *intent_name*."""
+    subset = _subset(session, handle)
+    if len(subset) == 0:
+        return 0
+    return subset.count("intent", intent_name)
+
+
+@tool(
+    "Count how many rows have the given category name and return that number.",
+    params={"category_name": "The category name whose frequency you want to count.", "handle": _HANDLE},
+    enums={"category_name": "category"},
+    memoize="subset",
+)
+def count_category(session: AgentSession, category_name: str, handle: str | None = None) -> int:
+    """Return the number of cached rows whose category equals *category_name*."""
+    subset = _subset(session, handle)
+    if len(subset) == 0:
+        return 0
+    return subset.count("category", category_name)
+
+
+@tool(
+    "Group the cached rows by intent and/or category in one call and return, per group, "
+    "the row count and its share of the cached rows, largest first. With both columns "
+    "this is a cross-tab in long form. Use it instead of counting labels one by one, "
+    "e.g. to find the biggest intent or the intents of each category.",
+    params={
+        "group_by": "Columns to group by: ['intent'], ['category'] or both.",
+        "top_k": "Return only the k largest (or smallest) groups; null for all.",
+        "order": "'desc' for the largest groups first, 'asc' for the smallest; null for 'desc'.",
+        "handle": _HANDLE,
+    },
+    memoize="subset",
+)
+def aggregate(
+    session: AgentSession,
+    group_by: list[Literal["intent", "category"]],
+    top_k: int | None = None,
+    order: Literal["desc", "asc"] | None = None,
+    handle: str | None = None,
+) -> dict:
+    """Vectorised group-by/count/top-k over the integer-coded label columns."""
+    columns = list(dict.fromkeys(group_by))
+    if not columns:
+        raise ToolArgumentError("group_by must name at least one column")
+    if top_k is not None and top_k < 1:
+        raise ToolArgumentError("top_k must be positive")
+
+    subset = _subset(session, handle)
+    codes, counts = subset.group_counts(columns)
+    # Stable sort keeps ties in label order.
+    ranked = np.argsort(counts if order == "asc" else -counts, kind="stable")
+    if top_k is not None:
+        ranked = ranked[:top_k]
+
+    total = len(subset)
+    labels = [session.dataset.label_indexes[c].labels for c in columns]
+    groups = []
+    for i in ranked:
+        group = {c: labels[j][codes[j][i]] for j, c in enumerate(columns)}
+        group["count"] = int(counts[i])
+        group["share"] = round(int(counts[i]) / total, 4)
+        groups.append(group)
+    return {"rows": total, "group_by": columns, "groups_total": len(counts), "groups": groups}
+
+
+# ---------------------------------------------------------------------------
+# Misc helpers
+# ---------------------------------------------------------------------------
+
+@tool(
+    "Function that sums two integers and returns the result",
+    params={"a": "The first integer to sum", "b": "The second integer to sum"},
+)
+def sum(session: AgentSession, a: int, b: int) -> int:
+    return a + b
+
+
+_COLUMN = Literal["instruction", "response", "intent", "category", "flags"]
+
+
+@tool(
+    "Return n example rows from the cached dataset. Draws are seeded per "
+    "session and never repeat: calling again returns the next unseen rows.",
+    params={
+        "n": "The number of examples to show (at most 50).",
+        "handle": _HANDLE,
+        "columns": "Columns to include; null for all of them.",
+        "max_chars": "Cut every text field after this many characters; null for 300.",
+        "stratify_by": "Spread the examples evenly over the intents or categories; null for a plain sample.",
+    },
+)
+def show_examples(
+    session: AgentSession,
+    n: int,
+    handle: str | None = None,
+    columns: list[_COLUMN] | None = None,
+    max_chars: int | None = None,
+    stratify_by: Literal["intent", "category"] | None = None,
+) -> dict:
+    subset = _subset(session, handle)
+    if len(subset) == 0:
+        return {"error": "No data available"}
+    key = handle or session.active_handle or "all"
+    rows, unseen = session.sampler.draw(subset, min(max(n, 1), 50), key, stratify_by)
+    examples = []
+    for batch in sampling.iter_records(session.dataset, rows, columns, max_chars or 300):
+        session.emit_rows(batch)
+        examples.extend(batch)
+    return {"examples": examples, "unseen_rows": unseen}
+
+
+@tool(
+    "Summarise an arbitrary user request.",
+    params={"user_request": "The user request to summarise"},
+)
+def summarize(session: AgentSession, user_request: str) -> str:
+    return f"Summary: {user_request}"
+
+
+@tool(
+    "Signal that the assistant now has enough data to answer the question "
+    "and should produce a final response."
+)
+def finish(session: AgentSession) -> str:
+    return "Conversation finished."
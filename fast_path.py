@@ -0,0 +1,242 @@
+"""Deterministic fast path for simple aggregate questions.
+
+Many questions need nothing but the precomputed label counts: "what is the
+most frequent intent", "how many rows are in category REFUND", "list all
+categories".  The agent loop answers them with several LLM round trips
+(``get_all_intents``, one ``count_intent`` per intent, ``finish`` and a final
+completion).  :class:`FastPathRouter` recognises them with a handful of
+templates and answers straight from ``Dataset.label_indexes``.
+
+Each match gets a confidence: the share of the question's words that are
+accounted for by the filler vocabulary and the recognised label names.  By
+default only a confidence of 1.0 is answered: a single unknown word – an
+extra condition, another column – sends the question to the full agent, so
+the fast path only ever answers questions it fully understood.  Ranks and
+amounts the templates cannot express ("second most frequent", "3rd", "top
+5", "most and least") and words referring to something said before ("it",
+"those") are rejected outright; the agent also skips the router while a
+session has an active subset or earlier turns, since the router only knows
+the full dataset.  The router counts hits and fallbacks and estimates the
+latency saved from the mean duration of the fallbacks.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from lazy import lazy, lazy_import
+
+dl = lazy_import("data_loader")
+
+__all__ = ["FastAnswer", "FastPathRouter", "get_router"]
+
+# Words that may appear in a fast-path question without changing its meaning
+_FILLER = frozenset(
+    """
+    a about all an and any are available be by can could data dataset different distinct do does
+    each entries entry examples exist exists for from give has have how i in is know labelled
+    labeled let list many me much my name names number of on one or overall please records rows s
+    samples show tell the there this total unique want what which with would you
+    count counts frequency frequencies most least frequent common popular biggest largest smallest
+    top highest lowest fewest more less per intent intents category categories
+    """.split()
+)
+
+_WORD = re.compile(r"[a-z0-9]+")
+_SUPERLATIVE = re.compile(
+    r"\b(?:(?P<max>most|biggest|largest|highest|top)|(?P<min>least|smallest|lowest|fewest))\b"
+)
+_HOW_MANY = re.compile(r"\b(?:how many|number of|count)\b")
+_LIST = re.compile(r"\b(?:list|show|what are|which are|give me|name)\b")
+_PER = re.compile(r"\b(?:per|each|by)\s+(?:intent|category)\b")
+# Ranks and amounts the templates cannot answer ("second", "3rd", "top 5")
+_UNSUPPORTED = re.compile(
+    r"\b(?:\d+|\d+(?:st|nd|rd|th)|second|third|fourth|fifth|sixth|seventh|eighth|ninth|tenth|last|next"
+    r"|two|three|four|five|six|seven|eight|nine|ten|twenty|hundred|few|several|some)\b"
+)
+# Words referring to an earlier answer or selection ("... in it", "those")
+_REFERENCE = re.compile(r"\b(?:it|its|them|they|those|these|that|above|previous|same)\b")
+
+
+@dataclass
+class FastAnswer:
+    """A fast-path answer and how sure the router is about it."""
+
+    text: str
+    kind: str
+    confidence: float
+
+
+def _normalise(label: str) -> str:
+    return label.lower().replace("_", " ")
+
+
+class _Vocabulary:
+    """Label names of one dataset, matchable as word sequences."""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.labels: dict[str, tuple[str, str]] = {}  # normalised -> (column, label)
+        for column in dl.LABEL_COLUMNS:
+            for label in dataset.label_indexes[column].labels:
+                self.labels[_normalise(label)] = (column, label)
+        # Longest first, so "cancel order" wins over "order"
+        self._pattern = re.compile(
+            r"\b(" + "|".join(re.escape(n) for n in sorted(self.labels, key=len, reverse=True)) + r")\b"
+        )
+
+    def find(self, text: str) -> list[tuple[str, str, str]]:
+        """Return ``(column, label, matched text)`` for every label in *text*."""
+        return [(*self.labels[m.group(1)], m.group(1)) for m in self._pattern.finditer(text)]
+
+
+class FastPathRouter:
+    """Answers aggregate questions from the precomputed label counts.
+
+    Parameters
+    ----------
+    threshold : float
+        Minimum confidence for answering; below it :meth:`route` returns
+        ``None`` and the caller runs the full agent.  The default of 1.0
+        requires every word to be a filler word or part of a label name.
+    """
+
+    def __init__(self, threshold: float = 1.0):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._vocabulary: _Vocabulary | None = None
+        self._stats = {"questions": 0, "hits": 0, "fallbacks": 0, "fast_seconds": 0.0,
+                       "fallback_seconds": 0.0, "timed_fallbacks": 0}
+
+    def _vocab(self) -> _Vocabulary:
+        dataset = dl.get_dataset()
+        vocabulary = self._vocabulary
+        if vocabulary is None or vocabulary.dataset is not dataset:
+            vocabulary = self._vocabulary = _Vocabulary(dataset)
+        return vocabulary
+
+    # ------------------------------------------------------------------
+    # Matching
+    # ------------------------------------------------------------------
+
+    def classify(self, question: str) -> FastAnswer | None:
+        """Return the best template answer for *question*, whatever its confidence."""
+        vocabulary = self._vocab()
+        text = " ".join(_WORD.findall(_normalise(question).replace("-", " ")))
+        entities = vocabulary.find(text)
+        rest = vocabulary._pattern.sub(" ", text)
+        words = rest.split()
+        if not words or _UNSUPPORTED.search(rest) or _REFERENCE.search(rest):
+            return None
+        # Words of recognised label names count as understood.
+        known = sum(w in _FILLER for w in words) + sum(len(e[2].split()) for e in entities)
+        confidence = known / (len(words) + sum(len(e[2].split()) for e in entities))
+
+        columns = set()
+        if re.search(r"\bintents?\b", rest):
+            columns.add("intent")
+        if re.search(r"\bcategor(?:y|ies)\b", rest):
+            columns.add("category")
+        answer = self._answer(vocabulary.dataset, rest, columns, entities)
+        if answer is None:
+            return None
+        text, kind = answer
+        return FastAnswer(text, kind, round(confidence, 3))
+
+    def _answer(self, dataset, rest: str, columns: set[str], entities) -> tuple[str, str] | None:
+        if len(entities) > 1 or len(columns) > 1:
+            return None  # combinations need the agent (or the aggregate tool)
+
+        if entities:
+            # "how many rows (are there) with intent cancel_order"
+            if not _HOW_MANY.search(rest) or _SUPERLATIVE.search(rest):
+                return None
+            column, label, _ = entities[0]
+            if columns and column not in columns:
+                return None
+            count = dataset.full.count(column, label)
+            return f"There are {count} rows with {column} '{label}'.", "count_label"
+
+        if not columns:
+            if _HOW_MANY.search(rest) and re.search(r"\b(?:rows|examples|entries|records|samples)\b", rest):
+                return f"The dataset has {len(dataset.full)} rows.", "count_rows"
+            return None
+        (column,) = columns
+        index = dataset.label_indexes[column]
+        plural = "intents" if column == "intent" else "categories"
+
+        superlative = _SUPERLATIVE.search(rest)
+        if superlative:
+            if {bool(m.group("max")) for m in _SUPERLATIVE.finditer(rest)} == {True, False}:
+                return None  # "most and least frequent" asks for two answers
+            counts = index.counts
+            target = counts.max() if superlative.group("max") else counts.min()
+            labels = [index.labels[i] for i in np.flatnonzero(counts == target)]
+            which = "most" if superlative.group("max") else "least"
+            if len(labels) == 1:
+                return f"The {which} frequent {column} is '{labels[0]}' with {target} rows.", f"{which}_frequent"
+            names = ", ".join(f"'{label}'" for label in labels)
+            return f"The {which} frequent {plural} are {names}, with {target} rows each.", f"{which}_frequent"
+
+        if _PER.search(rest) or (_HOW_MANY.search(rest) and re.search(r"\b(?:rows|examples)\b", rest)):
+            order = np.argsort(-index.counts, kind="stable")
+            lines = [f"- {index.labels[i]}: {index.counts[i]}" for i in order]
+            return f"Rows per {column}:\n" + "\n".join(lines), "counts_per_label"
+        if _HOW_MANY.search(rest):
+            return f"There are {len(index.labels)} {plural}.", "count_labels"
+        if _LIST.search(rest) or re.search(rf"\ball {plural}\b", rest):
+            return f"The {len(index.labels)} {plural} are: {', '.join(index.labels)}.", "list_labels"
+        return None
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+
+    def route(self, question: str) -> FastAnswer | None:
+        """Answer *question* if it is understood with enough confidence."""
+        self._vocab()  # (re)build outside the timed part
+        start = time.perf_counter()
+        answer = self.classify(question)
+        if answer is not None and answer.confidence < self.threshold:
+            answer = None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats["questions"] += 1
+            if answer is None:
+                self._stats["fallbacks"] += 1
+            else:
+                self._stats["hits"] += 1
+                self._stats["fast_seconds"] += elapsed
+        return answer
+
+    def record_fallback(self, seconds: float) -> None:
+        """Report how long the agent took for a question the router passed on."""
+        with self._lock:
+            self._stats["fallback_seconds"] += seconds
+            self._stats["timed_fallbacks"] += 1
+
+    def stats(self) -> dict:
+        """Hit rate and the latency saved, estimated from the fallbacks' mean."""
+        with self._lock:
+            stats = dict(self._stats)
+        questions, hits = stats["questions"], stats["hits"]
+        stats["hit_rate"] = hits / questions if questions else 0.0
+        mean_fallback = stats["fallback_seconds"] / stats["timed_fallbacks"] if stats["timed_fallbacks"] else 0.0
+        stats["mean_fallback_seconds"] = mean_fallback
+        stats["estimated_seconds_saved"] = max(0.0, hits * mean_fallback - stats["fast_seconds"])
+        return stats
+
+
+@lazy
+def _router() -> FastPathRouter:
+    return FastPathRouter()
+
+
+def get_router() -> FastPathRouter:
+    """Return the process-wide router."""
+    return _router.get()
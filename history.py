@@ -0,0 +1,217 @@
+"""Token-budgeted conversation history for the agent loop.
+
+The chat history of a session only grows, and every completion re-sends all
+of it.  :class:`HistoryManager` keeps what is actually sent within a token
+budget:
+
+* large tool outputs are clipped when they enter the history;
+* once a question has been answered, its episode (question, tool calls, tool
+  results, answer) is collapsed to a short question/answer pair;
+* before each request the oldest collapsed episodes are dropped, and then the
+  current episode's older tool outputs are clipped further, until the prompt
+  fits.  The system prompt and the current episode's turns are always kept.
+
+Token counts use ``tiktoken`` when it is installed and a characters/4
+estimate otherwise.
+"""
+
+from __future__ import annotations
+
+import threading
+from functools import lru_cache
+
+__all__ = ["TokenCounter", "HistoryManager"]
+
+# Fixed per-message cost of the chat format (role, separators)
+_MESSAGE_OVERHEAD = 4
+
+# Length to which tool outputs are cut when the budget is exceeded
+_MIN_TOOL_CHARS = 200
+
+
+class TokenCounter:
+    """Count tokens of chat messages for one model."""
+
+    def __init__(self, model: str = "gpt-4o-mini"):
+        try:
+            import tiktoken
+        except ImportError:
+            self._encode = None
+        else:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("o200k_base")
+            self._encode = encoding.encode
+        # Histories re-send the same strings on every turn, so memoise.
+        self.count_text = lru_cache(maxsize=4096)(self._count_text)
+
+    def _count_text(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encode is None:
+            return (len(text) + 3) // 4
+        return len(self._encode(text))
+
+    def count_message(self, message: dict) -> int:
+        tokens = _MESSAGE_OVERHEAD + self.count_text(message.get("content") or "")
+        for call in message.get("tool_calls") or ():
+            function = call["function"]
+            tokens += self.count_text(function["name"]) + self.count_text(function["arguments"])
+        return tokens
+
+    def count_messages(self, messages: list[dict]) -> int:
+        return sum(self.count_message(m) for m in messages)
+
+
+def _clip(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}… [truncated {len(text) - max_chars} of {len(text)} chars]"
+
+
+class HistoryManager:
+    """Compacts one session's history and records how many tokens it saved.
+
+    The manager tracks where each question's episode starts in the session's
+    message list; :meth:`begin_episode` must be called right before a new
+    user question is appended.
+
+    Parameters
+    ----------
+    budget_tokens : int
+        Upper bound on the prompt tokens of one request.
+    max_tool_output_tokens : int
+        Tool outputs longer than this are clipped when they are recorded.
+    summary_chars : int
+        Length to which questions and answers of finished episodes are cut.
+    model : str
+        Model whose tokenizer is used for counting.
+    """
+
+    def __init__(
+        self,
+        budget_tokens: int = 12000,
+        max_tool_output_tokens: int = 1500,
+        summary_chars: int = 600,
+        model: str = "gpt-4o-mini",
+    ):
+        self.budget_tokens = budget_tokens
+        self.max_tool_output_tokens = max_tool_output_tokens
+        self.summary_chars = summary_chars
+        self.counter = TokenCounter(model)
+        self._starts: list[int] = []
+        # Tokens removed from the stored history so far; they would otherwise
+        # be re-sent with every later request.
+        self._removed_tokens = 0
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "prompt_tokens": 0, "tokens_saved": 0, "last_tokens_saved": 0}
+
+    def reset(self) -> None:
+        self._starts.clear()
+        self._removed_tokens = 0
+
+    # ------------------------------------------------------------------
+    # Compaction steps
+    # ------------------------------------------------------------------
+
+    def clip_tool_output(self, content: str) -> str:
+        """Clip a tool result to roughly ``max_tool_output_tokens``."""
+        tokens = self.counter.count_text(content)
+        if tokens <= self.max_tool_output_tokens:
+            return content
+        # The chars-per-token ratio of this very string keeps the cut close
+        # to the limit.
+        clipped = _clip(content, int(self.max_tool_output_tokens * len(content) / tokens))
+        self._removed_tokens += tokens - self.counter.count_text(clipped)
+        return clipped
+
+    def begin_episode(self, messages: list[dict]) -> None:
+        """Collapse the finished episodes of *messages* and open a new one.
+
+        An episode is finished when it ends in an assistant message without
+        tool calls (the answer).  It is then reduced to its question and the
+        clipped answer; an unfinished episode (e.g. one that failed midway)
+        is kept verbatim.  Everything before the first episode – the system
+        prompt – is never touched.
+        """
+        if self._starts:
+            before = self.counter.count_messages(messages)
+            bounds = [*self._starts, len(messages)]
+            compacted = messages[: self._starts[0]]
+            starts = []
+            for start, end in zip(bounds, bounds[1:]):
+                episode = messages[start:end]
+                starts.append(len(compacted))
+                answer = episode[-1]
+                if len(episode) > 2 and answer["role"] == "assistant" and not answer.get("tool_calls"):
+                    episode = [
+                        {"role": "user", "content": _clip(episode[0]["content"], self.summary_chars)},
+                        {"role": "assistant", "content": _clip(answer["content"] or "", self.summary_chars)},
+                    ]
+                compacted.extend(episode)
+            messages[:] = compacted
+            self._starts = starts
+            self._removed_tokens += before - self.counter.count_messages(messages)
+        self._starts.append(len(messages))
+
+    def fit(self, messages: list[dict]) -> list[dict]:
+        """Return the messages to send so that they fit the token budget.
+
+        The stored history is not modified; older episodes are dropped and
+        tool outputs clipped in the returned list only.
+        """
+        current_start = self._starts[-1] if self._starts else 1
+        total = self.counter.count_messages(messages)
+        uncompacted = total + self._removed_tokens
+        prompt = messages
+
+        if total > self.budget_tokens:
+            head, older, current = messages[:1], messages[1:current_start], list(messages[current_start:])
+
+            # 1. Drop the oldest episodes, keeping user/assistant pairs intact.
+            dropped = 0
+            for start in self._starts[1:]:
+                if total <= self.budget_tokens:
+                    break
+                cut = start - 1 - dropped
+                total -= self.counter.count_messages(older[dropped:dropped + cut])
+                dropped += cut
+            older = older[dropped:]
+            note = []
+            if dropped:
+                note = [{"role": "system", "content": f"({dropped} earlier messages omitted to save space.)"}]
+                total += self.counter.count_messages(note)
+
+            # 2. Clip the current episode's tool outputs, oldest first.
+            for i, message in enumerate(current):
+                if total <= self.budget_tokens:
+                    break
+                if message["role"] != "tool" or len(message["content"]) <= _MIN_TOOL_CHARS:
+                    continue
+                clipped = {**message, "content": _clip(message["content"], _MIN_TOOL_CHARS)}
+                total += self.counter.count_message(clipped) - self.counter.count_message(message)
+                current[i] = clipped
+
+            prompt = [*head, *note, *older, *current]
+
+        saved = uncompacted - total
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["prompt_tokens"] += total
+            self._stats["tokens_saved"] += saved
+            self._stats["last_tokens_saved"] = saved
+        return prompt
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def stats(self) -> dict:
+        """Prompt tokens sent and saved, in total and per request."""
+        with self._lock:
+            stats = dict(self._stats)
+        requests = stats["requests"]
+        stats["mean_prompt_tokens"] = stats["prompt_tokens"] / requests if requests else 0.0
+        stats["mean_tokens_saved"] = stats["tokens_saved"] / requests if requests else 0.0
+        return stats
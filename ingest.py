@@ -0,0 +1,90 @@
+"""Incremental ingestion of new rows (e.g. production tickets) from local files.
+
+:func:`ingest` reads JSONL or Parquet files with at least the ``instruction``,
+``response``, ``intent`` and ``category`` columns and publishes a new
+dataset version with their rows appended (see :meth:`data_loader.Dataset.append`):
+
+* label codes, counts and row positions are extended by the batch, and new
+  intents or categories get codes after the existing ones;
+* the text and similarity indexes get a segment for the new rows, built
+  before the version is published so the first search on it is not slower;
+* the tool schema and the compact vocabulary pick up new labels on their next
+  use (see :class:`tool_registry.ToolRegistry`);
+* sessions move to the new version at their next question and rebase their
+  subset handles (:meth:`agent.AgentSession.refresh_dataset`); a question
+  that is running keeps reading the version it started with.
+
+Ingested rows live in memory only: after a restart the snapshot is loaded
+again and the files have to be ingested again.
+"""
+
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+
+import pyarrow as pa
+
+from lazy import lazy_import
+
+dl = lazy_import("data_loader")
+semantic_index = lazy_import("semantic_index")
+text_index = lazy_import("text_index")
+
+__all__ = ["read_batch", "append", "ingest"]
+
+_JSON_SUFFIXES = {".jsonl", ".ndjson", ".json"}
+_PARQUET_SUFFIXES = {".parquet", ".pq"}
+
+# Serialises writers; readers never wait for it.
+_lock = threading.Lock()
+
+
+def read_batch(path: str | Path) -> pa.Table:
+    """Read one JSONL (one object per line) or Parquet file into an Arrow table.
+
+    Raises
+    ------
+    ValueError
+        If the file extension is neither JSONL nor Parquet.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix in _JSON_SUFFIXES:
+        from pyarrow import json
+
+        return json.read_json(path)
+    if suffix in _PARQUET_SUFFIXES:
+        import pyarrow.parquet as pq
+
+        return pq.read_table(path)
+    raise ValueError(f"cannot ingest {path.name}: expected a .jsonl or .parquet file")
+
+
+def append(batch: pa.Table) -> dl.Dataset:
+    """Append the rows of *batch* to the latest version and publish the result.
+
+    Returns the published version (the current one if *batch* is empty).
+
+    Raises
+    ------
+    ValueError
+        If *batch* lacks a label or text column or has rows without labels.
+    """
+    with _lock:
+        current = dl.get_dataset()
+        if batch.num_rows == 0:
+            return current
+        version = current.append(batch)
+        text_index.get_index(version)
+        semantic_index.get_index(version)
+        dl.publish(version, expected=current)
+        return version
+
+
+def ingest(*paths: str | Path) -> dl.Dataset:
+    """Append the rows of every file in *paths* as one batch; return the new version."""
+    tables = [read_batch(path) for path in paths]
+    if not tables:
+        return dl.get_dataset()
+    return append(pa.concat_tables(tables, promote_options="permissive"))
@@ -0,0 +1,79 @@
+"""Deferred initialisation helpers.
+
+Importing the agent modules must stay cheap: the dataset, the tool schema and
+the OpenAI client are only built when something actually needs them, and are
+then kept for the lifetime of the process.
+
+* :class:`Lazy` wraps a zero-argument factory and builds its value once,
+  thread-safely, on the first :meth:`Lazy.get`.
+* :func:`lazy_import` returns a stand-in for a module that performs the real
+  import on first attribute access.
+"""
+
+from __future__ import annotations
+
+import importlib
+import threading
+from types import ModuleType
+from typing import Callable, Generic, TypeVar
+
+__all__ = ["Lazy", "lazy", "lazy_import"]
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """Build a value on first use and keep it.
+
+    Uses double-checked locking, so concurrent first callers (e.g. several
+    Streamlit sessions) still run the factory exactly once.
+    """
+
+    __slots__ = ("_factory", "_value", "_built", "_lock")
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._value: T | None = None
+        self._built = False
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self._value = self._factory()
+                    self._built = True
+        return self._value  # type: ignore[return-value]
+
+    @property
+    def built(self) -> bool:
+        """Whether the value has been created already."""
+        return self._built
+
+    def reset(self) -> None:
+        """Drop the cached value so the next :meth:`get` rebuilds it."""
+        with self._lock:
+            self._value = None
+            self._built = False
+
+
+def lazy(factory: Callable[[], T]) -> Lazy[T]:
+    """Decorator form of :class:`Lazy`."""
+    return Lazy(factory)
+
+
+class _LazyModule:
+    """Attribute proxy that imports the wrapped module on first access."""
+
+    __slots__ = ("_module",)
+
+    def __init__(self, name: str):
+        self._module: Lazy[ModuleType] = Lazy(lambda: importlib.import_module(name))
+
+    def __getattr__(self, attr: str):
+        return getattr(self._module.get(), attr)
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Return a proxy for module *name* that is imported on first use."""
+    return _LazyModule(name)  # type: ignore[return-value]
@@ -0,0 +1,286 @@
+"""Content-addressed cache for chat completions.
+
+Requests are keyed by a SHA-256 over a canonical JSON encoding of everything
+that determines the answer (model, messages, tools, tool_choice and any other
+request parameter except ``stream``).  Lookups go through two tiers:
+
+* a bounded in-memory LRU, and
+* an on-disk store (one JSON file per key) with a TTL and a total-size cap;
+  the least recently used files are evicted first.
+
+The cache mode controls how the API and the cache interact:
+
+``off``        never read or write.
+``readwrite``  serve hits, store misses (default).
+``record``     always call the API and store the result (refreshes fixtures).
+``replay``     serve hits only; a miss raises :class:`CacheMiss` instead of
+               calling the API, so test suites run fully offline.
+
+The process-wide cache returned by :func:`get_completion_cache` is configured
+through ``LLM_CACHE_MODE``, ``LLM_CACHE_DIR``, ``LLM_CACHE_TTL`` (seconds),
+``LLM_CACHE_MAX_BYTES`` and ``LLM_CACHE_MEMORY_ENTRIES``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from lazy import lazy
+
+__all__ = ["CACHE_MODES", "CacheMiss", "CompletionCache", "get_completion_cache"]
+
+CACHE_MODES = ("off", "readwrite", "record", "replay")
+
+
+class CacheMiss(LookupError):
+    """Raised in ``replay`` mode when a request has no recorded completion."""
+
+
+def _jsonable(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    return value
+
+
+class CompletionCache:
+    """Two-tier (memory LRU + disk) cache of chat completion responses.
+
+    Parameters
+    ----------
+    directory : Path, optional
+        Location of the disk tier; ``None`` keeps the cache in memory only.
+    mode : str
+        One of :data:`CACHE_MODES`.
+    max_memory_entries : int
+        Capacity of the in-memory LRU.
+    ttl : float
+        Seconds after which a disk entry is considered stale.
+    max_disk_bytes : int
+        Total size the disk tier is trimmed back to after writes.
+    """
+
+    def __init__(
+        self,
+        directory: Path | None = None,
+        mode: str = "readwrite",
+        max_memory_entries: int = 256,
+        ttl: float = 24 * 3600,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"cache mode must be one of {CACHE_MODES}, got {mode!r}")
+        self.directory = Path(directory) if directory is not None else None
+        self.mode = mode
+        self.max_memory_entries = max_memory_entries
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes: int | None = None  # computed on first write
+        self._tools_digest: tuple[object, str] | None = None
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    # ------------------------------------------------------------------
+    # Keys
+    # ------------------------------------------------------------------
+
+    def _digest_tools(self, tools) -> str:
+        # The tool list is the same cached object on every request, so its
+        # digest is memoised by identity instead of re-serialising it.
+        memo = self._tools_digest
+        if memo is not None and memo[0] is tools:
+            return memo[1]
+        digest = hashlib.sha256(
+            json.dumps(tools, sort_keys=True, separators=(",", ":")).encode()
+        ).hexdigest()
+        self._tools_digest = (tools, digest)
+        return digest
+
+    def key(self, request: dict) -> str:
+        """Return the cache key for the completion *request* kwargs."""
+        canonical = {k: v for k, v in request.items() if k not in ("stream", "tools")}
+        canonical["messages"] = [_jsonable(m) for m in request.get("messages", [])]
+        if request.get("tools") is not None:
+            canonical["tools"] = self._digest_tools(request["tools"])
+        payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    # ------------------------------------------------------------------
+    # Lookup / store
+    # ------------------------------------------------------------------
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _remember(self, key: str, data: dict) -> None:
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key: str) -> dict | None:
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["created"] > self.ttl:
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path)  # mark as recently used for size-based eviction
+        return entry["response"]
+
+    def get(self, key: str):
+        """Return the cached completion for *key*, or ``None`` on a miss.
+
+        Raises
+        ------
+        CacheMiss
+            On a miss in ``replay`` mode.
+        """
+        if self.mode in ("off", "record"):
+            return None
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+        if data is None:
+            data = self._read_disk(key)
+            with self._lock:
+                if data is not None:
+                    self._remember(key, data)
+                    self._stats["disk_hits"] += 1
+                else:
+                    self._stats["misses"] += 1
+        if data is None:
+            if self.mode == "replay":
+                raise CacheMiss(f"No recorded completion for request {key[:12]}")
+            return None
+
+        from openai.types.chat import ChatCompletion
+
+        return ChatCompletion.model_validate(data)
+
+    def put(self, key: str, completion) -> None:
+        """Store *completion* (an SDK object or its dict form) under *key*."""
+        if self.mode not in ("readwrite", "record"):
+            return
+        if not (isinstance(completion, dict) or hasattr(completion, "model_dump")):
+            return  # e.g. scripted stand-ins: nothing that can be rebuilt later
+        data = _jsonable(completion)
+        with self._lock:
+            self._remember(key, data)
+            self._stats["writes"] += 1
+        if self.directory is not None:
+            self._write_disk(key, data)
+
+    def _write_disk(self, key: str, data: dict) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        blob = json.dumps({"created": time.time(), "response": data})
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_text(blob)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(p.stat().st_size for p in self.directory.glob("*/*.json"))
+            else:
+                self._disk_bytes += len(blob)
+            over = self._disk_bytes > self.max_disk_bytes
+        if over:
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        """Delete expired files, then the least recently used, down to 90% of the cap."""
+        now = time.time()
+        files = []
+        for path in self.directory.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_disk_bytes * 0.9)
+        evicted = 0
+        for mtime, size, path in files:
+            if total <= target and now - mtime <= self.ttl:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._stats["evictions"] += evicted
+
+    @staticmethod
+    def text_completion(model: str, text: str) -> dict:
+        """Build a completion dict for a streamed, text-only answer."""
+        return {
+            "id": "cached",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": text},
+                }
+            ],
+        }
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+
+    def stats(self) -> dict:
+        """Return hit/miss counters plus the derived hit rate."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        """Drop the memory tier and every file of the disk tier."""
+        with self._lock:
+            self._memory.clear()
+            self._disk_bytes = 0
+        if self.directory is not None:
+            for path in self.directory.glob("*/*.json"):
+                path.unlink(missing_ok=True)
+
+
+@lazy
+def _completion_cache() -> CompletionCache:
+    default_dir = Path(__file__).resolve().parent / ".llm_cache"
+    return CompletionCache(
+        directory=Path(os.environ.get("LLM_CACHE_DIR", default_dir)),
+        mode=os.environ.get("LLM_CACHE_MODE", "readwrite"),
+        max_memory_entries=int(os.environ.get("LLM_CACHE_MEMORY_ENTRIES", 256)),
+        ttl=float(os.environ.get("LLM_CACHE_TTL", 24 * 3600)),
+        max_disk_bytes=int(os.environ.get("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+    )
+
+
+def get_completion_cache() -> CompletionCache:
+    """Return the process-wide completion cache (configured from the environment)."""
+    return _completion_cache.get()
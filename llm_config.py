@@ -1,16 +1,99 @@
+"""Centralised OpenAI clients.
+
+The synchronous client is created on the first call to `get_client()` (or
+the first access to the legacy `client` attribute) and reused afterwards, so
+importing this module does not import `openai` or read the environment.
+`get_async_client()` returns one `AsyncOpenAI` client per event loop, because
+its connection pool is bound to the loop it was first used on.
+
+The endpoint defaults to `BASE_URL` and can be pointed elsewhere (a proxy, a
+local OpenAI-compatible server) with ``OPENAI_BASE_URL``.
+
+Both clients use the connection pool and timeouts of
+``transport.TransportSettings.from_env()``; the async one is wrapped in a
+`transport.ResilientClient` (deadlines, retries with backoff, a circuit
+breaker and hedged requests), so the SDK's own retries are turned off.
+
+Verbose HTTP logging is available through the SDK's own switch,
+``OPENAI_LOG=debug``, instead of being enabled unconditionally.
+"""
+
+import asyncio
 import os
-from dotenv import load_dotenv
-from openai import OpenAI
-import openai
+import weakref
+
+import transport
+from lazy import lazy
+
+BASE_URL = "https://api.openai.com/v1/"
+
+
+@lazy
+def _load_env() -> None:
+    from dotenv import load_dotenv
+
+    # Load environment variables from a .env file, if present
+    load_dotenv()
+
+
+def base_url() -> str:
+    """Return the API endpoint: ``OPENAI_BASE_URL`` if set, else `BASE_URL`."""
+    _load_env.get()
+    return os.environ.get("OPENAI_BASE_URL") or BASE_URL
+
+
+@lazy
+def _settings() -> transport.TransportSettings:
+    _load_env.get()
+    return transport.TransportSettings.from_env()
+
+
+@lazy
+def _client():
+    from openai import OpenAI
+
+    settings = _settings.get()
+    # Instantiate a reusable OpenAI client
+    return OpenAI(
+        base_url=base_url(),
+        api_key=os.environ.get("OPENAI_API_KEY"),
+        max_retries=settings.max_retries,
+        http_client=transport.http_client(settings),
+    )
+
+
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, object]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_client():
+    """Return the process-wide OpenAI client, creating it on first use."""
+    return _client.get()
+
+
+def get_async_client():
+    """Return the resilient `AsyncOpenAI` client for the running event loop."""
+    from openai import AsyncOpenAI
 
-# Enable verbose HTTP logging (optional)
-openai.debug = True
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        settings = _settings.get()
+        client = transport.ResilientClient(
+            AsyncOpenAI(
+                base_url=base_url(),
+                api_key=os.environ.get("OPENAI_API_KEY"),
+                max_retries=0,
+                http_client=transport.async_http_client(settings),
+            ),
+            settings,
+        )
+        _async_clients[loop] = client
+    return client
 
-# Load environment variables from a .env file, if present
-load_dotenv()
 
-# Instantiate a reusable OpenAI client
-client = OpenAI(
-    base_url="https://api.openai.com/v1/",
-    api_key=os.environ.get("OPENAI_API_KEY"),
-) 
\ No newline at end of file
+def __getattr__(name: str):
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,276 @@
+"""Structured plans: tool calls with dependencies, validated before they run.
+
+Planning mode used to ask for a plain-text plan and then let the model
+execute it one ReAct turn at a time, so a plan of *N* steps cost about
+``N + 2`` LLM round trips.  Now the model submits the whole plan through the
+``submit_plan`` function (see :func:`plan_tool`): a list of steps, each
+naming a tool, its JSON arguments and the ids of the steps it depends on.
+:func:`parse_plan` checks the plan against the tool registry (tool names,
+argument types and enums, dependency ids, cycles) and :func:`dependencies`
+turns it into a DAG that the session executes locally
+(``AgentSession._execute_plan``); the LLM is called again only to write the
+answer, or to repair steps that failed.
+
+A string argument ``"@<id>"`` refers to an earlier step: it is replaced by
+the subset handle that step produced (``"s3"``) or, for steps that do not
+produce one, by the step's result text.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Callable
+
+from tool_registry import ToolArgumentError, registry
+
+__all__ = ["PLAN_TOOL_NAME", "PlanError", "PlanStep", "StepResult", "plan_tool", "parse_plan",
+           "dependencies", "references", "resolve", "render"]
+
+PLAN_TOOL_NAME = "submit_plan"
+
+# Tools that never appear as plan steps
+_EXCLUDED = {"finish"}
+
+_REFERENCE = re.compile(r"^@([A-Za-z0-9_-]+)$")
+_HANDLE = re.compile(r"\bas handle (s\d+)\b")
+
+
+class PlanError(ValueError):
+    """Raised for a plan that cannot be executed as a whole (bad JSON, ids or cycles)."""
+
+
+@dataclass
+class PlanStep:
+    """One tool call of a plan."""
+
+    id: str
+    tool: str
+    arguments: dict
+    depends_on: list[str] = field(default_factory=list)
+    # Why the step cannot run as submitted; set by :func:`parse_plan`
+    error: str | None = None
+
+
+@dataclass
+class StepResult:
+    """Outcome of an executed (or skipped) step."""
+
+    status: str  # "ok", "error" or "skipped"
+    content: str
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+    @property
+    def value(self) -> str:
+        """What ``"@<id>"`` references resolve to: the handle, else the content."""
+        match = _HANDLE.search(self.content)
+        return match.group(1) if match else self.content
+
+
+def plan_tool(tool_names: list[str]) -> dict:
+    """Return the ``submit_plan`` function schema for the given tool names."""
+    return {
+        "type": "function",
+        "function": {
+            "name": PLAN_TOOL_NAME,
+            "description": (
+                "Submit the complete plan: every tool call needed to answer the question, with "
+                "its arguments and the steps it needs first. Steps without dependencies on each "
+                "other run in parallel. Do not include finish."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "steps": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "id": {"type": "string", "description": "Short unique step id, e.g. 'a'."},
+                                "tool": {"type": "string", "enum": [n for n in tool_names if n not in _EXCLUDED]},
+                                "arguments": {
+                                    "type": "string",
+                                    "description": (
+                                        "JSON object of the tool's arguments, as in its schema. A string "
+                                        "value '@<id>' is replaced by the subset handle (or the result) "
+                                        "of step <id>."
+                                    ),
+                                },
+                                "depends_on": {
+                                    "type": "array",
+                                    "items": {"type": "string"},
+                                    "description": "Ids of the steps whose results this step needs.",
+                                },
+                            },
+                            "required": ["id", "tool", "arguments", "depends_on"],
+                            "additionalProperties": False,
+                        },
+                    },
+                },
+                "required": ["steps"],
+                "additionalProperties": False,
+            },
+            "strict": True,
+        },
+    }
+
+
+def references(value) -> set[str]:
+    """Return the step ids referenced (``"@<id>"``) anywhere in *value*."""
+    if isinstance(value, str):
+        match = _REFERENCE.match(value)
+        return {match.group(1)} if match else set()
+    if isinstance(value, list):
+        return set().union(*(references(v) for v in value))
+    if isinstance(value, dict):
+        return set().union(*(references(v) for v in value.values()))
+    return set()
+
+
+def resolve(value, results: dict[str, StepResult]):
+    """Replace the ``"@<id>"`` references in *value* by the referenced results."""
+    if isinstance(value, str):
+        match = _REFERENCE.match(value)
+        return results[match.group(1)].value if match and match.group(1) in results else value
+    if isinstance(value, list):
+        return [resolve(v, results) for v in value]
+    if isinstance(value, dict):
+        return {k: resolve(v, results) for k, v in value.items()}
+    return value
+
+
+def _validate(step: PlanStep) -> str | None:
+    registered = registry.get(step.tool)
+    if registered is None:
+        return f"unknown tool {step.tool!r}"
+    # References are strings until they resolve, which is what every
+    # handle-taking parameter expects.
+    try:
+        registered.bind(step.arguments)
+    except (ToolArgumentError, LookupError, TypeError, ValueError) as e:
+        return f"invalid arguments for {step.tool}: {e}"
+    return None
+
+
+def parse_plan(arguments: str, done: frozenset[str] = frozenset()) -> list[PlanStep]:
+    """Decode and validate the arguments of a ``submit_plan`` call.
+
+    Parameters
+    ----------
+    arguments : str
+        The raw JSON arguments of the call.
+    done : frozenset[str]
+        Ids of steps that already succeeded in an earlier round; the new
+        steps may depend on them but not reuse their ids.
+
+    Returns
+    -------
+    list[PlanStep]
+        The steps in plan order (``finish`` steps dropped).  A step whose
+        tool or arguments do not match the registry has :attr:`PlanStep.error`
+        set; the rest of the plan can still run.
+
+    Raises
+    ------
+    PlanError
+        If the plan is not valid JSON, has duplicate or unknown step ids, or
+        its dependencies form a cycle.
+    """
+    try:
+        raw_steps = json.loads(arguments)["steps"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise PlanError(f"plan is not a JSON object with a 'steps' list: {e}") from None
+    if not isinstance(raw_steps, list):
+        raise PlanError("'steps' must be a list")
+
+    steps: list[PlanStep] = []
+    for number, raw in enumerate(raw_steps, 1):
+        if not isinstance(raw, dict) or not isinstance(raw.get("tool"), str):
+            raise PlanError(f"step {number} must be an object with a 'tool'")
+        if raw["tool"] in _EXCLUDED:
+            continue
+        step_id = str(raw.get("id") or number)
+        depends_on = raw.get("depends_on") or []
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        step = PlanStep(step_id, raw["tool"], {}, [str(d) for d in depends_on])
+        arguments_json = raw.get("arguments") or "{}"
+        try:
+            step.arguments = json.loads(arguments_json) if isinstance(arguments_json, str) else arguments_json
+            if not isinstance(step.arguments, dict):
+                raise ValueError("arguments must be a JSON object")
+        except ValueError as e:
+            step.arguments, step.error = {}, f"invalid arguments JSON: {e}"
+        step.error = step.error or _validate(step)
+        steps.append(step)
+
+    ids = [s.id for s in steps]
+    duplicates = sorted({i for i in ids if ids.count(i) > 1} | (set(ids) & set(done)))
+    if duplicates:
+        raise PlanError(f"duplicate step id(s) {duplicates}")
+    known = set(ids) | set(done)
+    for step in steps:
+        unknown = sorted((set(step.depends_on) | references(step.arguments)) - known)
+        if unknown:
+            raise PlanError(f"step {step.id!r} depends on unknown step(s) {unknown}")
+    return steps
+
+
+def dependencies(steps: list[PlanStep], stateful: Callable[[str], bool]) -> dict[str, set[str]]:
+    """Return the step ids each step must wait for, checking for cycles.
+
+    A step waits for its declared dependencies and the steps it references.
+    Tools that replace the session's active subset keep their plan order, as
+    in a ReAct turn: a stateful step waits for every earlier step, and every
+    later step waits for it.  Ids of steps outside *steps* (finished in an
+    earlier round) are left out.
+
+    Raises
+    ------
+    PlanError
+        If the dependencies form a cycle.
+    """
+    ids = {s.id for s in steps}
+    graph: dict[str, set[str]] = {}
+    earlier: list[str] = []
+    barrier: str | None = None
+    for step in steps:
+        needs = (set(step.depends_on) | references(step.arguments)) & ids
+        if stateful(step.tool):
+            needs.update(earlier)
+            barrier = step.id
+        elif barrier is not None:
+            needs.add(barrier)
+        graph[step.id] = needs
+        earlier.append(step.id)
+
+    # Kahn's algorithm: whatever is never freed sits on a cycle.
+    waiting = {i: len(needs) for i, needs in graph.items()}
+    dependants: dict[str, list[str]] = {i: [] for i in graph}
+    for i, needs in graph.items():
+        for need in needs:
+            dependants[need].append(i)
+    ready = [i for i, n in waiting.items() if n == 0]
+    while ready:
+        for dependant in dependants[ready.pop()]:
+            waiting[dependant] -= 1
+            if waiting[dependant] == 0:
+                ready.append(dependant)
+    cyclic = sorted(i for i, n in waiting.items() if n > 0)
+    if cyclic:
+        raise PlanError(f"steps {cyclic} depend on each other in a cycle")
+    return graph
+
+
+def render(steps: list[PlanStep]) -> str:
+    """Return *steps* as a numbered, human-readable plan."""
+    lines = []
+    for number, step in enumerate(steps, 1):
+        arguments = json.dumps(step.arguments, ensure_ascii=False)
+        after = f"  (after {', '.join(step.depends_on)})" if step.depends_on else ""
+        lines.append(f"{number}. [{step.id}] {step.tool}({arguments}){after}")
+    return "\n".join(lines) + "\n" if lines else "(no tool calls needed)\n"
@@ -0,0 +1,138 @@
+"""Token-bucket rate limiting for the async OpenAI client.
+
+:class:`TokenBucket` meters an amount per minute (requests or tokens).
+:class:`RateLimitedClient` wraps an async client so that every
+``chat.completions.create`` call first takes one unit from a requests bucket
+and its estimated token count from a tokens bucket; once the response
+reports its real ``usage``, the difference is charged or refunded.  Several
+clients (e.g. one per agent session) can share the same buckets.
+
+When the wrapped client is a :class:`transport.ResilientClient`, one call
+may send several requests (retries, hedged duplicates).  Each of those is
+charged as well, one request and the same estimate, through the ``meter``
+transport option; the estimate of a request that failed or lost the race
+is not refunded.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import transport
+from history import TokenCounter
+
+__all__ = ["TokenBucket", "RateLimitedClient"]
+
+# Completion tokens assumed per request until the real usage is known
+_COMPLETION_ESTIMATE = 256
+
+
+class TokenBucket:
+    """Refills at ``per_minute / 60`` units per second up to *capacity*.
+
+    Parameters
+    ----------
+    per_minute : float
+        Sustained rate.
+    capacity : float, optional
+        Burst size; defaults to one minute's worth.
+    """
+
+    def __init__(self, per_minute: float, capacity: float | None = None):
+        if per_minute <= 0:
+            raise ValueError("per_minute must be positive")
+        self.rate = per_minute / 60
+        self.capacity = capacity if capacity is not None else per_minute
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited = 0.0  # total seconds callers spent waiting
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1) -> float:
+        """Wait until *amount* units are available, take them and return the wait."""
+        amount = min(amount, self.capacity)  # an oversized request still runs, alone
+        start = time.monotonic()
+        async with self._lock:  # first come, first served
+            self._refill()
+            while self._level < amount:
+                await asyncio.sleep((amount - self._level) / self.rate)
+                self._refill()
+            self._level -= amount
+        waited = time.monotonic() - start
+        self.waited += waited
+        return waited
+
+    def adjust(self, amount: float) -> None:
+        """Take (or, if negative, return) *amount* units without waiting."""
+        self._refill()
+        self._level = min(self.capacity, self._level - amount)
+
+
+class RateLimitedClient:
+    """Async OpenAI client wrapper metering requests and tokens per minute.
+
+    Parameters
+    ----------
+    client
+        The wrapped ``AsyncOpenAI``-compatible client.
+    requests : TokenBucket, optional
+        Bucket charged one unit per request.
+    tokens : TokenBucket, optional
+        Bucket charged the request's estimated total tokens.
+    model : str
+        Model whose tokenizer is used for the estimate.
+    """
+
+    def __init__(self, client, requests: TokenBucket | None = None, tokens: TokenBucket | None = None,
+                 model: str = "gpt-4o-mini"):
+        self._client = client
+        self.requests = requests
+        self.tokens = tokens
+        self._counter = TokenCounter(model)
+        self._tools_tokens: tuple[object, int] | None = None
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.calls = 0
+        self.extra_attempts = 0  # retries and hedged duplicates charged
+        self.waited = 0.0
+
+    def _estimate(self, kwargs: dict) -> int:
+        estimate = self._counter.count_messages(kwargs.get("messages", [])) + _COMPLETION_ESTIMATE
+        tools = kwargs.get("tools")
+        if tools is not None:
+            memo = self._tools_tokens
+            if memo is None or memo[0] is not tools:
+                memo = self._tools_tokens = (tools, self._counter.count_text(json.dumps(tools)))
+            estimate += memo[1]
+        return estimate
+
+    async def _charge(self, kwargs: dict) -> int:
+        """Take one request and the estimated tokens; return the estimate."""
+        estimate = 0
+        if self.requests is not None:
+            self.waited += await self.requests.acquire(1)
+        if self.tokens is not None:
+            estimate = self._estimate(kwargs)
+            self.waited += await self.tokens.acquire(estimate)
+        return estimate
+
+    async def _charge_extra(self, kwargs: dict) -> None:
+        self.extra_attempts += 1
+        await self._charge(kwargs)
+
+    async def _create(self, **kwargs):
+        estimate = await self._charge(kwargs)
+        self.calls += 1
+        with transport.call_options(meter=self._charge_extra):
+            response = await self._client.chat.completions.create(**kwargs)
+        usage = getattr(response, "usage", None)
+        if self.tokens is not None and usage is not None:
+            self.tokens.adjust(usage.total_tokens - estimate)
+        return response
@@ -0,0 +1,152 @@
+"""Reproducible, paging sampler for example rows.
+
+``show_examples`` used to draw ``n`` fresh random rows on every call, with
+no seed: two calls could return the same rows and a run could not be
+replayed.  A :class:`Sampler` belongs to one session and draws from a single
+seeded permutation of all dataset rows.  Drawing from a subset walks that
+permutation from the subset's cursor and keeps the members, so
+
+* the same seed always yields the same rows in the same order;
+* repeated calls on the same subset page through new rows; the call that
+  reaches the end returns fewer rows, and the next one starts over;
+* no per-subset permutation is stored, just one cursor per subset (and per
+  stratum for stratified draws).
+
+Rows are decoded from the Arrow table in small batches by :func:`iter_records`,
+projected to the requested columns and truncated per field, so a caller can
+forward each batch as soon as it is ready.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Iterator
+
+import numpy as np
+
+from lazy import lazy_import
+
+dl = lazy_import("data_loader")
+
+__all__ = ["Sampler", "iter_records"]
+
+# Smallest slice of the permutation scanned per step
+_SCAN = 4096
+
+
+class Sampler:
+    """Seeded draws without repetition from any subset of the dataset.
+
+    Parameters
+    ----------
+    seed : int
+        Seed of the permutation; fixed for the lifetime of the sampler.
+    """
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._dataset = None
+        self._permutation: np.ndarray | None = None
+        self._cursors: dict[tuple, int] = {}
+
+    def _order(self, dataset) -> np.ndarray:
+        # A new dataset (version) gets a new permutation and fresh cursors.
+        if self._dataset is not dataset:
+            rng = np.random.default_rng(self.seed)
+            self._permutation = rng.permutation(len(dataset.full)).astype(np.int32)
+            self._dataset = dataset
+            self._cursors.clear()
+        return self._permutation
+
+    def _take(self, order: np.ndarray, key: tuple, member: np.ndarray, n: int) -> tuple[np.ndarray, int]:
+        """Draw up to *n* members after *key*'s cursor; return them and the unseen count.
+
+        A page never wraps around: once it reaches the end of the
+        permutation it returns what it has, and the next call restarts.
+        """
+        position = self._cursors.get(key, 0)
+        if not member[order[position:]].any():
+            position = 0  # every member was shown: start over
+        n = min(n, int(member.sum()))
+        taken: list[np.ndarray] = []
+        while n > 0 and position < len(order):
+            chunk = order[position:position + max(4 * n, _SCAN)]
+            hits = np.flatnonzero(member[chunk])[:n]
+            if len(hits) == n:
+                position += int(hits[-1]) + 1
+            else:
+                position += len(chunk)
+            taken.append(chunk[hits])
+            n -= len(hits)
+        self._cursors[key] = position
+        unseen = int(member[order[position:]].sum())
+        rows = np.concatenate(taken) if taken else np.empty(0, dtype=np.int32)
+        return rows.astype(np.int64), unseen
+
+    def draw(self, subset, n: int, key: str, stratify: str | None = None) -> tuple[np.ndarray, int]:
+        """Draw *n* rows of *subset* that this sampler has not returned yet.
+
+        Parameters
+        ----------
+        subset : data_loader.Subset
+            Rows to draw from.
+        n : int
+            Number of rows; capped at the subset size.
+        key : str
+            Names the subset (e.g. its handle); each key pages independently.
+        stratify : str, optional
+            Label column.  The rows are then spread evenly over the column's
+            labels present in the subset (the largest labels get the
+            remainder), each label paging through its own rows.
+
+        Returns
+        -------
+        tuple
+            ``(rows, unseen)``: the row positions in draw order (grouped by
+            label when stratified) and how many rows of the subset the next
+            calls can still return before starting over.
+        """
+        dataset = subset.dataset
+        member = np.zeros(len(dataset.full), dtype=bool)
+        member[subset.positions()] = True
+        with self._lock:
+            order = self._order(dataset)
+            if stratify is None:
+                return self._take(order, (key,), member, n)
+
+            index = dataset.label_indexes[stratify]
+            counts = subset.counts(stratify)
+            present = np.argsort(-counts, kind="stable")[: int((counts > 0).sum())]
+            quotas = np.full(len(present), n // max(len(present), 1))
+            quotas[: n % max(len(present), 1)] += 1
+            parts, unseen = [], 0
+            for code, quota in zip(present, quotas):
+                stratum = member & (index.codes == code)
+                rows, left = self._take(order, (key, stratify, int(code)), stratum, int(quota))
+                parts.append(rows)
+                unseen += left
+            rows = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+            return rows, unseen
+
+
+def iter_records(
+    dataset,
+    rows: np.ndarray,
+    columns: list[str] | None = None,
+    max_chars: int | None = None,
+    batch_size: int = 8,
+) -> Iterator[list[dict]]:
+    """Yield the records of *rows* in batches, projected and truncated.
+
+    Only *columns* (default: all) are decoded, *batch_size* rows at a time;
+    string values longer than *max_chars* are cut and end with ``…``.
+    """
+    for start in range(0, len(rows), batch_size):
+        batch = dataset.records(rows[start:start + batch_size], columns)
+        if max_chars is not None:
+            for record in batch:
+                for name, value in record.items():
+                    if isinstance(value, str) and len(value) > max_chars:
+                        record[name] = value[:max_chars] + "…"
+        yield batch
@@ -0,0 +1,359 @@
+"""Offline similarity index over the instruction texts.
+
+``select_semantic_intent`` filters by exact label names, so free-text
+phrasing ("my parcel never showed up") never reaches the matching examples.
+:class:`SemanticIndex` embeds every instruction without network or GPU:
+
+* features are the words, word bigrams and character trigrams of the
+  lower-cased text;
+* each feature is hashed (CRC-32, stable across processes) into one of
+  :data:`DIMENSIONS` buckets, with a hashed sign to cancel collisions;
+* bucket counts are weighted TF-IDF style (``log(1 + tf)`` times the
+  bucket's inverse document frequency) and every row is L2-normalised.
+
+The rows form one ``float32`` matrix, saved next to the dataset snapshot and
+memory-mapped by later processes.  A query batch is embedded the same way and
+scored with a single matrix product (cosine similarity, since all vectors
+are normalised); the top *k* rows per query come from ``argpartition``.
+
+Rows appended to the dataset are embedded on their own with the existing
+IDF weights and kept as extra blocks (:meth:`SemanticIndex.extend`);
+:data:`MAX_BLOCKS` trailing blocks of similar size are concatenated into
+one, so a row is copied a logarithmic number of times.  The IDF is not
+recomputed, which is fine while the appended rows are a small share.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import shutil
+import threading
+import weakref
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+
+import snapshot
+from lazy import lazy_import
+
+dl = lazy_import("data_loader")
+
+__all__ = ["INDEX_VERSION", "DIMENSIONS", "features", "SemanticIndex", "index_dir", "get_index",
+           "likely_intents"]
+
+# Bump whenever the features, the hashing or the file layout change.
+INDEX_VERSION = 1
+DIMENSIONS = 512
+
+_WORD = re.compile(r"[^\W_]+")
+# Rows embedded per block while building, and queries scored per matrix
+# product (both bound the temporary arrays)
+_BLOCK = 4096
+_QUERY_CHUNK = 256
+# Appended blocks of one size class concatenated into one of the next
+MAX_BLOCKS = 8
+
+
+def features(text: str) -> list[str]:
+    """Return the hashed features of *text*: words, word bigrams, char trigrams."""
+    words = _WORD.findall(text.lower())
+    grams = [f"w:{w}" for w in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"#{word}#"
+        grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return grams
+
+
+class _Hasher:
+    """Maps feature strings to (bucket, sign), hashing each distinct one once."""
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self._ids: dict[str, int] = {}
+        self._buckets: list[int] = []
+
+    def ids(self, grams: list[str]) -> list[int]:
+        ids = self._ids
+        out = []
+        for gram in grams:
+            i = ids.get(gram)
+            if i is None:
+                i = ids[gram] = len(ids)
+                self._buckets.append(zlib.crc32(gram.encode()))
+            out.append(i)
+        return out
+
+    def buckets(self) -> tuple[np.ndarray, np.ndarray]:
+        """``(bucket, sign)`` arrays indexed by feature id."""
+        hashes = np.array(self._buckets, dtype=np.uint32)
+        return (hashes % self.dimensions).astype(np.int64), np.where(hashes >> 31, -1.0, 1.0)
+
+
+def _embed(texts: list[str], hasher: _Hasher) -> tuple[np.ndarray, np.ndarray]:
+    """Return the hashed ``log(1 + tf)`` vectors of *texts* and the bucket document counts."""
+    dimensions = hasher.dimensions
+    ids = [hasher.ids(features(text)) for text in texts]
+    lengths = np.fromiter((len(i) for i in ids), dtype=np.int64, count=len(ids))
+    rows = np.repeat(np.arange(len(texts)), lengths)
+    feature_ids = np.fromiter((f for i in ids for f in i), dtype=np.int64, count=int(lengths.sum()))
+    bucket, sign = hasher.buckets()
+    flat = rows * dimensions + bucket[feature_ids]
+    signed = np.bincount(flat, weights=sign[feature_ids], minlength=len(texts) * dimensions)
+    signed = signed.reshape(len(texts), dimensions)
+    vectors = np.sign(signed) * np.log1p(np.abs(signed))
+    return vectors.astype(np.float32), np.bincount(np.unique(flat) % dimensions, minlength=dimensions)
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+class SemanticIndex:
+    """Unit-length hashed TF-IDF vectors of the instructions.
+
+    Parameters
+    ----------
+    matrix : numpy.ndarray
+        ``(rows, dimensions)`` ``float32`` embeddings, one row per dataset row
+        (of the persisted part).
+    idf : numpy.ndarray
+        Inverse document frequency per bucket, applied to queries as well.
+    blocks : list[numpy.ndarray], optional
+        Embeddings of the rows appended after *matrix*, in row order.
+    """
+
+    def __init__(self, matrix: np.ndarray, idf: np.ndarray, blocks=()):
+        self.matrix = matrix
+        self.idf = idf
+        self.dimensions = matrix.shape[1]
+        self.blocks: list[np.ndarray] = list(blocks)
+        self.num_rows = len(matrix) + sum(len(b) for b in self.blocks)
+
+    @classmethod
+    def build(cls, texts, dimensions: int = DIMENSIONS) -> SemanticIndex:
+        """Embed every text of *texts*.
+
+        *texts* is an Arrow array or any sliceable sequence of strings; it
+        is converted to Python strings one block at a time, so an Arrow
+        column is never materialised in full.
+        """
+        hasher = _Hasher(dimensions)
+        matrix = np.empty((len(texts), dimensions), dtype=np.float32)
+        df = np.zeros(dimensions, dtype=np.int64)
+        for start in range(0, len(texts), _BLOCK):
+            block = texts[start:start + _BLOCK]
+            block = block.to_pylist() if isinstance(block, (pa.Array, pa.ChunkedArray)) else list(block)
+            vectors, counts = _embed(block, hasher)
+            matrix[start:start + len(vectors)] = vectors
+            df += counts
+        idf = np.log((1 + len(texts)) / (1 + df)).astype(np.float32) + 1
+        matrix *= idf
+        return cls(_normalise(matrix), idf)
+
+    def extend(self, texts) -> SemanticIndex:
+        """Return the index of *texts*, whose first :attr:`num_rows` texts this index covers.
+
+        Only the new texts are embedded, weighted with this index's IDF, as
+        one more block; trailing blocks of similar size are then concatenated
+        (see :data:`MAX_BLOCKS`).
+        """
+        texts = texts[self.num_rows:]
+        hasher = _Hasher(self.dimensions)
+        parts = [np.empty((0, self.dimensions), dtype=np.float32)]
+        for start in range(0, len(texts), _BLOCK):
+            block = texts[start:start + _BLOCK]
+            block = block.to_pylist() if isinstance(block, (pa.Array, pa.ChunkedArray)) else list(block)
+            vectors, _ = _embed(block, hasher)
+            vectors *= self.idf
+            parts.append(_normalise(vectors))
+        blocks = [*self.blocks, np.concatenate(parts)]
+        while len(blocks) >= MAX_BLOCKS and (
+            len(blocks[-MAX_BLOCKS]) < MAX_BLOCKS * min(len(b) for b in blocks[1 - MAX_BLOCKS:])
+        ):
+            blocks[-MAX_BLOCKS:] = [np.concatenate(blocks[-MAX_BLOCKS:])]
+        return SemanticIndex(self.matrix, self.idf, blocks)
+
+    def _candidates(self, within: np.ndarray | None) -> list[np.ndarray]:
+        """The embeddings to score: every block, or the rows *within*."""
+        if within is None:
+            return [self.matrix, *self.blocks]
+        if not self.blocks:
+            return [self.matrix[within]]
+        within = np.asarray(within)
+        parts = [self.matrix, *self.blocks]
+        offsets = np.cumsum([0] + [len(p) for p in parts])
+        owner = np.searchsorted(offsets, within, side="right") - 1
+        selected = np.empty((len(within), self.dimensions), dtype=np.float32)
+        for i, part in enumerate(parts):
+            mine = owner == i
+            if mine.any():
+                selected[mine] = part[within[mine] - offsets[i]]
+        return [selected]
+
+    # -- persistence ----------------------------------------------------
+
+    def save(self, directory: Path, fingerprint: str) -> None:
+        """Write the matrix and a manifest to *directory*, replacing it atomically."""
+        tmp = directory.with_name(directory.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        np.save(tmp / "matrix.npy", self.matrix)
+        np.save(tmp / "idf.npy", self.idf)
+        manifest = {"version": INDEX_VERSION, "fingerprint": fingerprint,
+                    "rows": len(self.matrix), "dimensions": self.dimensions}
+        (tmp / "manifest.json").write_text(json.dumps(manifest, indent=2))
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp, directory)
+
+    @classmethod
+    def load(cls, directory: Path, fingerprint: str) -> SemanticIndex | None:
+        """Memory-map the index in *directory*; ``None`` if missing or stale."""
+        try:
+            manifest = json.loads((directory / "manifest.json").read_text())
+            if manifest.get("version") != INDEX_VERSION or manifest.get("fingerprint") != fingerprint:
+                return None
+            return cls(np.load(directory / "matrix.npy", mmap_mode="r"), np.load(directory / "idf.npy"))
+        except (OSError, ValueError):
+            return None
+
+    # -- queries --------------------------------------------------------
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Return the unit-length query vectors of *texts*."""
+        vectors, _ = _embed(texts, _Hasher(self.dimensions))
+        vectors *= self.idf
+        return _normalise(vectors)
+
+    def search(
+        self, texts: list[str], top_k: int = 10, within: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return the *top_k* most similar rows for every text of *texts*.
+
+        Parameters
+        ----------
+        texts : list[str]
+            Query batch; scored with one matrix product.
+        top_k : int
+            Rows per query.
+        within : numpy.ndarray, optional
+            Row positions to restrict the search to.
+
+        Returns
+        -------
+        tuple
+            ``(rows, similarities)``, both ``(len(texts), k)`` arrays with
+            the best match first (*k* is *top_k* capped at the candidates).
+        """
+        candidates = self._candidates(within)
+        total = sum(len(c) for c in candidates)
+        k = min(top_k, total)
+        rows = np.empty((len(texts), k), dtype=np.int64)
+        similarities = np.empty((len(texts), k), dtype=np.float32)
+        # One (queries, candidates) product per chunk; partitioning along the
+        # contiguous last axis is several times faster than along the first.
+        for start in range(0, len(texts), _QUERY_CHUNK):
+            queries = self.embed(texts[start:start + _QUERY_CHUNK])
+            products = [queries @ c.T for c in candidates]
+            scores = products[0] if len(products) == 1 else np.hstack(products)
+            if 0 < k < total:
+                best = np.argpartition(scores, total - k, axis=1)[:, -k:]
+            else:
+                best = np.broadcast_to(np.arange(total), scores.shape)[:, :k]
+            best_scores = np.take_along_axis(scores, best, axis=1)
+            order = np.argsort(-best_scores, axis=1, kind="stable")
+            rows[start:start + len(scores)] = np.take_along_axis(best, order, axis=1)
+            similarities[start:start + len(scores)] = np.take_along_axis(best_scores, order, axis=1)
+        if within is not None:
+            rows = np.asarray(within)[rows]
+        return rows, similarities
+
+    def likely_labels(
+        self, texts: list[str], labels: np.ndarray, names: list[str], neighbours: int = 25, top: int = 3
+    ) -> list[list[tuple[str, float]]]:
+        """Vote the labels of each text's nearest rows, weighted by similarity.
+
+        *labels* holds the integer label code of every row and *names* the
+        label of each code.  Returns, per text, up to *top* ``(label, share)``
+        pairs, where *share* is the label's part of the total vote.
+        """
+        rows, similarities = self.search(texts, neighbours)
+        results = []
+        for row, weight in zip(rows, np.maximum(similarities, 0)):
+            votes = np.bincount(labels[row], weights=weight, minlength=len(names))
+            total = votes.sum()
+            best = np.argsort(-votes, kind="stable")[:top]
+            results.append([(names[i], round(float(votes[i] / total), 3)) for i in best if votes[i] > 0])
+        return results
+
+
+# ---------------------------------------------------------------------------
+# Process-wide index
+# ---------------------------------------------------------------------------
+
+_lock = threading.Lock()
+# Index of every dataset version still in use
+_indexes: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def index_dir() -> Path:
+    """Directory of the persisted index, next to the dataset snapshot."""
+    return snapshot.snapshot_dir() / f"{dl.SNAPSHOT_NAME}.semantic-index.v{INDEX_VERSION}"
+
+
+def get_index(dataset=None) -> SemanticIndex:
+    """Return the similarity index of *dataset* (default: the process-wide dataset).
+
+    Memory-mapped from disk when a current copy exists there, otherwise
+    built and written next to the snapshot.  Datasets that do not come from a
+    snapshot are indexed in memory only; a version made by
+    :meth:`data_loader.Dataset.append` extends its parent's index.
+    """
+    dataset = dataset or dl.get_dataset()
+    # Built indexes are read without the lock, so queries never wait for
+    # the index of a version being ingested.
+    index = _indexes.get(dataset)
+    if index is not None:
+        return index
+    with _lock:
+        return _index_of(dataset)
+
+
+def _index_of(dataset) -> SemanticIndex:
+    index = _indexes.get(dataset)
+    if index is not None:
+        return index
+    parent = dataset.parent() if dataset.parent is not None else None
+    if parent is not None:
+        index = _index_of(parent).extend(dataset.table.column("instruction"))
+    else:
+        fingerprint = dataset.fingerprint
+        directory = index_dir()
+        index = SemanticIndex.load(directory, fingerprint) if fingerprint else None
+        if index is None:
+            index = SemanticIndex.build(dataset.table.column("instruction"))
+            if fingerprint:
+                try:
+                    index.save(directory, fingerprint)
+                    index = SemanticIndex.load(directory, fingerprint) or index
+                except OSError:
+                    pass
+    _indexes[dataset] = index
+    return index
+
+
+def likely_intents(question: str, top: int = 3, dataset=None) -> list[tuple[str, float]]:
+    """Map free text to the intents of its most similar instructions.
+
+    Router helper: returns up to *top* ``(intent, share)`` pairs, most
+    likely first.
+    """
+    dataset = dataset or dl.get_dataset()
+    intents = dataset.label_indexes["intent"]
+    return get_index(dataset).likely_labels([question], intents.codes, intents.labels, top=top)[0]
@@ -0,0 +1,194 @@
+"""Local columnar snapshot of the dataset.
+
+The first load writes the Arrow table to an uncompressed Arrow IPC file plus
+a small JSON manifest (format version, row count, column names, a SHA-256
+checksum of the IPC file and its size and modification time).  Later loads
+memory-map the IPC file, so opening the dataset is zero-copy and does not
+need the network or the ``datasets`` package at all.
+
+Hashing the whole file on every open would read all of it and defeat the
+mapping, so the checksum is only verified when the file's size or mtime
+differs from the manifest (a file of another size is rejected without
+reading it).  ``DATASET_SNAPSHOT_VERIFY=1`` verifies on every open,
+``DATASET_SNAPSHOT_VERIFY=0`` never does.
+
+The location defaults to ``.snapshot/`` next to this file and can be moved
+with the ``DATASET_SNAPSHOT_DIR`` environment variable.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable
+
+import pyarrow as pa
+
+__all__ = [
+    "SNAPSHOT_VERSION",
+    "SnapshotError",
+    "snapshot_dir",
+    "snapshot_paths",
+    "write_snapshot",
+    "open_snapshot",
+    "read_manifest",
+    "load_or_build",
+]
+
+# Bump whenever the on-disk layout (or the encoding applied by the builder)
+# changes; older snapshots are then rebuilt instead of being misread.
+SNAPSHOT_VERSION = 1
+
+_CHUNK = 1 << 20
+
+
+class SnapshotError(RuntimeError):
+    """Raised when a snapshot is missing, stale or fails validation."""
+
+
+def snapshot_dir() -> Path:
+    """Return the directory holding snapshot files."""
+    default = Path(__file__).resolve().parent / ".snapshot"
+    return Path(os.environ.get("DATASET_SNAPSHOT_DIR", default))
+
+
+def snapshot_paths(name: str, directory: Path | None = None) -> tuple[Path, Path]:
+    """Return ``(data_path, manifest_path)`` for the snapshot called *name*."""
+    directory = directory or snapshot_dir()
+    stem = f"{name}.v{SNAPSHOT_VERSION}"
+    return directory / f"{stem}.arrow", directory / f"{stem}.json"
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(_CHUNK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_snapshot(table: pa.Table, name: str, directory: Path | None = None, **meta) -> Path:
+    """Write *table* as an Arrow IPC file and its manifest; return the data path.
+
+    Both files are written to temporary names first and then moved into
+    place, so a crash never leaves a half-written snapshot behind.
+    """
+    data_path, manifest_path = snapshot_paths(name, directory)
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_data = data_path.with_suffix(".arrow.tmp")
+    with pa.OSFile(str(tmp_data), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            # A single record batch keeps every column contiguous on disk.
+            writer.write_table(table, max_chunksize=max(table.num_rows, 1))
+
+    stat = tmp_data.stat()  # os.replace keeps the mtime
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "num_rows": table.num_rows,
+        "columns": table.column_names,
+        "sha256": _sha256(tmp_data),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "created": time.time(),
+        **meta,
+    }
+    tmp_manifest = manifest_path.with_suffix(".json.tmp")
+    tmp_manifest.write_text(json.dumps(manifest, indent=2))
+
+    os.replace(tmp_data, data_path)
+    os.replace(tmp_manifest, manifest_path)
+    return data_path
+
+
+def read_manifest(name: str, directory: Path | None = None) -> dict | None:
+    """Return the manifest of the snapshot called *name*, or ``None`` if it has none."""
+    _, manifest_path = snapshot_paths(name, directory)
+    try:
+        return json.loads(manifest_path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _verify(data_path: Path, manifest_path: Path, manifest: dict, verify: bool | None) -> None:
+    if verify is False:
+        return
+    stat = data_path.stat()
+    if "size" in manifest and stat.st_size != manifest["size"]:
+        raise SnapshotError(f"Size mismatch for {data_path}")
+    if not verify and stat.st_mtime_ns == manifest.get("mtime_ns"):
+        return  # unchanged since it was written (or last verified)
+    if _sha256(data_path) != manifest["sha256"]:
+        raise SnapshotError(f"Checksum mismatch for {data_path}")
+    if stat.st_mtime_ns != manifest.get("mtime_ns"):
+        # Touched or copied but intact: remember the new stat, so that the
+        # next open does not hash it again.
+        manifest = {**manifest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        tmp_manifest = manifest_path.with_suffix(".json.tmp")
+        try:
+            tmp_manifest.write_text(json.dumps(manifest, indent=2))
+            os.replace(tmp_manifest, manifest_path)
+        except OSError:
+            pass
+
+
+def open_snapshot(name: str, directory: Path | None = None, verify: bool | None = None) -> pa.Table:
+    """Memory-map the snapshot called *name* and return it as an Arrow table.
+
+    *verify* ``True`` always checks the SHA-256 checksum, ``False`` never
+    does; ``None`` reads ``DATASET_SNAPSHOT_VERIFY`` and, if it is unset,
+    checks only when the file's size or mtime differs from the manifest.
+
+    Raises
+    ------
+    SnapshotError
+        If the snapshot does not exist, was written by another format
+        version, or its size / checksum / row count does not match the
+        manifest.
+    """
+    if verify is None and os.environ.get("DATASET_SNAPSHOT_VERIFY", "") in ("0", "1"):
+        verify = os.environ["DATASET_SNAPSHOT_VERIFY"] == "1"
+
+    data_path, manifest_path = snapshot_paths(name, directory)
+    if not data_path.exists() or not manifest_path.exists():
+        raise SnapshotError(f"No snapshot at {data_path}")
+
+    manifest = json.loads(manifest_path.read_text())
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError(
+            f"Snapshot version {manifest.get('version')} != {SNAPSHOT_VERSION}"
+        )
+    _verify(data_path, manifest_path, manifest, verify)
+
+    source = pa.memory_map(str(data_path), "r")
+    table = pa.ipc.open_file(source).read_all()
+    if table.num_rows != manifest["num_rows"]:
+        raise SnapshotError(f"Row count mismatch for {data_path}")
+    return table
+
+
+def load_or_build(
+    name: str,
+    build: Callable[[], pa.Table],
+    directory: Path | None = None,
+    **meta,
+) -> pa.Table:
+    """Open the snapshot called *name*, building it with *build* if needed.
+
+    If the snapshot cannot be written (e.g. a read-only filesystem) the
+    freshly built in-memory table is returned instead.
+    """
+    try:
+        return open_snapshot(name, directory)
+    except SnapshotError:
+        pass
+
+    table = build()
+    try:
+        write_snapshot(table, name, directory, **meta)
+    except OSError:
+        return table
+    return open_snapshot(name, directory, verify=False)
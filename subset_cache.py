@@ -0,0 +1,226 @@
+"""Named, memory-bounded cache of dataset subsets.
+
+The filter tools used to keep a single subset per session, so comparing two
+filters meant re-filtering.  :class:`SubsetCache` keeps many subsets under
+short handles (``"s1"``, ``"s2"``, …) that the model can pass back to the
+counting, sampling and aggregation tools, and combine with
+:meth:`SubsetCache.intersect` / :meth:`SubsetCache.union`.
+
+Subsets are stored compactly, never as copied frames: as an ``int32`` array
+of row positions when that is smaller, otherwise as a packed bitmap over all
+rows (one bit per row).  Only that one form is kept: a row array is shared
+with the :class:`data_loader.Subset` that :meth:`SubsetCache.get` returns,
+while a bitmap is decoded into a fresh subset on every lookup and its rows
+are dropped with it.  Either way the per-column label counts live on the
+entry, so they are computed once per handle.  Entries are evicted least
+recently used first once their total size exceeds the memory budget.
+
+When a newer dataset version is published, :meth:`SubsetCache.rebase` moves
+the subsets to it: a subset stored with a *grow* function (how its filter
+selects among appended rows) gains the matching new rows, which only looks
+at the rows added since its version; others keep their rows.
+"""
+
+from __future__ import annotations
+
+import itertools
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable
+
+import numpy as np
+
+from lazy import lazy_import
+
+dl = lazy_import("data_loader")
+
+__all__ = ["SubsetCache", "Grow"]
+
+# grow(dataset, start) -> sorted rows from *start* on that the filter selects
+Grow = Callable[[object, int], np.ndarray]
+
+
+@dataclass
+class _Entry:
+    dataset: object
+    description: str
+    size: int
+    rows: np.ndarray | None = None  # int32 row positions, or
+    bits: np.ndarray | None = None  # packed membership bitmap
+    version: str | None = None  # Subset.version of the stored rows
+    grow: Grow | None = None
+    counts: dict = field(default_factory=dict)  # shared with every Subset handed out
+    subset: object | None = None  # kept for row arrays only (shares ``rows``)
+
+    @property
+    def nbytes(self) -> int:
+        return (self.rows if self.rows is not None else self.bits).nbytes
+
+    def positions(self) -> np.ndarray:
+        if self.rows is not None:
+            return self.rows.astype(np.int64)
+        return np.flatnonzero(np.unpackbits(self.bits, count=len(self.dataset.full)))
+
+
+class SubsetCache:
+    """Handle -> subset mapping with LRU eviction by memory budget.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Budget for the stored row arrays/bitmaps.  The most recently stored
+        subset is kept even if it alone exceeds the budget.
+    """
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._nbytes = 0
+        self.evictions = 0
+
+    def __contains__(self, handle: str) -> bool:
+        return handle in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    @staticmethod
+    def _encode(entry: _Entry, positions: np.ndarray) -> None:
+        total = len(entry.dataset.full)
+        entry.size = len(positions)
+        entry.counts = {}
+        if 4 * len(positions) <= (total + 7) // 8:
+            entry.rows, entry.bits = positions.astype(np.int32), None
+            entry.subset = dl.Subset(entry.dataset, entry.rows, version=entry.version, counts=entry.counts)
+        else:
+            mask = np.zeros(total, dtype=bool)
+            mask[positions] = True
+            entry.rows, entry.bits, entry.subset = None, np.packbits(mask), None
+
+    def _evict(self) -> None:
+        # Called with the lock held; the most recently used entry always stays
+        while self._nbytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def put(self, subset: dl.Subset, description: str, grow: Grow | None = None) -> str:
+        """Store *subset* and return its new handle.
+
+        *grow* selects the filter's rows among rows appended later; see
+        :meth:`rebase`.
+        """
+        entry = _Entry(subset.dataset, description, 0, version=subset.version, grow=grow)
+        self._encode(entry, subset.positions())
+
+        with self._lock:
+            handle = f"s{next(self._ids)}"
+            self._entries[handle] = entry
+            self._nbytes += entry.nbytes
+            self._evict()
+        return handle
+
+    def _entry(self, handle: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is None:
+                raise KeyError(f"unknown or evicted subset handle {handle!r}")
+            self._entries.move_to_end(handle)
+        return entry
+
+    def get(self, handle: str) -> dl.Subset:
+        """Return the subset stored under *handle*.
+
+        A row array entry returns the same object until :meth:`rebase`
+        moves it to another dataset version; a bitmap entry decodes a new
+        subset, which shares the entry's counts.
+
+        Raises
+        ------
+        KeyError
+            If the handle is unknown or has been evicted.
+        """
+        entry = self._entry(handle)
+        with self._lock:
+            subset = entry.subset
+            if subset is None:
+                subset = dl.Subset(entry.dataset, entry.positions(), version=entry.version, counts=entry.counts)
+                entry.version = subset.version  # hashed once per version
+            return subset
+
+    def describe(self, handle: str) -> str:
+        return self._entry(handle).description
+
+    def _combine(self, handles: list[str], operation: str) -> tuple[dl.Subset, str, Grow | None]:
+        entries = [self._entry(h) for h in handles]
+        dataset = entries[0].dataset
+        if any(e.dataset is not dataset for e in entries):
+            raise ValueError("subsets belong to different dataset versions")
+        rows = entries[0].positions()
+        for entry in entries[1:]:
+            if operation == "intersect":
+                rows = np.intersect1d(rows, entry.positions(), assume_unique=True)
+            else:
+                rows = np.union1d(rows, entry.positions())
+        joiner = " AND " if operation == "intersect" else " OR "
+        description = joiner.join(f"({self.describe(h)})" for h in handles)
+        grows = [e.grow for e in entries]
+        grow = None
+        if all(grows):
+            def grow(dataset, start, grows=grows, operation=operation):
+                parts = [g(dataset, start) for g in grows]
+                combine = np.intersect1d if operation == "intersect" else np.union1d
+                selected = parts[0]
+                for part in parts[1:]:
+                    selected = combine(selected, part)
+                return selected
+        return dl.Subset(dataset, rows), description, grow
+
+    def intersect(self, handles: list[str]) -> str:
+        """Store the rows contained in every subset of *handles*; return its handle."""
+        return self.put(*self._combine(handles, "intersect"))
+
+    def union(self, handles: list[str]) -> str:
+        """Store the rows contained in any subset of *handles*; return its handle."""
+        return self.put(*self._combine(handles, "union"))
+
+    def rebase(self, dataset) -> None:
+        """Move every subset to *dataset*, a version appended to theirs.
+
+        Subsets with a *grow* function gain the appended rows their filter
+        selects; the others keep exactly their rows.
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+        for entry in entries:
+            if entry.dataset is dataset:
+                continue
+            start = len(entry.dataset.full)
+            positions = entry.positions()
+            if entry.grow is not None:
+                positions = np.concatenate([positions, entry.grow(dataset, start)])
+            with self._lock:
+                before = entry.nbytes
+                entry.dataset, entry.version = dataset, None
+                self._encode(entry, positions)
+                self._nbytes += entry.nbytes - before
+
+    def listing(self) -> list[dict]:
+        """Describe every cached subset, most recently used last."""
+        with self._lock:
+            return [
+                {"handle": h, "description": e.description, "rows": e.size}
+                for h, e in self._entries.items()
+            ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
@@ -0,0 +1,531 @@
+"""Inverted index and BM25 search over the instruction/response texts.
+
+The label columns can only be filtered by exact intent/category names;
+questions about what customers actually wrote ("requests mentioning refund
+and invoice") need the text.  :class:`TextIndex` keeps one positional
+inverted index per text column:
+
+* the vocabulary, sorted, so a term is found with a binary search;
+* per term, its postings (row, term frequency) for boolean matching and
+  BM25 scoring;
+* per term, its occurrences (row, token position) for phrase queries.
+
+Everything is a flat NumPy array (CSR layout: one offsets array per term
+list).  The index is built once with Arrow compute kernels and written next
+to the dataset snapshot as ``.npy`` files, which later processes
+memory-map; it is rebuilt when the snapshot's checksum changes.
+
+Rows appended to the dataset (:meth:`data_loader.Dataset.append`) are
+indexed as separate segments (:meth:`TextIndex.extend`), so ingesting a
+batch tokenises only the batch.  Queries run over every segment with
+collection-wide BM25 statistics.  As in a tiered LSM tree,
+:data:`MAX_SEGMENTS` trailing segments of similar size are re-indexed as
+one, so each appended row is re-read a logarithmic number of times and
+few segments are searched.
+
+Query syntax (see :func:`parse_query`)::
+
+    refund invoice              both words (AND is implicit)
+    refund OR reimbursement     either word
+    refund AND NOT invoice      exclusion
+    "cancel my order"           phrase
+    (refund OR money) "credit card"
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import weakref
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import snapshot
+from lazy import lazy_import
+
+dl = lazy_import("data_loader")
+
+__all__ = [
+    "INDEX_VERSION",
+    "QueryError",
+    "tokenize",
+    "parse_query",
+    "FieldIndex",
+    "TextIndex",
+    "index_dir",
+    "get_index",
+]
+
+# Bump whenever the on-disk layout or the tokenisation changes.
+INDEX_VERSION = 1
+
+# Tokens are runs of letters and digits, lower-cased.  The Python pattern
+# (queries) and the RE2 pattern (index build) must agree.
+_TOKEN = re.compile(r"[^\W_]+")
+_SEPARATOR = r"[^\p{L}\p{N}]+"
+_QUERY_TOKEN = re.compile(r'"[^"]*"|\(|\)|[^\s()"]+')
+_KEYWORDS = ("AND", "OR", "NOT")
+
+# BM25 parameters (the usual defaults)
+_K1 = 1.2
+_B = 0.75
+
+# Appended segments of one size class merged into one of the next
+MAX_SEGMENTS = 8
+
+_ARRAYS = ("vocabulary", "term_offsets", "post_rows", "post_tf", "occ_offsets", "occ_rows", "occ_pos", "lengths")
+
+
+class QueryError(ValueError):
+    """Raised for a search query that cannot be parsed."""
+
+
+def tokenize(text: str) -> list[str]:
+    """Split *text* into the index's tokens."""
+    return _TOKEN.findall(text.lower())
+
+
+# ---------------------------------------------------------------------------
+# Query parsing
+# ---------------------------------------------------------------------------
+
+def parse_query(query: str):
+    """Parse *query* into a tree of tuples.
+
+    Nodes are ``("words", [token, ...])`` (one token: a term; several: a
+    phrase), ``("and", [node, ...])``, ``("or", [node, ...])`` and
+    ``("not", node)``.
+
+    Raises
+    ------
+    QueryError
+        For unbalanced parentheses, dangling operators or a query without
+        searchable words.
+    """
+    tokens = [
+        t for t in _QUERY_TOKEN.findall(query)
+        if t in ("(", ")") or t in _KEYWORDS or tokenize(t)
+    ]
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def advance():
+        nonlocal position
+        token = peek()
+        position += 1
+        return token
+
+    def or_expr():
+        parts = [and_expr()]
+        while peek() == "OR":
+            advance()
+            parts.append(and_expr())
+        return parts[0] if len(parts) == 1 else ("or", parts)
+
+    def and_expr():
+        parts = [not_expr()]
+        while peek() not in (None, ")", "OR"):
+            if peek() == "AND":
+                advance()
+            parts.append(not_expr())
+        return parts[0] if len(parts) == 1 else ("and", parts)
+
+    def not_expr():
+        if peek() == "NOT":
+            advance()
+            return ("not", not_expr())
+        return atom()
+
+    def atom():
+        token = advance()
+        if token is None:
+            raise QueryError("query ends unexpectedly")
+        if token == "(":
+            node = or_expr()
+            if advance() != ")":
+                raise QueryError("missing ')'")
+            return node
+        if token in (")", "AND", "OR"):
+            raise QueryError(f"unexpected {token!r}")
+        return ("words", tokenize(token.strip('"')))
+
+    if not tokens:
+        raise QueryError("the query has no searchable words")
+    tree = or_expr()
+    if peek() is not None:
+        raise QueryError(f"unexpected {peek()!r}")
+    return tree
+
+
+def _positive_terms(node, negated: bool = False) -> list[str]:
+    """Terms that make a row a better match, i.e. those not under a NOT."""
+    kind = node[0]
+    if kind == "words":
+        return [] if negated else node[1]
+    if kind == "not":
+        return _positive_terms(node[1], not negated)
+    return [t for child in node[1] for t in _positive_terms(child, negated)]
+
+
+def _intersect_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Intersection of two sorted arrays of unique values (elements of *a*)."""
+    if not len(a) or not len(b):
+        return a[:0]
+    i = np.searchsorted(b, a)
+    i[i == len(b)] = 0
+    return a[b[i] == a]
+
+
+# ---------------------------------------------------------------------------
+# Index of one text column
+# ---------------------------------------------------------------------------
+
+class FieldIndex:
+    """Positional inverted index of one text column."""
+
+    def __init__(self, arrays: dict[str, np.ndarray]):
+        for name in _ARRAYS:
+            setattr(self, name, arrays[name])
+        self.num_rows = len(self.lengths)
+        self.mean_length = float(self.lengths.mean()) if self.num_rows else 0.0
+
+    @classmethod
+    def build(cls, texts: pa.ChunkedArray) -> FieldIndex:
+        """Tokenise *texts* with Arrow kernels and build the index."""
+        lists = pc.split_pattern_regex(pc.utf8_lower(texts.combine_chunks()), _SEPARATOR)
+        tokens = pc.list_flatten(lists)
+        rows = pc.list_parent_indices(lists)
+        keep = pc.not_equal(tokens, "")
+        tokens, rows = tokens.filter(keep), rows.filter(keep).to_numpy().astype(np.int32)
+        # Position of each token within its row (rows are in ascending order)
+        pos = (np.arange(len(rows)) - np.searchsorted(rows, rows)).astype(np.int32)
+
+        encoded = pc.dictionary_encode(tokens)
+        vocabulary = np.array(encoded.dictionary.to_pylist(), dtype=str)
+        order = np.argsort(vocabulary)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        terms = rank[encoded.indices.to_numpy()]
+        vocabulary = vocabulary[order]
+
+        by_term = np.argsort(terms, kind="stable")  # keeps (row, pos) order
+        terms, rows, pos = terms[by_term], rows[by_term], pos[by_term]
+        occ_offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocabulary)), out=occ_offsets[1:])
+
+        first = np.ones(len(terms), dtype=bool)
+        first[1:] = (terms[1:] != terms[:-1]) | (rows[1:] != rows[:-1])
+        starts = np.flatnonzero(first)
+        term_offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms[starts], minlength=len(vocabulary)), out=term_offsets[1:])
+
+        return cls({
+            "vocabulary": vocabulary,
+            "term_offsets": term_offsets,
+            "post_rows": rows[starts],
+            "post_tf": np.diff(np.append(starts, len(terms))).astype(np.int32),
+            "occ_offsets": occ_offsets,
+            "occ_rows": rows,
+            "occ_pos": pos,
+            "lengths": np.bincount(rows, minlength=len(texts)).astype(np.int32),
+        })
+
+    def term_id(self, term: str) -> int | None:
+        i = int(np.searchsorted(self.vocabulary, term))
+        if i < len(self.vocabulary) and self.vocabulary[i] == term:
+            return i
+        return None
+
+    def rows(self, term: str) -> np.ndarray:
+        """Sorted rows containing *term*."""
+        i = self.term_id(term)
+        if i is None:
+            return np.empty(0, dtype=np.int32)
+        return self.post_rows[self.term_offsets[i]:self.term_offsets[i + 1]]
+
+    def phrase_rows(self, words: list[str]) -> np.ndarray:
+        """Sorted rows containing *words* as consecutive tokens."""
+        ids = [self.term_id(w) for w in words]
+        if any(i is None for i in ids):
+            return np.empty(0, dtype=np.int32)
+        keys = None
+        # (row, start position) of the phrase, one int64 per occurrence.  The
+        # occurrences are sorted by (row, position), so the keys are sorted
+        # too and can be intersected with binary searches; rarest word first.
+        for offset, i in sorted(enumerate(ids), key=lambda o: self.occ_offsets[o[1] + 1] - self.occ_offsets[o[1]]):
+            start, stop = self.occ_offsets[i], self.occ_offsets[i + 1]
+            pos = self.occ_pos[start:stop]
+            valid = pos >= offset
+            candidate = (self.occ_rows[start:stop][valid].astype(np.int64) << 32) | (pos[valid] - offset)
+            keys = candidate if keys is None else _intersect_sorted(keys, candidate)
+            if not len(keys):
+                break
+        return np.unique(keys >> 32).astype(np.int32)
+
+    def match(self, words: list[str]) -> np.ndarray:
+        return self.rows(words[0]) if len(words) == 1 else self.phrase_rows(words)
+
+    def postings(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+        """Rows containing *term* and the term frequency in each."""
+        i = self.term_id(term)
+        if i is None:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        start, stop = self.term_offsets[i], self.term_offsets[i + 1]
+        return self.post_rows[start:stop], self.post_tf[start:stop]
+
+    def add_scores(self, terms: list[str], scores: np.ndarray) -> None:
+        """Add the BM25 score of *terms* for every row to *scores*."""
+        for term in dict.fromkeys(terms):
+            i = self.term_id(term)
+            if i is None:
+                continue
+            start, stop = self.term_offsets[i], self.term_offsets[i + 1]
+            rows, tf = self.post_rows[start:stop], self.post_tf[start:stop]
+            idf = math.log(1 + (self.num_rows - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = _K1 * (1 - _B + _B * self.lengths[rows] / self.mean_length)
+            scores[rows] += idf * tf * (_K1 + 1) / (tf + norm)
+
+
+# ---------------------------------------------------------------------------
+# Index over all text columns
+# ---------------------------------------------------------------------------
+
+class TextIndex:
+    """Inverted indexes of the dataset's text columns.
+
+    Parameters
+    ----------
+    fields : dict[str, FieldIndex]
+        One index per text column, for the first rows (the persisted part).
+    segments : list[tuple[int, dict[str, FieldIndex]]], optional
+        Indexes of appended rows, with the position of their first row.
+    """
+
+    def __init__(self, fields: dict[str, FieldIndex], segments=()):
+        self.fields = fields
+        self.segments: list[tuple[int, dict[str, FieldIndex]]] = [(0, fields), *segments]
+        self.num_rows = sum(next(iter(f.values())).num_rows for _, f in self.segments)
+        self._mean_length = {
+            name: sum(float(f[name].lengths.sum()) for _, f in self.segments) / max(self.num_rows, 1)
+            for name in fields
+        }
+
+    @classmethod
+    def build(cls, table: pa.Table, columns=None) -> TextIndex:
+        columns = columns or dl.TEXT_COLUMNS
+        return cls({name: FieldIndex.build(table.column(name)) for name in columns})
+
+    def extend(self, table: pa.Table) -> TextIndex:
+        """Return the index of *table*, whose first :attr:`num_rows` rows this index covers.
+
+        The new rows become one more segment; whenever the oldest of the
+        last :data:`MAX_SEGMENTS` appended segments is less than
+        ``MAX_SEGMENTS`` times larger than each of the others, those are
+        re-indexed as one.
+        """
+        segments = [*self.segments[1:], (self.num_rows, self._build(table, self.num_rows, len(table)))]
+        while len(segments) >= MAX_SEGMENTS:
+            tail = segments[-MAX_SEGMENTS:]
+            sizes = [next(iter(fields.values())).num_rows for _, fields in tail]
+            if sizes[0] >= MAX_SEGMENTS * min(sizes[1:]):
+                break
+            start = tail[0][0]
+            segments[-MAX_SEGMENTS:] = [(start, self._build(table, start, start + sum(sizes)))]
+        return TextIndex(self.fields, segments)
+
+    def _build(self, table: pa.Table, start: int, stop: int) -> dict[str, FieldIndex]:
+        rows = table.slice(start, stop - start)
+        return {name: FieldIndex.build(rows.column(name)) for name in self.fields}
+
+    # -- persistence ----------------------------------------------------
+
+    def save(self, directory: Path, fingerprint: str) -> None:
+        """Write the arrays and a manifest to *directory*, replacing it atomically."""
+        tmp = directory.with_name(directory.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for name, index in self.fields.items():
+            for array in _ARRAYS:
+                np.save(tmp / f"{name}.{array}.npy", getattr(index, array))
+        manifest = {"version": INDEX_VERSION, "fingerprint": fingerprint,
+                    "num_rows": self.num_rows, "fields": list(self.fields)}
+        (tmp / "manifest.json").write_text(json.dumps(manifest, indent=2))
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp, directory)
+
+    @classmethod
+    def load(cls, directory: Path, fingerprint: str) -> TextIndex | None:
+        """Memory-map the index in *directory*; ``None`` if missing or stale."""
+        try:
+            manifest = json.loads((directory / "manifest.json").read_text())
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != INDEX_VERSION or manifest.get("fingerprint") != fingerprint:
+            return None
+        try:
+            return cls({
+                name: FieldIndex({a: np.load(directory / f"{name}.{a}.npy", mmap_mode="r") for a in _ARRAYS})
+                for name in manifest["fields"]
+            })
+        except (OSError, ValueError):
+            return None
+
+    # -- queries --------------------------------------------------------
+
+    def _fields(self, field: str | None) -> list[str]:
+        if field is None:
+            return list(self.fields)
+        if field not in self.fields:
+            raise QueryError(f"unknown text field {field!r}; use one of {list(self.fields)}")
+        return [field]
+
+    def _evaluate(self, node, fields: list[str], start: int = 0) -> np.ndarray:
+        """Evaluate a parsed query to a boolean mask over the rows from *start* on."""
+        kind = node[0]
+        if kind == "words":
+            mask = np.zeros(self.num_rows - start, dtype=bool)
+            for offset, segment in self.segments:
+                size = next(iter(segment.values())).num_rows
+                if offset + size <= start:
+                    continue
+                for name in fields:
+                    rows = segment[name].match(node[1]) + (offset - start)
+                    mask[rows[rows >= 0]] = True
+            return mask
+        if kind == "not":
+            return ~self._evaluate(node[1], fields, start)
+        masks = (self._evaluate(child, fields, start) for child in node[1])
+        combine = np.logical_and if kind == "and" else np.logical_or
+        result = next(masks)
+        for mask in masks:
+            combine(result, mask, out=result)
+        return result
+
+    def _add_scores(self, terms: list[str], fields: list[str], scores: np.ndarray) -> None:
+        """Add the BM25 score of *terms* in *fields* for every row to *scores*."""
+        for name in fields:
+            for term in dict.fromkeys(terms):
+                postings = [(offset, *segment[name].postings(term), segment[name].lengths)
+                            for offset, segment in self.segments]
+                found = sum(len(rows) for _, rows, _, _ in postings)
+                if not found:
+                    continue
+                idf = math.log(1 + (self.num_rows - found + 0.5) / (found + 0.5))
+                for offset, rows, tf, lengths in postings:
+                    norm = _K1 * (1 - _B + _B * lengths[rows] / self._mean_length[name])
+                    scores[rows + offset] += idf * tf * (_K1 + 1) / (tf + norm)
+
+    def match(self, query: str, field: str | None = None, start: int = 0) -> np.ndarray:
+        """Return the sorted rows matching the boolean *query*.
+
+        With *start*, only rows from that position on are matched (e.g. the
+        rows appended since an earlier version), and only the segments
+        holding them are read.
+        """
+        return start + np.flatnonzero(self._evaluate(parse_query(query), self._fields(field), start))
+
+    def search(
+        self,
+        query: str,
+        field: str | None = None,
+        top_k: int = 10,
+        within: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Match *query* and rank the matches by BM25.
+
+        Parameters
+        ----------
+        query : str
+            Boolean query (see :func:`parse_query`).
+        field : str, optional
+            Text column to search; ``None`` searches all of them.
+        top_k : int
+            Number of ranked rows to return.
+        within : numpy.ndarray, optional
+            Sorted row positions to restrict the search to.
+
+        Returns
+        -------
+        tuple
+            ``(matches, rows, scores)``: every matching row, and the *top_k*
+            best of them with their scores, best first.
+        """
+        tree = parse_query(query)
+        fields = self._fields(field)
+        mask = self._evaluate(tree, fields)
+        if within is not None:
+            restrict = np.zeros(self.num_rows, dtype=bool)
+            restrict[within] = True
+            mask &= restrict
+        matches = np.flatnonzero(mask)
+        scores = np.zeros(self.num_rows, dtype=np.float64)
+        self._add_scores(_positive_terms(tree), fields, scores)
+        candidate = scores[matches]
+        k = min(top_k, len(matches))
+        best = np.argpartition(-candidate, k - 1)[:k] if 0 < k < len(matches) else np.arange(len(matches))[:k]
+        best = best[np.lexsort((matches[best], -candidate[best]))]
+        return matches, matches[best], candidate[best]
+
+
+# ---------------------------------------------------------------------------
+# Process-wide index
+# ---------------------------------------------------------------------------
+
+_lock = threading.Lock()
+# Index of every dataset version still in use
+_indexes: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def index_dir() -> Path:
+    """Directory of the persisted index, next to the dataset snapshot."""
+    return snapshot.snapshot_dir() / f"{dl.SNAPSHOT_NAME}.text-index.v{INDEX_VERSION}"
+
+
+def get_index(dataset=None) -> TextIndex:
+    """Return the text index of *dataset* (default: the process-wide dataset).
+
+    The index is memory-mapped from disk when a current one exists there,
+    and otherwise built and written next to the snapshot.  Datasets that do
+    not come from a snapshot are indexed in memory only; a version made by
+    :meth:`data_loader.Dataset.append` extends its parent's index.
+    """
+    dataset = dataset or dl.get_dataset()
+    # Built indexes are read without the lock, so queries never wait for
+    # the index of a version being ingested.
+    index = _indexes.get(dataset)
+    if index is not None:
+        return index
+    with _lock:
+        return _index_of(dataset)
+
+
+def _index_of(dataset) -> TextIndex:
+    index = _indexes.get(dataset)
+    if index is not None:
+        return index
+    parent = dataset.parent() if dataset.parent is not None else None
+    if parent is not None:
+        index = _index_of(parent).extend(dataset.table)
+    else:
+        fingerprint = dataset.fingerprint
+        directory = index_dir()
+        index = TextIndex.load(directory, fingerprint) if fingerprint else None
+        if index is None:
+            index = TextIndex.build(dataset.table)
+            if fingerprint:
+                try:
+                    index.save(directory, fingerprint)
+                    index = TextIndex.load(directory, fingerprint) or index
+                except OSError:
+                    pass
+    _indexes[dataset] = index
+    return index
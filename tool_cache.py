@@ -0,0 +1,129 @@
+"""Memoised tool results, shared by every session of the process.
+
+The model repeats the same read-only tool calls constantly: ``get_all_intents``
+in most episodes, ``count_intent`` on a subset it already counted, the same
+``aggregate`` or ``search_text`` in many sessions.  Tools registered with
+``memoize=...`` (see :func:`tool_registry.tool`) are answered from a
+:class:`ToolResultCache` keyed by
+
+* the tool name,
+* the canonical JSON of the validated arguments (defaults filled in, keys
+  sorted), so ``{"handle": null}`` and ``{}`` share an entry,
+* the dataset version (:attr:`data_loader.Dataset.version`), and
+* the version of the subset the tool reads (:attr:`data_loader.Subset.version`,
+  a digest of its rows), for tools that read one.
+
+Because the subset version is derived from the rows, replacing the active
+subset can never serve a stale result, and two sessions that selected the
+same rows share entries.  Entries are evicted least recently used first
+beyond ``max_entries``; :meth:`ToolResultCache.invalidate` drops the entries
+of a dataset version, or everything.  Results are shared between callers and
+must be treated as read-only.
+
+The process-wide cache returned by :func:`get_tool_cache` holds
+``TOOL_CACHE_ENTRIES`` entries (default 4096).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from lazy import lazy
+
+__all__ = ["ToolResultCache", "get_tool_cache"]
+
+_MISSING = object()
+
+
+class ToolResultCache:
+    """Bounded LRU of tool results with per-tool hit/miss counters.
+
+    Parameters
+    ----------
+    max_entries : int
+        Number of results kept; the least recently used are evicted first.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, object] = OrderedDict()
+        self._lock = threading.Lock()
+        self._tools: dict[str, dict[str, int]] = {}
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(tool: str, kwargs: dict, dataset_version: str, subset_version: str | None = None) -> tuple:
+        """Return the cache key of a call of *tool* with the validated *kwargs*."""
+        arguments = json.dumps(kwargs, sort_keys=True, separators=(",", ":"), default=str)
+        return (dataset_version, tool, arguments, subset_version)
+
+    def get(self, key: tuple, default=_MISSING):
+        """Return the result stored under *key*, counting a hit or a miss."""
+        tool = key[1]
+        with self._lock:
+            counters = self._tools.setdefault(tool, {"hits": 0, "misses": 0})
+            result = self._entries.get(key, _MISSING)
+            if result is _MISSING:
+                counters["misses"] += 1
+                return default
+            counters["hits"] += 1
+            self._entries.move_to_end(key)
+            return result
+
+    def put(self, key: tuple, result) -> None:
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, dataset_version: str | None = None) -> int:
+        """Drop the entries of *dataset_version* (all entries for ``None``); return how many."""
+        with self._lock:
+            if dataset_version is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                stale = [k for k in self._entries if k[0] == dataset_version]
+                for k in stale:
+                    del self._entries[k]
+                dropped = len(stale)
+        return dropped
+
+    def stats(self) -> dict:
+        """Return the entry count, evictions and per-tool hits, misses and hit rate."""
+        with self._lock:
+            tools = {name: dict(counters) for name, counters in self._tools.items()}
+            stats = {"entries": len(self._entries), "evictions": self.evictions}
+        for counters in tools.values():
+            lookups = counters["hits"] + counters["misses"]
+            counters["hit_rate"] = counters["hits"] / lookups if lookups else 0.0
+        hits = sum(c["hits"] for c in tools.values())
+        lookups = hits + sum(c["misses"] for c in tools.values())
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        stats["tools"] = tools
+        return stats
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._tools.clear()
+            self.evictions = 0
+
+
+@lazy
+def _tool_cache() -> ToolResultCache:
+    return ToolResultCache(max_entries=int(os.environ.get("TOOL_CACHE_ENTRIES", 4096)))
+
+
+def get_tool_cache() -> ToolResultCache:
+    """Return the process-wide tool result cache."""
+    return _tool_cache.get()
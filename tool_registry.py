@@ -0,0 +1,349 @@
+"""Decorator-based registry of the function tools exposed to the LLM.
+
+Each tool is registered once with :func:`tool`.  The registry then
+
+* dispatches calls by name in O(1) (``registry.call(session, name, args)``),
+* validates the decoded JSON arguments against the function's type hints and
+  the dataset's label enums before calling it, and
+* generates the OpenAI ``tools`` JSON schema from the signatures once, caching
+  both the list and its serialized JSON payload.
+
+Tools are listed sorted by name so the payload is byte-for-byte stable
+(which maximises provider-side prompt prefix caching).  In *compact* mode the
+intent/category enums are left out of the tool definitions; the vocabulary is
+sent once in the system prompt instead (see :meth:`ToolRegistry.vocabulary`)
+and argument values are still checked against the enums when a tool is called.
+
+The enums come from the latest published dataset version; when ingested rows
+add labels, the cached schema and vocabulary are rebuilt on their next use.
+Arguments are checked against the version the calling session reads.
+
+A first parameter called ``session`` receives the calling
+:class:`agent.AgentSession` and is not part of the schema.
+"""
+
+from __future__ import annotations
+
+import inspect
+import json
+import types
+import typing
+from dataclasses import dataclass, field
+from typing import Any, Callable, Literal, Union
+
+from lazy import Lazy, lazy_import
+
+dl = lazy_import("data_loader")
+
+__all__ = ["ToolArgumentError", "Tool", "ToolRegistry", "registry", "tool"]
+
+
+class ToolArgumentError(ValueError):
+    """Raised when the model passes arguments that do not match a tool's schema."""
+
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+_MISSING = inspect.Parameter.empty
+
+
+@dataclass
+class _Param:
+    name: str
+    hint: Any
+    description: str | None
+    default: Any = _MISSING
+    # Name of a label column ("intent", "category") whose values are allowed
+    enum: str | None = None
+
+    @property
+    def optional(self) -> bool:
+        return self.default is not _MISSING
+
+
+@dataclass
+class Tool:
+    """A registered tool: the callable plus what is needed to describe/validate it."""
+
+    name: str
+    func: Callable
+    description: str
+    params: list[_Param]
+    takes_session: bool
+    # Whether the tool replaces the session's active subset (see agent.py)
+    stateful: bool = False
+    # What the result depends on besides the arguments, for memoisation
+    # (see tool_cache.py): "subset", "dataset", or None (never memoised)
+    memoize: str | None = None
+    extra: dict = field(default_factory=dict)
+
+    def bind(self, args: dict, dataset=None) -> dict:
+        """Validate *args* and return the keyword arguments for :attr:`func`.
+
+        Enum values are checked against *dataset* (default: the latest version).
+        """
+        known = {p.name for p in self.params}
+        unexpected = set(args) - known
+        if unexpected:
+            raise ToolArgumentError(f"unexpected argument(s) {sorted(unexpected)}")
+
+        kwargs = {}
+        for param in self.params:
+            value = args.get(param.name)
+            if value is None:
+                if not param.optional:
+                    raise ToolArgumentError(f"missing required argument {param.name!r}")
+                kwargs[param.name] = param.default
+                continue
+            allowed = _enum_values(param.enum, dataset) if param.enum else None
+            kwargs[param.name] = _check(param.name, value, param.hint, allowed)
+        return kwargs
+
+    def __call__(self, session, args: dict):
+        kwargs = self.bind(args, getattr(session, "dataset", None))
+        if self.takes_session:
+            return self.func(session, **kwargs)
+        return self.func(**kwargs)
+
+
+def _enum_values(column: str, dataset=None) -> list[str]:
+    return getattr(dataset or dl.get_dataset(), f"{column}_enum")
+
+
+def _strip_optional(hint):
+    """Return ``(inner, nullable)`` for ``X | None`` style hints."""
+    if typing.get_origin(hint) in (Union, types.UnionType):
+        args = [a for a in typing.get_args(hint) if a is not type(None)]
+        if len(args) == 1:
+            return args[0], True
+    return hint, False
+
+
+def _check(name: str, value, hint, allowed: list[str] | None):
+    hint, _ = _strip_optional(hint)
+    origin = typing.get_origin(hint)
+
+    if origin is list:
+        (item_hint,) = typing.get_args(hint) or (Any,)
+        if isinstance(value, str):  # allow accidental single-string usage
+            value = [value]
+        if not isinstance(value, list):
+            raise ToolArgumentError(f"{name!r} must be an array")
+        return [_check(name, item, item_hint, allowed) for item in value]
+
+    if origin is Literal:
+        choices = typing.get_args(hint)
+        if value not in choices:
+            raise ToolArgumentError(f"{name!r} must be one of {list(choices)}, got {value!r}")
+        return value
+
+    if hint is int and (not isinstance(value, int) or isinstance(value, bool)):
+        raise ToolArgumentError(f"{name!r} must be an integer")
+    if hint is float and (not isinstance(value, (int, float)) or isinstance(value, bool)):
+        raise ToolArgumentError(f"{name!r} must be a number")
+    if hint is bool and not isinstance(value, bool):
+        raise ToolArgumentError(f"{name!r} must be a boolean")
+    if hint is str:
+        if not isinstance(value, str):
+            raise ToolArgumentError(f"{name!r} must be a string")
+        if allowed is not None and value not in allowed:
+            raise ToolArgumentError(f"unknown value {value!r} for {name!r}")
+    return value
+
+
+def _json_schema(hint, enum: list[str] | None, nullable: bool) -> dict:
+    """Return the JSON schema of a parameter with type *hint*."""
+    hint, optional = _strip_optional(hint)
+    nullable = nullable or optional
+    origin = typing.get_origin(hint)
+
+    if origin is list:
+        (item_hint,) = typing.get_args(hint) or (str,)
+        schema: dict = {"type": "array", "items": _json_schema(item_hint, enum, False)}
+    elif origin is Literal:
+        choices = list(typing.get_args(hint))
+        schema = {"type": _JSON_TYPES[type(choices[0])], "enum": choices}
+    else:
+        schema = {"type": _JSON_TYPES[hint]}
+        if enum is not None:
+            schema["enum"] = enum
+
+    if nullable:
+        # Strict mode requires every property; optional ones accept null.
+        schema["type"] = [schema["type"], "null"]
+        if "enum" in schema:
+            schema["enum"] = [*schema["enum"], None]
+    return schema
+
+
+class ToolRegistry:
+    """Name -> :class:`Tool` mapping with a lazily generated, cached schema."""
+
+    def __init__(self):
+        self._tools: dict[str, Tool] = {}
+        self._schema = {
+            compact: Lazy(lambda compact=compact: self._build_schema(compact)) for compact in (False, True)
+        }
+        self._schema_json = {
+            compact: Lazy(lambda compact=compact: json.dumps(self.schema(compact), separators=(",", ":")))
+            for compact in (False, True)
+        }
+        self._vocabulary: Lazy[str] = Lazy(self._build_vocabulary)
+        # Dataset version and enums the cached schemas were built from
+        self._built_for = None
+        self._enums: tuple | None = None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __iter__(self):
+        return iter(self._tools.values())
+
+    def get(self, name: str) -> Tool | None:
+        return self._tools.get(name)
+
+    def tool(
+        self,
+        description: str,
+        *,
+        params: dict[str, str] | None = None,
+        enums: dict[str, str] | None = None,
+        stateful: bool = False,
+        memoize: Literal["subset", "dataset"] | None = None,
+        name: str | None = None,
+        **extra,
+    ) -> Callable[[Callable], Callable]:
+        """Register the decorated function as a tool.
+
+        Parameters
+        ----------
+        description : str
+            Tool description shown to the model.
+        params : dict[str, str], optional
+            Per-parameter descriptions.
+        enums : dict[str, str], optional
+            Maps a parameter to the label column (``"intent"`` or
+            ``"category"``) whose values it must take.
+        stateful : bool
+            Whether the tool replaces the session's active subset.
+        memoize : {"subset", "dataset"}, optional
+            Lets the session answer repeated calls from its tool result
+            cache.  ``"subset"`` for tools that read the active subset (or
+            the one of their ``handle`` argument), ``"dataset"`` for tools
+            whose result depends only on the arguments and the dataset.
+            Only for read-only tools without side effects.
+        name : str, optional
+            Tool name; defaults to the function name.
+        """
+        params = params or {}
+        enums = enums or {}
+
+        def decorator(func: Callable) -> Callable:
+            signature = inspect.signature(func)
+            parameters = list(signature.parameters.values())
+            takes_session = bool(parameters) and parameters[0].name == "session"
+            if takes_session:
+                parameters = parameters[1:]
+
+            tool_params = []
+            for p in parameters:
+                hint = p.annotation
+                if isinstance(hint, str):
+                    hint = eval(hint, func.__globals__)  # postponed annotations
+                tool_params.append(
+                    _Param(p.name, hint, params.get(p.name), p.default, enums.get(p.name))
+                )
+
+            tool_name = name or func.__name__
+            self._tools[tool_name] = Tool(
+                tool_name, func, description, tool_params, takes_session, stateful, memoize, extra
+            )
+            self.invalidate()
+            return func
+
+        return decorator
+
+    def call(self, session, name: str, args: dict):
+        """Validate *args* and run the tool called *name*."""
+        registered = self._tools.get(name)
+        if registered is None:
+            return f"Unknown tool: {name}"
+        return registered(session, args)
+
+    def _build_schema(self, compact: bool) -> list[dict]:
+        specs = []
+        for t in sorted(self._tools.values(), key=lambda t: t.name):
+            properties = {}
+            for p in t.params:
+                enum = _enum_values(p.enum) if p.enum and not compact else None
+                prop = _json_schema(p.hint, enum, p.optional)
+                description = p.description
+                if p.enum and compact:
+                    hint = f"one of the {p.enum} names listed in the system prompt"
+                    description = f"{description} ({hint})" if description else hint.capitalize()
+                if description:
+                    prop["description"] = description
+                properties[p.name] = prop
+            specs.append(
+                {
+                    "type": "function",
+                    "function": {
+                        "name": t.name,
+                        "description": t.description,
+                        "parameters": {
+                            "type": "object",
+                            "properties": properties,
+                            "required": [p.name for p in t.params],
+                            "additionalProperties": False,
+                        },
+                        "strict": True,
+                    },
+                }
+            )
+        return specs
+
+    def schema(self, compact: bool = False) -> list[dict]:
+        """Return the OpenAI ``tools`` list (built once, then cached).
+
+        With *compact*, enum-constrained parameters are plain strings and the
+        allowed values must be supplied through :meth:`vocabulary`.
+        """
+        self._sync()
+        return self._schema[compact].get()
+
+    def schema_json(self, compact: bool = False) -> str:
+        """Return :meth:`schema` serialized as compact JSON (cached)."""
+        self._sync()
+        return self._schema_json[compact].get()
+
+    def _build_vocabulary(self) -> str:
+        columns = sorted({p.enum for t in self._tools.values() for p in t.params if p.enum})
+        lines = ["Valid values for tool arguments (use them verbatim):"]
+        for column in columns:
+            lines.append(f"- {column} names: {', '.join(_enum_values(column))}")
+        return "\n".join(lines)
+
+    def vocabulary(self) -> str:
+        """Return the enum vocabulary as prompt text, for compact mode (cached)."""
+        self._sync()
+        return self._vocabulary.get()
+
+    def _sync(self) -> None:
+        """Drop the cached schemas if a dataset version with other labels was published."""
+        dataset = dl.get_dataset()
+        if dataset is self._built_for:
+            return
+        enums = (dataset.intent_enum, dataset.category_enum)
+        if self._enums is not None and enums != self._enums:
+            self.invalidate()
+        self._built_for, self._enums = dataset, enums
+
+    def invalidate(self) -> None:
+        """Drop the cached schemas, e.g. after the label enums changed."""
+        for cached in (*self._schema.values(), *self._schema_json.values(), self._vocabulary):
+            cached.reset()
+
+
+# Process-wide registry used by ``dataset_tools``
+registry = ToolRegistry()
+tool = registry.tool
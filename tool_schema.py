@@ -2,191 +2,49 @@ from __future__ import annotations
 
 """Centralised schema describing all function tools exposed to the LLM.
 
-Importing this module *does not* pull in any heavy dependencies other than
-`data_loader`, which is already cached by the interpreter once `main.py`
-(or any other module) has loaded it.  Keeping the schema here makes
-`main.py` shorter and easier to follow.
+The schema is generated by :mod:`tool_registry` from the signatures of the
+functions registered in :mod:`dataset_tools`, including the dataset's
+category and intent enums.  It is built on the first call to `get_tools()`
+(or the first access to the legacy `tools` attribute) and then kept, so
+importing this module stays cheap and completion requests reuse the same
+list instead of rebuilding it.
+
+`get_tools(compact=True)` returns the compact variant without inlined enums;
+it must be paired with `get_vocabulary()` in the system prompt.
 """
 
-import data_loader as dl
-
-# Enums reused in the JSON schema definitions
-category_enum = dl.category_enum
-intent_enum = dl.intent_enum
-
-# ---------------------------------------------------------------------------
-# Tool specification list
-# ---------------------------------------------------------------------------
-
-tools: list[dict] = [
-    {
-        "type": "function",
-        "function": {
-            "name": "select_semantic_intent",
-            "description": (
-                "Filter the dataset by a list of intent names, cache the result, "
-                "and return the cache key."
-            ),
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "intent_names": {
-                        "type": "array",
-                        "items": {"type": "string", "enum": intent_enum},
-                        "description": "List of intent names to filter by",
-                    }
-                },
-                "required": ["intent_names"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "select_semantic_category",
-            "description": (
-                "Filter the dataset by a list of category names, cache the result, "
-                "and return the cache key."
-            ),
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "category_names": {
-                        "type": "array",
-                        "items": {"type": "string", "enum": category_enum},
-                        "description": "List of category names to filter by",
-                    }
-                },
-                "required": ["category_names"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "sum",
-            "description": "Function that sums two integers and returns the result",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "a": {"type": "integer", "description": "The first integer to sum"},
-                    "b": {"type": "integer", "description": "The second integer to sum"},
-                },
-                "required": ["a", "b"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "count_intent",
-            "description": "Count how many rows have the given intent name and return that number.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "intent_name": {
-                        "type": "string",
-                        "enum": intent_enum,
-                        "description": "The intent name whose frequency you want to count.",
-                    }
-                },
-                "required": ["intent_name"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "count_category",
-            "description": "Count how many rows have the given category name and return that number.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "category_name": {
-                        "type": "string",
-                        "enum": category_enum,
-                        "description": "The category name whose frequency you want to count.",
-                    }
-                },
-                "required": ["category_name"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "show_examples",
-            "description": "Return a random sample of n examples from the cached dataset.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "n": {
-                        "type": "integer",
-                        "description": "The number of examples to show",
-                    }
-                },
-                "required": ["n"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "summarize",
-            "description": "Summarise an arbitrary user request.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "user_request": {
-                        "type": "string",
-                        "description": "The user request to summarise",
-                    }
-                },
-                "required": ["user_request"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "finish",
-            "description": "Signal that the assistant now has enough data to answer the question and should produce a final response.",
-            "parameters": {"type": "object", "properties": {}, "required": [], "additionalProperties": False},
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_all_intents",
-            "description": "Return a list of all available intent names.",
-            "parameters": {"type": "object", "properties": {}, "required": [], "additionalProperties": False},
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_all_categories",
-            "description": "Return a list of all available category names.",
-            "parameters": {"type": "object", "properties": {}, "required": [], "additionalProperties": False},
-            "strict": True,
-        },
-    },
-]
-
-__all__ = ["tools"] 
\ No newline at end of file
+from lazy import lazy_import
+
+dl = lazy_import("data_loader")
+
+
+def get_tools(compact: bool = False) -> list[dict]:
+    """Return the tool specification list, building it on first use.
+
+    With *compact*, the intent/category enums are not inlined; send
+    `get_vocabulary()` in the system prompt instead.
+    """
+    # Importing dataset_tools registers every tool with the registry.
+    import dataset_tools  # noqa: F401
+    from tool_registry import registry
+
+    return registry.schema(compact)
+
+
+def get_vocabulary() -> str:
+    """Return the enum vocabulary that accompanies the compact schema."""
+    import dataset_tools  # noqa: F401
+    from tool_registry import registry
+
+    return registry.vocabulary()
+
+
+def __getattr__(name: str):
+    if name == "tools":
+        return get_tools()
+    if name in ("category_enum", "intent_enum"):
+        return getattr(dl, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["tools", "get_tools", "get_vocabulary"]
@@ -0,0 +1,377 @@
+"""Spans and per-process metrics for questions, LLM calls and tool calls.
+
+Code under observation opens spans with the process-wide tracer::
+
+    with get_tracer().span("tool", tool=tool_name) as span:
+        ...
+        span.set(result_bytes=len(result))
+
+Spans nest through a context variable, so a span opened inside an asyncio
+task or a ``to_thread`` worker becomes a child of the span that was current
+when the task was created.  Every finished span is handed to the tracer's
+exporters:
+
+* :class:`InMemoryExporter` keeps the spans in a list (for tests);
+* :class:`JsonlExporter` appends one JSON object per span to a file;
+* :class:`PrometheusExporter` aggregates histograms of span durations and of
+  tokens per question and renders them in the Prometheus text format,
+  optionally served over HTTP.
+
+When the tracer is disabled, ``span()`` returns a shared no-op span, so the
+instrumentation costs one attribute check per call site.
+
+The process-wide tracer is configured from the environment:
+``AGENT_TRACING=off`` disables it, ``AGENT_TRACE_FILE`` adds a JSONL
+exporter and ``AGENT_METRICS_PORT`` serves the Prometheus metrics.
+"""
+
+from __future__ import annotations
+
+import bisect
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Protocol
+
+from lazy import lazy
+
+__all__ = [
+    "Span",
+    "Tracer",
+    "Exporter",
+    "InMemoryExporter",
+    "JsonlExporter",
+    "PrometheusExporter",
+    "Histogram",
+    "get_tracer",
+]
+
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation with attributes; use as a context manager."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent", "attributes", "start", "duration",
+                 "status", "_tracer", "_t0", "_token")
+
+    def __init__(self, tracer: Tracer | None, name: str, parent: Span | None, attributes: dict):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(64):016x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.attributes = attributes
+        self.start = 0.0
+        self.duration = 0.0
+        self.status = "ok"
+        self._tracer = tracer
+        self._t0 = 0.0
+        self._token = None
+
+    @property
+    def root(self) -> Span:
+        """The outermost span of this trace (e.g. the question)."""
+        span = self
+        while span.parent is not None:
+            span = span.parent
+        return span
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def add(self, key: str, amount: float) -> None:
+        """Increase the numeric attribute *key* by *amount*."""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def fail(self, message: str) -> None:
+        """Mark the span as failed without raising through it."""
+        self.status = "error"
+        self.attributes["error"] = message
+
+    def __enter__(self) -> Span:
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.duration = time.perf_counter() - self._t0
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.status = "error"
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        self._tracer._finish(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent is not None else None,
+            "start": self.start,
+            "duration": self.duration,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stand-in returned by a disabled tracer; every operation does nothing."""
+
+    __slots__ = ()
+    root = property(lambda self: self)
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def add(self, key: str, amount: float) -> None:
+        pass
+
+    def fail(self, message: str) -> None:
+        pass
+
+    def __enter__(self) -> _NoopSpan:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Exporter(Protocol):
+    def export(self, span: Span) -> None: ...
+
+
+class Tracer:
+    """Creates spans and passes finished ones to its exporters.
+
+    Parameters
+    ----------
+    exporters : list[Exporter], optional
+        Receivers of finished spans.
+    enabled : bool
+        When ``False`` every span is the shared no-op span.
+    """
+
+    def __init__(self, exporters: list[Exporter] | None = None, enabled: bool = True):
+        self.exporters: list[Exporter] = list(exporters or [])
+        self.enabled = enabled
+
+    def span(self, name: str, **attributes) -> Span | _NoopSpan:
+        """Return a span named *name*, child of the current span if any."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, _current_span.get(), attributes)
+
+    @staticmethod
+    def current_span() -> Span | None:
+        return _current_span.get()
+
+    def _finish(self, span: Span) -> None:
+        for exporter in self.exporters:
+            exporter.export(span)
+
+
+# ---------------------------------------------------------------------------
+# Exporters
+# ---------------------------------------------------------------------------
+
+class InMemoryExporter:
+    """Collects finished spans in :attr:`spans`."""
+
+    def __init__(self):
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def named(self, name: str) -> list[Span]:
+        with self._lock:
+            return [s for s in self.spans if s.name == name]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+
+class JsonlExporter:
+    """Appends every finished span as one JSON line to *path*."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+_TOKEN_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+_TURN_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 24)
+
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds, as in Prometheus."""
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the *q*-quantile."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class PrometheusExporter:
+    """Aggregates spans into histograms and renders them for Prometheus.
+
+    Metrics:
+
+    ``agent_span_duration_seconds{span}``  duration of every span, by name;
+    ``agent_question_tokens``              LLM tokens used per question (the
+                                           ``tokens`` attribute of root spans);
+    ``agent_question_turns``               model turns per question (``turns``);
+    ``agent_question_stops_total{reason}`` questions stopped by their budget
+                                           (``budget_stop``, see :mod:`budget`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations: dict[str, Histogram] = {}
+        self.errors: dict[str, int] = {}
+        self.question_tokens = Histogram(_TOKEN_BUCKETS)
+        self.question_turns = Histogram(_TURN_BUCKETS)
+        self.question_stops: dict[str, int] = {}
+        self._server: ThreadingHTTPServer | None = None
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            histogram = self.durations.get(span.name)
+            if histogram is None:
+                histogram = self.durations[span.name] = Histogram(_LATENCY_BUCKETS)
+            histogram.observe(span.duration)
+            if span.status != "ok":
+                self.errors[span.name] = self.errors.get(span.name, 0) + 1
+            if span.parent is None and "tokens" in span.attributes:
+                self.question_tokens.observe(span.attributes["tokens"])
+            if span.parent is None and "turns" in span.attributes:
+                self.question_turns.observe(span.attributes["turns"])
+            reason = span.attributes.get("budget_stop") if span.parent is None else None
+            if reason is not None:
+                self.question_stops[reason] = self.question_stops.get(reason, 0) + 1
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP agent_span_duration_seconds Duration of traced operations.",
+            "# TYPE agent_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            for name, histogram in sorted(self.durations.items()):
+                lines += _render_histogram("agent_span_duration_seconds", histogram, f'span="{name}"')
+            lines += [
+                "# HELP agent_span_errors_total Traced operations that raised.",
+                "# TYPE agent_span_errors_total counter",
+            ]
+            lines += [f'agent_span_errors_total{{span="{n}"}} {c}' for n, c in sorted(self.errors.items())]
+            lines += [
+                "# HELP agent_question_tokens LLM tokens used per question.",
+                "# TYPE agent_question_tokens histogram",
+                *_render_histogram("agent_question_tokens", self.question_tokens, ""),
+                "# HELP agent_question_turns Model turns per question.",
+                "# TYPE agent_question_turns histogram",
+                *_render_histogram("agent_question_turns", self.question_turns, ""),
+                "# HELP agent_question_stops_total Questions stopped early by their budget.",
+                "# TYPE agent_question_stops_total counter",
+            ]
+            lines += [f'agent_question_stops_total{{reason="{r}"}} {c}'
+                      for r, c in sorted(self.question_stops.items())]
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Serve :meth:`render` at ``/metrics`` from a daemon thread."""
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        return self._server
+
+
+def _render_histogram(metric: str, histogram: Histogram, labels: str) -> list[str]:
+    sep = "," if labels else ""
+    lines, cumulative = [], 0
+    for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+        cumulative += count
+        lines.append(f'{metric}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{metric}_sum{suffix} {histogram.sum}")
+    lines.append(f"{metric}_count{suffix} {histogram.count}")
+    return lines
+
+
+# ---------------------------------------------------------------------------
+# Process-wide tracer
+# ---------------------------------------------------------------------------
+
+@lazy
+def _tracer() -> Tracer:
+    if os.environ.get("AGENT_TRACING", "on").lower() in ("0", "off", "false"):
+        return Tracer(enabled=False)
+    metrics = PrometheusExporter()
+    exporters: list[Exporter] = [metrics]
+    if os.environ.get("AGENT_TRACE_FILE"):
+        exporters.append(JsonlExporter(os.environ["AGENT_TRACE_FILE"]))
+    if os.environ.get("AGENT_METRICS_PORT"):
+        metrics.serve(int(os.environ["AGENT_METRICS_PORT"]))
+    return Tracer(exporters)
+
+
+def get_tracer() -> Tracer:
+    """Return the process-wide tracer (configured from the environment)."""
+    return _tracer.get()
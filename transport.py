@@ -0,0 +1,370 @@
+"""Resilient transport around the async OpenAI client.
+
+:class:`ResilientClient` wraps an ``AsyncOpenAI``-compatible client (like
+:class:`rate_limit.RateLimitedClient` does) and gives every
+``chat.completions.create`` call
+
+* a deadline covering all attempts (``TransportSettings.deadline``);
+* retries with exponential backoff and full jitter on 429, 408/409, 5xx,
+  connection errors and timeouts, honouring ``Retry-After``;
+* a :class:`CircuitBreaker` that fails calls fast after repeated server or
+  connection failures, and lets a single probe through once it cools down;
+* optional hedging: when the caller asks for it (:func:`call_options`), a
+  duplicate request is sent once the first one has been outstanding longer
+  than the recent p95 latency, and whichever answers first wins.
+
+The SDK's own retries are disabled (``max_retries=0``) so that the policy
+lives in one place, and :func:`async_http_client` builds the connection pool
+with explicit limits, keep-alive and timeouts instead of the SDK defaults
+(10 minute read timeout).  For streamed calls the deadline and the hedging
+apply to the start of the response; the read timeout bounds the gaps between
+chunks.
+
+The process-wide settings come from ``LLM_DEADLINE`` (seconds),
+``LLM_MAX_RETRIES``, ``LLM_HEDGE`` (``0`` disables hedging) and
+``LLM_MAX_CONNECTIONS``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+from lazy import lazy_import
+
+openai = lazy_import("openai")
+
+__all__ = ["TransportSettings", "CircuitOpenError", "CircuitBreaker", "ResilientClient", "call_options",
+           "async_http_client", "http_client"]
+
+
+@dataclass
+class TransportSettings:
+    """Connection pool, timeout, retry, breaker and hedging knobs."""
+
+    # Connection pool and keep-alive
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    # Per-request timeouts of the HTTP client (seconds)
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    # Upper bound on one create() call, all attempts and backoff included
+    deadline: float = 120.0
+    # Retries after the first attempt; backoff is uniform in
+    # [0, min(backoff_max, backoff_base * 2 ** retry)]
+    max_retries: int = 4
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    # Consecutive failures that open the breaker, and seconds it stays open
+    breaker_threshold: int = 5
+    breaker_reset: float = 10.0
+    # Hedge once a call has taken longer than this latency quantile of the
+    # recent calls (needs hedge_min_samples of them)
+    hedge: bool = True
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20
+
+    @classmethod
+    def from_env(cls) -> TransportSettings:
+        return cls(
+            deadline=float(os.environ.get("LLM_DEADLINE", cls.deadline)),
+            max_retries=int(os.environ.get("LLM_MAX_RETRIES", cls.max_retries)),
+            hedge=os.environ.get("LLM_HEDGE", "1") != "0",
+            max_connections=int(os.environ.get("LLM_MAX_CONNECTIONS", cls.max_connections)),
+        )
+
+
+def _httpx():
+    try:
+        import httpx
+    except ImportError:  # newer SDKs ship their HTTP stack as httpx2
+        import httpx2 as httpx
+    return httpx
+
+
+def _pool_options(settings: TransportSettings) -> dict:
+    httpx = _httpx()
+    return {
+        "limits": httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive_connections,
+            keepalive_expiry=settings.keepalive_expiry,
+        ),
+        "timeout": httpx.Timeout(settings.read_timeout, connect=settings.connect_timeout),
+    }
+
+
+def async_http_client(settings: TransportSettings):
+    """Return the SDK's async HTTP client with the pool and timeouts of *settings*."""
+    return openai.DefaultAsyncHttpxClient(**_pool_options(settings))
+
+
+def http_client(settings: TransportSettings):
+    """Blocking counterpart of :func:`async_http_client`."""
+    return openai.DefaultHttpxClient(**_pool_options(settings))
+
+
+# ---------------------------------------------------------------------------
+# Per-call options
+# ---------------------------------------------------------------------------
+
+_options: contextvars.ContextVar[dict] = contextvars.ContextVar("transport_options", default={})
+
+
+@contextlib.contextmanager
+def call_options(*, hedge: bool | None = None, deadline: float | None = None, meter=None):
+    """Set options for the ``create`` calls made in this context.
+
+    *hedge* allows a hedged duplicate request (e.g. for the final answer);
+    *deadline* replaces ``TransportSettings.deadline``; *meter* is awaited
+    with the call's keyword arguments before every request sent beyond the
+    first one (retries and hedged duplicates), so that a rate limiter
+    wrapping this client charges them too (see
+    :class:`rate_limit.RateLimitedClient`).  Clients other than
+    :class:`ResilientClient` ignore them.
+    """
+    options = {**_options.get()}
+    if hedge is not None:
+        options["hedge"] = hedge
+    if deadline is not None:
+        options["deadline"] = deadline
+    if meter is not None:
+        options["meter"] = meter
+    token = _options.set(options)
+    try:
+        yield
+    finally:
+        _options.reset(token)
+
+
+# ---------------------------------------------------------------------------
+# Circuit breaker
+# ---------------------------------------------------------------------------
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Closed -> open after *threshold* consecutive failures -> half-open after *reset* seconds.
+
+    In the half-open state one probe call is let through: its success closes
+    the breaker, its failure opens it again.
+    """
+
+    def __init__(self, threshold: int = 5, reset: float = 10.0):
+        self.threshold = threshold
+        self.reset = reset
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0  # times the breaker opened
+        self._opened_at = 0.0
+        self._probing = False
+
+    def check(self) -> None:
+        """Raise :class:`CircuitOpenError` if a call may not go out now."""
+        if self.state == "open":
+            wait = self._opened_at + self.reset - time.monotonic()
+            if wait > 0:
+                raise CircuitOpenError(f"circuit open after {self.failures} failures; retry in {wait:.1f}s")
+            self.state = "half-open"
+        if self.state == "half-open":
+            if self._probing:
+                raise CircuitOpenError("circuit half-open; a probe call is in flight")
+            self._probing = True
+
+    def success(self) -> None:
+        self.state, self.failures, self._probing = "closed", 0, False
+
+    def failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == "half-open" or self.failures >= self.threshold:
+            if self.state != "open":
+                self.opened += 1
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """End a probe that neither succeeded nor failed (e.g. a client error)."""
+        self._probing = False
+
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+
+def _status(exc: BaseException) -> int | None:
+    status = getattr(exc, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _classify(exc: BaseException) -> tuple[bool, bool]:
+    """Return ``(retryable, counts_against_breaker)`` for a failed attempt."""
+    status = _status(exc)
+    if status is not None:
+        if status == 429:
+            return True, False  # rate limited: back off, the service is up
+        server_side = status >= 500 or status in (408, 409)
+        return server_side, server_side
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError, ConnectionError, openai.APIConnectionError)):
+        return True, True
+    return False, False
+
+
+def _retry_after(exc: BaseException) -> float | None:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+async def _close(response) -> None:
+    close = getattr(response, "close", None)
+    if close is not None:
+        result = close()
+        if asyncio.iscoroutine(result):
+            await result
+
+
+class ResilientClient:
+    """Async OpenAI client wrapper with deadlines, retries, a breaker and hedging.
+
+    Parameters
+    ----------
+    client
+        The wrapped ``AsyncOpenAI``-compatible client, ideally created with
+        ``max_retries=0``.
+    settings : TransportSettings, optional
+        Retry, breaker and hedging policy.
+    seed : int, optional
+        Seed of the backoff jitter.
+    """
+
+    def __init__(self, client, settings: TransportSettings | None = None, seed: int | None = None):
+        self._client = client
+        self.settings = settings or TransportSettings()
+        self.breaker = CircuitBreaker(self.settings.breaker_threshold, self.settings.breaker_reset)
+        self._random = random.Random(seed)
+        # Recent successful attempt latencies, per streamed / not streamed
+        self._latencies = {False: deque(maxlen=256), True: deque(maxlen=256)}
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def __getattr__(self, name: str):
+        # Everything else (models, close(), with_options(), ...) is the SDK's.
+        return getattr(self._client, name)
+
+    def hedge_delay(self, stream: bool = False) -> float | None:
+        """Latency after which a call gets hedged; ``None`` until enough samples."""
+        window = self._latencies[stream]
+        if len(window) < self.settings.hedge_min_samples:
+            return None
+        ordered = sorted(window)
+        return ordered[min(len(ordered) - 1, int(self.settings.hedge_quantile * len(ordered)))]
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "breaker": self.breaker.state,
+            "breaker_opened": self.breaker.opened,
+        }
+
+    async def _attempt(self, kwargs: dict, extra: bool = False):
+        meter = _options.get().get("meter")
+        if extra and meter is not None:
+            await meter(kwargs)  # a retry or duplicate is a request of its own
+        start = time.perf_counter()
+        response = await self._client.chat.completions.create(**kwargs)
+        self._latencies[bool(kwargs.get("stream"))].append(time.perf_counter() - start)
+        return response
+
+    async def _hedged(self, kwargs: dict, extra: bool = False):
+        delay = self.hedge_delay(bool(kwargs.get("stream")))
+        if delay is None:
+            return await self._attempt(kwargs, extra)
+        tasks = [asyncio.ensure_future(self._attempt(kwargs, extra))]
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=delay)
+            # At most two duplicates: one once the first request is slow, and
+            # a replacement if a request fails while another is still out.
+            duplicates = 2
+            while True:
+                winners = [task for task in tasks if task in done and task.exception() is None]
+                if winners:
+                    for late in winners[1:]:  # answered at the same time
+                        await _close(late.result())
+                    if winners[0] is not tasks[0]:
+                        self.hedge_wins += 1
+                    return winners[0].result()
+                if not pending:
+                    return tasks[0].result()  # every request failed: the first error
+                if duplicates:
+                    duplicates -= 1
+                    self.hedges += 1
+                    tasks.append(asyncio.ensure_future(self._attempt(kwargs, extra=True)))
+                    pending.add(tasks[-1])
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                if task.done() and not task.cancelled():
+                    task.exception()  # retrieved: a losing request's error is expected
+                task.cancel()
+
+    async def _create(self, **kwargs):
+        options = _options.get()
+        hedge = self.settings.hedge and options.get("hedge", False)
+        loop = asyncio.get_running_loop()
+        give_up = loop.time() + options.get("deadline", self.settings.deadline)
+        self.calls += 1
+        retry = 0
+        while True:
+            self.breaker.check()
+            try:
+                attempt = self._hedged(kwargs, retry > 0) if hedge else self._attempt(kwargs, retry > 0)
+                response = await asyncio.wait_for(attempt, max(give_up - loop.time(), 0))
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as exc:
+                retryable, counts = _classify(exc)
+                if counts:
+                    self.breaker.failure()
+                else:
+                    self.breaker.release()
+                delay = min(self.settings.backoff_max, self.settings.backoff_base * 2 ** retry)
+                delay = max(self._random.uniform(0, delay), _retry_after(exc) or 0)
+                if not retryable or retry >= self.settings.max_retries or loop.time() + delay >= give_up:
+                    self.failures += 1
+                    raise
+                retry += 1
+                self.retries += 1
+                await asyncio.sleep(delay)
+            else:
+                self.breaker.success()
+                return response